@@ -0,0 +1,43 @@
+'''
+Compares reading a wide csv file as objects with reading it as columnar batches.
+
+    python benchmarks/bench_batch_reader.py
+'''
+from __future__ import print_function
+import csv
+import os
+import shutil
+import tempfile
+import time
+from oreader.reader_configs import CsvReaderConfig
+from bench_conversion import make_class, make_rows
+
+def read_objects(klass, path):
+    for _ in klass.reader({klass: CsvReaderConfig(path, header=False)}):
+        pass
+
+def read_batches(klass, path, batch_format):
+    for _ in klass.reader({klass: CsvReaderConfig(path, header=False)}, batch_size=10000, 
+                          batch_format=batch_format):
+        pass
+
+def timed(function, *args):
+    t0 = time.time()
+    function(*args)
+    return time.time() - t0
+
+if __name__ == '__main__':
+    n = 50000
+    tmpdir = tempfile.mkdtemp()
+    try:
+        print('%6s %20s %20s %20s' % ('width', 'objects (us/row)', 'arrays (us/row)', 'dataframe (us/row)'))
+        for width in (4, 16, 64, 128):
+            klass = make_class(width)
+            path = os.path.join(tmpdir, 'flat%d.csv' % width)
+            with open(path, 'w') as outfile:
+                csv.writer(outfile).writerows(make_rows(klass, n))
+            times = [timed(read_objects, klass, path), timed(read_batches, klass, path, 'arrays'), 
+                     timed(read_batches, klass, path, 'dataframe')]
+            print('%6d %20.2f %20.2f %20.2f' % ((width,) + tuple(1e6 * t / n for t in times)))
+    finally:
+        shutil.rmtree(tmpdir)
@@ -0,0 +1,92 @@
+'''
+Reads a compound class with several relationships from sources with simulated query latency,
+serially and with the child readers run in a thread pool.  The latency sleeps, which releases
+the GIL like waiting on a database does.
+
+    python benchmarks/bench_concurrent_collection.py
+'''
+from __future__ import print_function
+import time
+from concurrent.futures import ThreadPoolExecutor
+from oreader.base import DataObject, schema, IntegerColumn, backrelate
+from oreader.reader_configs import TupleSimpleReaderConfig
+
+class BenchObj(DataObject):
+    partition_attribute = 'member_id'
+
+@schema([IntegerColumn(name='member_id')])
+class Member(BenchObj):
+    identity_key_ = (('member_id', 'member_id'),)
+    sort_key_ = ('member_id',)
+    container_key_ = (('member_id', 'member_id'),)
+
+def child(name):
+    @schema([IntegerColumn(name='member_id'), IntegerColumn(name='id')])
+    @backrelate({name: (Member, True)})
+    class Child(BenchObj):
+        identity_key_ = (('member_id', 'member_id'), ('id', 'id'))
+        sort_key_ = ('member_id', 'id')
+        container_key_ = (('member_id', 'member_id'),)
+    Child.__name__ = name.capitalize()
+    return Child
+
+children = [child('child_%d' % i) for i in range(4)]
+
+class SlowSource(object):
+    '''
+    Waits latency before the first row, like a query, and again every every rows, like a fetch.
+    '''
+    def __init__(self, rows, latency, every):
+        self.rows = iter(rows)
+        self.latency = latency
+        self.every = every
+        self.count = 0
+
+    def __next__(self):
+        if self.count % self.every == 0:
+            time.sleep(self.latency)
+        self.count += 1
+        return next(self.rows)
+
+    def close(self):
+        pass
+
+class SlowReaderConfig(TupleSimpleReaderConfig):
+    def __init__(self, rows, latency, every):
+        self.rows = rows
+        self.latency = latency
+        self.every = every
+
+    def get_sources(self, reader):
+        return [None]
+
+    def start_source(self, reader, source):
+        return SlowSource(self.rows, self.latency, self.every)
+
+    def stop_source(self, reader, source):
+        source.close()
+
+def config(n, latency, every):
+    result = {Member: SlowReaderConfig([(i,) for i in range(n)], latency, every)}
+    for klass in children:
+        result[klass] = SlowReaderConfig([(i, j) for i in range(n) for j in range(2)], latency, every)
+    return result
+
+def timed(n, latency, every, executor=None):
+    t0 = time.time()
+    reader = Member.reader(config(n, latency, every), executor=executor)
+    count = sum(1 for _ in reader)
+    reader.close()
+    assert count == n
+    return time.time() - t0
+
+if __name__ == '__main__':
+    n = 5000
+    every = 500
+    print('%12s %12s %12s %15s' % ('latency (ms)', 'serial (s)', 'workers', 'concurrent (s)'))
+    for latency in [5, 20, 50]:
+        serial = timed(n, latency / 1000., every)
+        for workers in [2, 4]:
+            with ThreadPoolExecutor(workers) as executor:
+                concurrent = timed(n, latency / 1000., every, executor)
+            print('%12d %12.2f %12d %15.2f' % (latency, serial, workers, concurrent))
@@ -0,0 +1,57 @@
+'''
+Compares the generic row to object path, which zips column names with the raw row and 
+converts each keyword argument in DataObject.__init__, with the generated from_row path 
+that converts the raw row positionally, and with the block path of CsvReaderConfig that 
+converts blocks of rows column-wise with convert_array.
+
+    python benchmarks/bench_conversion.py
+'''
+from __future__ import print_function
+import time
+import random
+from oreader.base import DataObject, schema, IntegerColumn, RealColumn, StringColumn,\
+    BooleanColumn
+from oreader.reader_configs import BlockSource
+
+def make_class(width):
+    kinds = [IntegerColumn, RealColumn, StringColumn, BooleanColumn]
+    columns = [kinds[i % len(kinds)](name='col%d' % i) for i in range(width)]
+    class Flat(DataObject):
+        partition_attribute = 'col0'
+    return schema(columns)(Flat)
+
+def make_rows(klass, n):
+    values = {IntegerColumn: lambda: str(random.randint(0, 100000)),
+              RealColumn: lambda: '%.2f' % random.uniform(0, 1000),
+              StringColumn: lambda: random.choice(['alpha', 'beta', 'gamma', '']),
+              BooleanColumn: lambda: random.choice(['T', 'F', '1', '0', ''])}
+    return [[values[type(col)]() for col in klass.columns] for _ in range(n)]
+
+def generic(klass, row):
+    return klass(**dict(zip([col.name for col in klass.columns], row)))
+
+def run(convert, klass, rows):
+    t0 = time.time()
+    for row in rows:
+        convert(klass, row)
+    return (time.time() - t0) / len(rows)
+
+def run_blocks(klass, rows, block_size=10000):
+    t0 = time.time()
+    for _ in BlockSource(iter(rows), klass, block_size):
+        pass
+    return (time.time() - t0) / len(rows)
+
+if __name__ == '__main__':
+    n = 20000
+    print('%6s %20s %20s %20s %10s %10s' % ('width', 'generic (us/row)', 'from_row (us/row)', 
+                                            'blocks (us/row)', 'speedup', 'blocks'))
+    for width in (4, 16, 64, 128):
+        klass = make_class(width)
+        rows = make_rows(klass, n)
+        generic_time = run(generic, klass, rows)
+        compiled_time = run(lambda k, row: k.from_row(row), klass, rows)
+        block_time = run_blocks(klass, rows)
+        print('%6d %20.2f %20.2f %20.2f %10.1f %10.1f' % (width, 1e6 * generic_time, 1e6 * compiled_time, 
+                                                          1e6 * block_time, generic_time / compiled_time, 
+                                                          generic_time / block_time))
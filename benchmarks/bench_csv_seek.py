@@ -0,0 +1,75 @@
+'''
+Looks up single members, with their claims, in large sorted CSV files by scanning from the top 
+of each file, by seeking with a CsvKeyIndex and by bisecting the files.
+
+    python benchmarks/bench_csv_seek.py [n_members]
+'''
+from __future__ import print_function
+import csv
+import os
+import shutil
+import sys
+import tempfile
+import time
+from oreader.base import DataObject, schema, IntegerColumn, StringColumn, DateColumn, \
+    RealColumn, backrelate
+from oreader.reader_configs import CsvReaderConfig
+
+class BenchObj(DataObject):
+    partition_attribute = 'member_id'
+
+@schema([IntegerColumn(name='member_id'), StringColumn(name='name')], slots=True)
+class Member(BenchObj):
+    identity_key_ = (('member_id', 'member_id'),)
+    sort_key_ = ('member_id',)
+    container_key_ = (('member_id', 'member_id'),)
+
+@schema([IntegerColumn(name='member_id'), IntegerColumn(name='claim_id'), DateColumn(name='date'), 
+         RealColumn(name='amount')], slots=True)
+@backrelate({'claims': (Member, True)})
+class Claim(BenchObj):
+    identity_key_ = (('member_id', 'member_id'), ('claim_id', 'claim_id'))
+    sort_key_ = ('member_id', 'claim_id')
+    container_key_ = (('member_id', 'member_id'),)
+
+def write_files(tmpdir, n):
+    members_path = os.path.join(tmpdir, 'members.csv')
+    claims_path = os.path.join(tmpdir, 'claims.csv')
+    with open(members_path, 'w') as outfile:
+        writer = csv.writer(outfile)
+        writer.writerow(['member_id', 'name'])
+        writer.writerows([i, 'member %d' % i] for i in range(n))
+    with open(claims_path, 'w') as outfile:
+        writer = csv.writer(outfile)
+        writer.writerow(['member_id', 'claim_id', 'date', 'amount'])
+        writer.writerows([i, j, '2017-01-%02d' % (j + 1), '%d.5' % j] for i in range(n) for j in range(i % 5))
+    return members_path, claims_path
+
+def lookup(paths, member_id, **kwargs):
+    members_path, claims_path = paths
+    bounds = dict(start=(member_id,), stop=(member_id + 1,))
+    config = {Member: CsvReaderConfig(members_path, header=True, mmap=True, **dict(bounds, **kwargs)),
+              Claim: CsvReaderConfig(claims_path, header=True, mmap=True, **dict(bounds, **kwargs))}
+    t0 = time.time()
+    members = list(Member.reader(config))
+    elapsed = time.time() - t0
+    assert [member.member_id for member in members] == [member_id]
+    assert len(members[0].claims) == member_id % 5
+    return elapsed
+
+if __name__ == '__main__':
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 500000
+    tmpdir = tempfile.mkdtemp()
+    try:
+        paths = write_files(tmpdir, n)
+        methods = [('scan', {}), ('index', {'index_every': 1000}), ('bisect', {'bisect': True})]
+        t0 = time.time()
+        lookup(paths, 0, index_every=1000)
+        print('Built indexes of %d members in %.2fs' % (n, time.time() - t0))
+        print('\n%12s %12s %12s %12s' % ('position', 'scan (s)', 'index (s)', 'bisect (s)'))
+        for fraction in [0.01, 0.5, 0.99]:
+            member_id = int(n * fraction)
+            times = [lookup(paths, member_id, **kwargs) for _, kwargs in methods]
+            print('%12.2f %12.4f %12.4f %12.4f' % ((fraction,) + tuple(times)))
+    finally:
+        shutil.rmtree(tmpdir)
@@ -0,0 +1,35 @@
+'''
+Compares the csv.reader source with the memory mapped source on a wide file.
+
+    python benchmarks/bench_csv_source.py
+'''
+from __future__ import print_function
+import csv
+import os
+import shutil
+import tempfile
+import time
+from oreader.reader_configs import CsvSource, MmapCsvSource
+from bench_conversion import make_class, make_rows
+
+def timed(source):
+    t0 = time.time()
+    n = 0
+    for _ in source:
+        n += 1
+    source.close()
+    return (time.time() - t0) / n
+
+if __name__ == '__main__':
+    n = 100000
+    tmpdir = tempfile.mkdtemp()
+    try:
+        print('%6s %20s %20s' % ('width', 'csv (us/row)', 'mmap (us/row)'))
+        for width in (4, 16, 64, 128):
+            path = os.path.join(tmpdir, 'flat%d.csv' % width)
+            with open(path, 'w') as outfile:
+                csv.writer(outfile).writerows(make_rows(make_class(width), n))
+            print('%6d %20.2f %20.2f' % (width, 1e6 * timed(CsvSource(open(path, 'rt'))), 
+                                         1e6 * timed(MmapCsvSource(path))))
+    finally:
+        shutil.rmtree(tmpdir)
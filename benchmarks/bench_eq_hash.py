@@ -0,0 +1,81 @@
+'''
+Compares the generic DataObject.__eq__ and __hash__, which build state dicts, with the
+versions generated for each class, by deduplicating members with claims through a set and
+comparing them pairwise, for plain and slotted classes, and with hashes cached by freeze.
+
+    python benchmarks/bench_eq_hash.py [n_members]
+'''
+from __future__ import print_function
+import datetime
+import sys
+import time
+from oreader.base import DataObject, schema, IntegerColumn, StringColumn, DateColumn, \
+    RealColumn, backrelate
+
+class BenchObj(DataObject):
+    partition_attribute = 'member_id'
+
+def classes(slots):
+    @schema([IntegerColumn(name='member_id'), StringColumn(name='name'), DateColumn(name='birth_date')], 
+            slots=slots)
+    class Member(BenchObj):
+        identity_key_ = (('member_id', 'member_id'),)
+        sort_key_ = ('member_id',)
+        container_key_ = (('member_id', 'member_id'),)
+
+    @schema([IntegerColumn(name='member_id'), IntegerColumn(name='claim_id'), DateColumn(name='date'), 
+             RealColumn(name='amount')], slots=slots)
+    @backrelate({'claims': (Member, True)})
+    class Claim(BenchObj):
+        identity_key_ = (('member_id', 'member_id'), ('claim_id', 'claim_id'))
+        sort_key_ = ('member_id', 'claim_id')
+        container_key_ = (('member_id', 'member_id'),)
+    return Member, Claim
+
+def members(Member, Claim, n):
+    result = []
+    for i in range(n):
+        member = Member(member_id=i % (n // 2), name='member %d' % (i % (n // 2)), 
+                        birth_date=datetime.date(1980, 1, 1))
+        for j in range(i % 4):
+            member.claims.append(Claim(member_id=member.member_id, claim_id=j, 
+                                       date=datetime.date(2017, 1, j + 1), amount=j + 0.5))
+        result.append(member)
+    return result
+
+def timed(function):
+    best = float('inf')
+    for _ in range(3):
+        t0 = time.time()
+        function()
+        best = min(best, time.time() - t0)
+    return best
+
+def use_generic(klasses, generic):
+    # Swap the generic methods in for the generated ones, or back
+    for klass in klasses:
+        if generic:
+            klass.generated = klass.__eq__, klass.__hash__
+            klass.__eq__, klass.__hash__ = DataObject.__eq__, DataObject.__hash__
+        else:
+            klass.__eq__, klass.__hash__ = klass.generated
+
+def compare(items):
+    half = len(items) // 2
+    return sum(1 for a, b in zip(items, items[half:]) if a == b)
+
+if __name__ == '__main__':
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 100000
+    print('%10s %10s %14s %14s %14s' % ('classes', 'operation', 'generic (s)', 'generated (s)', 'frozen (s)'))
+    for slots in (False, True):
+        Member, Claim = classes(slots)
+        objects = members(Member, Claim, n)
+        frozen = [obj.freeze() for obj in members(Member, Claim, n)]
+        name = 'slotted' if slots else 'plain'
+        for operation, function in (('set', set), ('==', compare)):
+            use_generic((Member, Claim), True)
+            times = [timed(lambda: function(objects))]
+            use_generic((Member, Claim), False)
+            times.extend([timed(lambda: function(objects)), timed(lambda: function(frozen))])
+            print('%10s %10s %14.3f %14.3f %14.3f' % ((name, operation) + tuple(times)))
+        assert len(set(objects)) == len(set(frozen)) == n // 2
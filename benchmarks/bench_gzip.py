@@ -0,0 +1,49 @@
+'''
+Compares reading and writing gzipped csv text with the gzip module and with parallel_gzipped, 
+both for an ordinary single member file and for a BGZF file.
+
+    python benchmarks/bench_gzip.py
+'''
+from __future__ import print_function
+import csv
+import gzip
+import os
+import shutil
+import tempfile
+import time
+from functools import partial
+from oreader.util import parallel_gzipped
+
+def write_rows(opener, path, rows):
+    with opener(path, 'wt') as outfile:
+        csv.writer(outfile).writerows(rows)
+
+def read_rows(opener, path):
+    with opener(path, 'rt') as infile:
+        for _ in csv.reader(infile):
+            pass
+
+def timed(function, *args):
+    t0 = time.time()
+    function(*args)
+    return time.time() - t0
+
+if __name__ == '__main__':
+    n = 500000
+    rows = [[str(i), 'name %d' % (i % 1000), '%.3f' % (i * 0.37), '2017-01-%02d' % (i % 28 + 1)] for i in range(n)]
+    tmpdir = tempfile.mkdtemp()
+    try:
+        plain = os.path.join(tmpdir, 'plain.csv.gz')
+        bgzf = os.path.join(tmpdir, 'bgzf.csv.gz')
+        print('%-45s %10s' % ('operation', 'seconds'))
+        print('%-45s %10.2f' % ('write with gzip', timed(write_rows, gzip.open, plain, rows)))
+        for workers in (1, 2, 4):
+            print('%-45s %10.2f' % ('write with parallel_gzipped, %d workers' % workers, 
+                                    timed(write_rows, partial(parallel_gzipped, workers=workers), bgzf, rows)))
+        print('%-45s %10.2f' % ('read plain with gzip', timed(read_rows, gzip.open, plain)))
+        print('%-45s %10.2f' % ('read plain with parallel_gzipped', timed(read_rows, parallel_gzipped, plain)))
+        for workers in (1, 2, 4):
+            print('%-45s %10.2f' % ('read bgzf with parallel_gzipped, %d workers' % workers, 
+                                    timed(read_rows, partial(parallel_gzipped, workers=workers), bgzf)))
+    finally:
+        shutil.rmtree(tmpdir)
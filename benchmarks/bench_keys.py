@@ -0,0 +1,78 @@
+'''
+Compares the generic key methods of DataObject, which look up the key attribute names and
+build their tuples with getattr, with the key methods generated for classes with a schema,
+for key computations, sorting and reading compound objects from CSV files.
+
+    python benchmarks/bench_keys.py [n_members]
+'''
+from __future__ import print_function
+import csv
+import os
+import shutil
+import sys
+import tempfile
+import time
+from oreader.base import DataObject
+from oreader.reader_configs import CsvReaderConfig
+from bench_eq_hash import classes
+
+key_methods = ('sort_key', 'identity_key', 'container_key')
+
+def use_generic(klasses, generic):
+    # Swap the generic key methods in for the generated ones, or back
+    for klass in klasses:
+        if generic:
+            klass.generated = [klass.__dict__[name] for name in key_methods]
+            for name in key_methods:
+                setattr(klass, name, DataObject.__dict__[name])
+        else:
+            for name, method in zip(key_methods, klass.generated):
+                setattr(klass, name, method)
+
+def write_files(tmpdir, n):
+    members_path = os.path.join(tmpdir, 'members.csv')
+    claims_path = os.path.join(tmpdir, 'claims.csv')
+    with open(members_path, 'w') as outfile:
+        writer = csv.writer(outfile)
+        writer.writerow(['member_id', 'name', 'birth_date'])
+        writer.writerows([i, 'member %d' % i, '1980-01-01'] for i in range(n))
+    with open(claims_path, 'w') as outfile:
+        writer = csv.writer(outfile)
+        writer.writerow(['member_id', 'claim_id', 'date', 'amount'])
+        writer.writerows([i, j, '2017-01-%02d' % (j + 1), '%d.5' % j] for i in range(n) for j in range(i % 5))
+    return members_path, claims_path
+
+def timed(function):
+    best = float('inf')
+    for _ in range(3):
+        t0 = time.time()
+        function()
+        best = min(best, time.time() - t0)
+    return best
+
+def read(Member, Claim, paths):
+    return list(Member.reader({Member: CsvReaderConfig(paths[0], header=True),
+                               Claim: CsvReaderConfig(paths[1], header=True)}))
+
+if __name__ == '__main__':
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 100000
+    tmpdir = tempfile.mkdtemp()
+    try:
+        paths = write_files(tmpdir, n)
+        print('%10s %12s %14s %14s' % ('classes', 'operation', 'generic (s)', 'generated (s)'))
+        for slots in (False, True):
+            Member, Claim = classes(slots)
+            objects = read(Member, Claim, paths)
+            objects = objects + [claim for member in objects for claim in member.claims]
+            cases = [('keys', lambda: [(obj.sort_key(), obj.identity_key(), obj.container_key()) 
+                                       for obj in objects]),
+                     ('sort', lambda: sorted(objects, reverse=True)),
+                     ('csv read', lambda: read(Member, Claim, paths))]
+            for operation, function in cases:
+                use_generic((Member, Claim), True)
+                generic = timed(function)
+                use_generic((Member, Claim), False)
+                generated = timed(function)
+                print('%10s %12s %14.3f %14.3f' % ('slotted' if slots else 'plain', operation, generic, generated))
+    finally:
+        shutil.rmtree(tmpdir)
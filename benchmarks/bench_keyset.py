@@ -0,0 +1,75 @@
+'''
+Compares the resume queries SqaReaderState issues with vector_greater_than and with
+keyset_greater_than on a large SQLite table with a composite index on its sort key.  Prints
+the query plan of each and the time to fetch a page of rows after keys at several positions.
+
+    python benchmarks/bench_keyset.py [n_rows]
+'''
+from __future__ import print_function
+import sys
+import time
+from sqlalchemy.engine import create_engine
+from sqlalchemy.sql.schema import MetaData, Table, Column, Index
+from sqlalchemy.sql.sqltypes import Integer, String
+from sqlalchemy.sql.expression import select
+from oreader.util import vector_greater_than, keyset_greater_than
+
+def create_table(engine, n):
+    metadata = MetaData()
+    table = Table('events', metadata,
+                  Column('member_id', Integer, nullable=False),
+                  Column('kind', String, nullable=False),
+                  Column('event_id', Integer, nullable=False),
+                  Column('payload', String))
+    Index('events_key', table.c.member_id, table.c.kind, table.c.event_id)
+    metadata.create_all(engine)
+    kinds = ['claim', 'rx', 'visit']
+    with engine.begin() as connection:
+        chunk = []
+        for i in range(n):
+            chunk.append({'member_id': i // 30, 'kind': kinds[i % 3], 'event_id': i % 10,
+                          'payload': 'payload %d' % i})
+            if len(chunk) >= 10000:
+                connection.execute(table.insert(), chunk)
+                chunk = []
+        if chunk:
+            connection.execute(table.insert(), chunk)
+    return table
+
+def resume_query(table, where, page):
+    key = [table.c.member_id, table.c.kind, table.c.event_id]
+    return select(table.columns).where(where(key)).order_by(*key).limit(page)
+
+def plan(engine, query):
+    compiled = query.compile(engine, compile_kwargs={'literal_binds': True})
+    return [row[-1] for row in engine.execute('EXPLAIN QUERY PLAN %s' % compiled)]
+
+def timed(engine, query, repeat=5):
+    best = float('inf')
+    for _ in range(repeat):
+        t0 = time.time()
+        rows = engine.execute(query).fetchall()
+        best = min(best, time.time() - t0)
+    return best, len(rows)
+
+if __name__ == '__main__':
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 1000000
+    page = 1000
+    engine = create_engine('sqlite://')
+    t0 = time.time()
+    table = create_table(engine, n)
+    print('Created %d rows in %.1fs' % (n, time.time() - t0))
+    predicates = [('vector_greater_than', lambda key, values: vector_greater_than(key, values)),
+                  ('keyset_greater_than', lambda key, values: keyset_greater_than(key, values, engine.dialect))]
+    values = (n // 60, 'rx', 5)
+    for name, predicate in predicates:
+        print('\n%s:' % name)
+        for line in plan(engine, resume_query(table, lambda key: predicate(key, values), page)):
+            print('    %s' % line)
+    print('\n%12s %22s %22s' % ('position', 'vector_greater_than (s)', 'keyset_greater_than (s)'))
+    for fraction in [0.01, 0.5, 0.99]:
+        values = (int(n * fraction) // 30, 'rx', 5)
+        results = [timed(engine, resume_query(table, lambda key: predicate(key, values), page))
+                   for _, predicate in predicates]
+        assert results[0][1] == results[1][1]
+        print('%12.2f %22.4f %22.4f' % (fraction, results[0][0], results[1][0]))
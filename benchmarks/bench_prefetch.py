@@ -0,0 +1,62 @@
+'''
+Reads from a source with simulated latency, with and without PrefetchReaderConfig, while the 
+consumer does simulated work on each object.  Both sleep, which releases the GIL like waiting 
+on a database or disk does.
+
+    python benchmarks/bench_prefetch.py
+'''
+from __future__ import print_function
+import time
+from oreader.base import DataObject, schema, IntegerColumn
+from oreader.reader_configs import TupleSimpleReaderConfig, PrefetchReaderConfig
+
+@schema([IntegerColumn(name='id')])
+class Row(DataObject):
+    identity_key_ = (('id', 'id'),)
+    sort_key_ = ('id',)
+
+class SlowSource(object):
+    def __init__(self, n, latency, every):
+        self.rows = iter(range(n))
+        self.latency = latency
+        self.every = every
+    
+    def __next__(self):
+        i = next(self.rows)
+        if i % self.every == 0:
+            time.sleep(self.latency)
+        return (i,)
+    
+    def close(self):
+        pass
+
+class SlowReaderConfig(TupleSimpleReaderConfig):
+    def __init__(self, n, latency, every):
+        self.n = n
+        self.latency = latency
+        self.every = every
+    
+    def get_sources(self, reader):
+        return [None]
+    
+    def start_source(self, reader, source):
+        return SlowSource(self.n, self.latency, self.every)
+    
+    def stop_source(self, reader, source):
+        source.close()
+
+def consume(config, work, every):
+    t0 = time.time()
+    for i, _ in enumerate(Row.reader({Row: config})):
+        if i % every == 0:
+            time.sleep(work)
+    return time.time() - t0
+
+if __name__ == '__main__':
+    n = 20000
+    every = 100
+    print('%12s %12s %15s %15s' % ('latency (ms)', 'work (ms)', 'direct (s)', 'prefetch (s)'))
+    for latency, work in [(5, 0), (5, 5), (5, 10), (10, 5)]:
+        direct = consume(SlowReaderConfig(n, latency / 1000., every), work / 1000., every)
+        prefetch = consume(PrefetchReaderConfig(SlowReaderConfig(n, latency / 1000., every)), work / 1000., every)
+        print('%12d %12d %15.2f %15.2f' % (latency, work, direct, prefetch))
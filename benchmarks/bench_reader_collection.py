@@ -0,0 +1,90 @@
+'''
+Measures how the cost of merging child readers in a ReaderCollection scales with the 
+number of readers k.  Each of k concrete subclasses of a polymorphic base is given an 
+in memory source of n rows, and the time per object is reported for the heap based 
+ReaderCollection and for the linear scan it replaced.
+
+    python benchmarks/bench_reader_collection.py
+'''
+from __future__ import print_function
+import time
+from collections import OrderedDict
+from oreader.base import DataObject, schema, IntegerColumn
+from oreader.reader_configs import TupleSimpleReaderConfig
+from oreader.readers import ReaderCollection
+
+class ListReaderConfig(TupleSimpleReaderConfig):
+    def __init__(self, rows):
+        self.rows = rows
+    
+    def start_source(self, reader, source):
+        return iter(source)
+    
+    def stop_source(self, reader, source):
+        pass
+    
+    def get_sources(self, reader):
+        return [self.rows]
+
+class LinearReaderCollection(ReaderCollection):
+    '''
+    The previous ReaderCollection merge, which rescans every peeked object on each call to next.
+    '''
+    def update(self):
+        self._peek = None
+        for k, v in self._peeks.items():
+            if self._peek is None:
+                self._peek = k
+            elif v.container_key() <= self._peeks[self._peek].container_key():
+                if self.order(v) < self.order(self._peeks[self._peek]):
+                    self._peek = k
+                elif v.container_key() < self._peeks[self._peek].container_key():
+                    self._peek = k
+    
+    def peek(self):
+        if self._peek is None:
+            return None
+        return self._peeks[self._peek]
+    
+    def __next__(self):
+        if self._peek is None:
+            raise StopIteration
+        result = self._peeks[self._peek]
+        try:
+            self._peeks[self._peek] = next(self.readers[self._peek])
+        except StopIteration:
+            del self._peeks[self._peek]
+            self.readers[self._peek].close()
+        self.update()
+        return result
+
+def make_hierarchy(k):
+    class Base(DataObject):
+        partition_attribute = 'group_id'
+    subclasses = []
+    for i in range(k):
+        klass = type('Leaf%d' % i, (Base,), {'identity_key_': (('group_id', 'group_id'), ('id', 'id')),
+                                             'sort_key_': ('group_id', 'id'),
+                                             'container_key_': (('group_id', 'group_id'),)})
+        subclasses.append(schema([IntegerColumn(name='group_id'), IntegerColumn(name='id')])(klass))
+    return Base, subclasses
+
+def run(collection_class, k, n):
+    Base, subclasses = make_hierarchy(k)
+    config = dict([(klass, ListReaderConfig([(str(g), '0') for g in range(n)])) 
+                   for klass in subclasses])
+    klasses = OrderedDict([(klass, klass) for klass in sorted(subclasses, key=Base.typerank())])
+    collection = collection_class(klasses, config, Base.objrank())
+    t0 = time.time()
+    count = 0
+    for _ in collection:
+        count += 1
+    return (time.time() - t0) / count
+
+if __name__ == '__main__':
+    n = 2000
+    print('%6s %18s %18s' % ('k', 'heap (us/obj)', 'linear (us/obj)'))
+    for k in (1, 2, 4, 8, 16, 32, 64):
+        heap_time = run(ReaderCollection, k, n)
+        linear_time = run(LinearReaderCollection, k, n)
+        print('%6d %18.2f %18.2f' % (k, 1e6 * heap_time, 1e6 * linear_time))
@@ -0,0 +1,53 @@
+'''
+Times sortcsv on a synthetic csv file, sequentially and with a pool of worker processes 
+sorting the runs, with csv and binary runs, and checks that every variant produces the 
+same bytes.
+
+    python benchmarks/bench_sortcsv.py [n_rows]
+'''
+from __future__ import print_function
+import csv
+import os
+import random
+import shutil
+import sys
+import tempfile
+import time
+from oreader.sortcsv import sortcsv
+
+def write_synthetic_csv(path, n_rows, width=10):
+    with open(path, 'w') as outfile:
+        writer = csv.writer(outfile)
+        writer.writerow(['member_id', 'claim_id'] + ['field%d' % i for i in range(width)])
+        for i in range(n_rows):
+            writer.writerow([random.randint(0, n_rows // 10), i] + 
+                            ['%08x' % random.getrandbits(32) for _ in range(width)])
+
+def run(input_path, output_path, tmpdir, **kwargs):
+    t0 = time.time()
+    sortcsv(input_path, output_path, ['member_id', 'claim_id'], conversions=[int, int], 
+            tmpdir=tmpdir, **kwargs)
+    return time.time() - t0
+
+if __name__ == '__main__':
+    n_rows = int(sys.argv[1]) if len(sys.argv) > 1 else 1000000
+    tmpdir = tempfile.mkdtemp()
+    try:
+        input_path = os.path.join(tmpdir, 'input.csv')
+        write_synthetic_csv(input_path, n_rows)
+        outputs = {}
+        print('%8s %8s %12s %10s %12s' % ('format', 'workers', 'compression', 'seconds', 'rows/sec'))
+        variants = [('csv', None, None), ('csv', 4, None), ('binary', None, None), ('binary', 4, None), 
+                    ('binary', None, 'gzip'), ('binary', 4, 'gzip')]
+        for tmp_format, workers, compression in variants:
+            name = '%s_%s_%s' % (tmp_format, workers, compression)
+            output_path = os.path.join(tmpdir, 'output_%s.csv' % name)
+            seconds = run(input_path, output_path, os.path.join(tmpdir, 'tmp_%s' % name), 
+                          tmp_size=max(1, n_rows // 32), workers=workers, tmp_format=tmp_format, 
+                          tmp_compression=compression)
+            with open(output_path, 'rb') as infile:
+                outputs[name] = infile.read()
+            print('%8s %8s %12s %10.2f %12.0f' % (tmp_format, workers, compression, seconds, n_rows / seconds))
+        assert len(set(outputs.values())) == 1, 'Outputs differ'
+    finally:
+        shutil.rmtree(tmpdir)
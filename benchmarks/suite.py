@@ -0,0 +1,377 @@
+'''
+A benchmark suite for the read, write, sort and assembly hot paths.  Each case generates
+synthetic data for a flat, compound (relate/backrelate) or polymorphic hierarchy of a given
+number of top level objects and number of extra columns per class, then times one benchmark on
+it in a fresh process, so that the peak RSS it reports is that case's own.
+
+    python benchmarks/suite.py [--rows 1000 10000] [--widths 4 16] [--benchmarks csv_read ...]
+                               [--output results.json]
+    python benchmarks/suite.py --compare before.json after.json
+
+Results are written as JSON: a meta object describing the run and a list of results, each
+with the case, the total seconds, the number of objects, objects per second, peak RSS in bytes
+and seconds per phase.  Read benchmarks take their phases from oreader.metrics.  --compare
+prints the ratio of objects per second for the cases two result files have in common.
+'''
+from __future__ import print_function
+import argparse
+import csv
+import datetime
+import json
+import multiprocessing
+import os
+import platform
+import random
+import resource
+import shutil
+import sys
+import tempfile
+import time
+import traceback
+from six.moves import queue
+from sqlalchemy.engine import create_engine
+from sqlalchemy.sql.schema import MetaData
+from oreader.base import DataObject, schema, IntegerColumn, RealColumn, StringColumn,\
+    DateColumn, BooleanColumn, relate, backrelate
+from oreader.reader_configs import CsvReaderConfig, SqaReaderConfig
+from oreader.writer_configs import CsvWriterConfig, SqaWriterConfig
+from oreader.metrics import Instrumentation, ReaderMetrics
+from oreader.sortcsv import sortcsv
+
+extra_kinds = [IntegerColumn, RealColumn, StringColumn, BooleanColumn]
+
+def extra_columns(width):
+    return [extra_kinds[i % len(extra_kinds)](name='extra%d' % i) for i in range(width)]
+
+def extra_values(rng, width):
+    values = {IntegerColumn: lambda: rng.randint(0, 100000),
+              RealColumn: lambda: round(rng.uniform(0, 1000), 2),
+              StringColumn: lambda: rng.choice(['alpha', 'beta', 'gamma', 'delta']),
+              BooleanColumn: lambda: rng.choice(['T', 'F'])}
+    return dict([(column.name, values[type(column)]()) for column in extra_columns(width)])
+
+def flat_hierarchy(width):
+    class FlatObj(DataObject):
+        partition_attribute = 'id'
+
+    @schema([IntegerColumn(name='id')] + extra_columns(width))
+    class Flat(FlatObj):
+        identity_key_ = (('id', 'id'),)
+        sort_key_ = ('id',)
+        container_key_ = (('id', 'id'),)
+
+    def generate(rng, n):
+        return [Flat(id=i, **extra_values(rng, width)) for i in range(n)]
+    return Flat, [Flat], generate
+
+def compound_hierarchy(width):
+    class MemberObj(DataObject):
+        partition_attribute = 'member_id'
+
+    @schema([IntegerColumn(name='member_id'), IntegerColumn(name='claim_id'), StringColumn(name='kind'),
+             DateColumn(name='date'), RealColumn(name='amount')] + extra_columns(width))
+    class Claim(MemberObj):
+        identity_key_ = (('member_id', 'member_id'), ('claim_id', 'claim_id'))
+        sort_key_ = ('member_id', 'claim_id')
+        container_key_ = (('member_id', 'member_id'),)
+
+    @schema([IntegerColumn(name='member_id'), StringColumn(name='name')] + extra_columns(width))
+    @relate({'claims': (Claim, True)})
+    class Member(MemberObj):
+        identity_key_ = (('member_id', 'member_id'),)
+        sort_key_ = ('member_id',)
+        container_key_ = (('member_id', 'member_id'),)
+
+    @schema([IntegerColumn(name='member_id'), StringColumn(name='plan')] + extra_columns(width))
+    @backrelate({'profile': (Member, False)})
+    class Profile(MemberObj):
+        identity_key_ = (('member_id', 'member_id'),)
+        sort_key_ = ('member_id',)
+        container_key_ = (('member_id', 'member_id'),)
+
+    def generate(rng, n):
+        members = []
+        start = datetime.date(2017, 1, 1)
+        for i in range(n):
+            member = Member(member_id=i, name='member %d' % i, **extra_values(rng, width))
+            for j in range(rng.randint(0, 6)):
+                member.claims.append(Claim(member_id=i, claim_id=j, kind=rng.choice(['rx', 'ip', 'op']),
+                                           date=start + datetime.timedelta(days=rng.randint(0, 365)),
+                                           amount=round(rng.uniform(0, 500), 2), **extra_values(rng, width)))
+            if i % 2:
+                member.profile = Profile(member_id=i, plan=rng.choice(['hmo', 'ppo']), **extra_values(rng, width))
+            members.append(member)
+        return members
+    return Member, [Member, Claim, Profile], generate
+
+def polymorphic_hierarchy(width):
+    class Event(DataObject):
+        partition_attribute = 'member_id'
+        identity_key_ = (('member_id', 'member_id'), ('event_id', 'event_id'))
+        sort_key_ = ('member_id', 'event_id')
+        container_key_ = (('member_id', 'member_id'),)
+
+    @schema([IntegerColumn(name='member_id'), IntegerColumn(name='event_id'), RealColumn(name='amount')] +
+            extra_columns(width))
+    class ClaimEvent(Event):
+        pass
+
+    @schema([IntegerColumn(name='member_id'), IntegerColumn(name='event_id'), StringColumn(name='provider')] +
+            extra_columns(width))
+    class VisitEvent(Event):
+        pass
+
+    def generate(rng, n):
+        result = []
+        for i in range(n):
+            if rng.random() < 0.5:
+                result.append(ClaimEvent(member_id=i // 4, event_id=i, amount=rng.uniform(0, 500),
+                                         **extra_values(rng, width)))
+            else:
+                result.append(VisitEvent(member_id=i // 4, event_id=i, provider='provider %d' % rng.randint(0, 99),
+                                         **extra_values(rng, width)))
+        return result
+    return Event, [ClaimEvent, VisitEvent], generate
+
+hierarchies = {'flat': flat_hierarchy, 'compound': compound_hierarchy, 'polymorphic': polymorphic_hierarchy}
+
+def count_objects(obj):
+    result = 1
+    for name, (_, many) in obj.relationships.items():
+        value = getattr(obj, name)
+        if many:
+            result += sum(count_objects(item) for item in value)
+        elif value is not None:
+            result += count_objects(value)
+    return result
+
+class Timer(object):
+    '''
+    Accumulates the seconds spent in named phases.
+    '''
+    def __init__(self):
+        self.phases = {}
+
+    def phase(self, name):
+        timer = self
+        class Phase(object):
+            def __enter__(self):
+                self.start = time.time()
+            def __exit__(self, *args):
+                timer.phases[name] = timer.phases.get(name, 0.) + time.time() - self.start
+        return Phase()
+
+def reader_phases(instrumentation):
+    '''
+    The cumulative times of all readers, by kind of time.
+    '''
+    summary = instrumentation.summary()
+    return dict([(name, sum(metrics[name] for metrics in summary.values())) for name in ReaderMetrics.timers])
+
+def csv_paths(tmpdir, classes):
+    return dict([(klass, os.path.join(tmpdir, '%s.csv' % klass.__name__)) for klass in classes])
+
+def write_csv(root, classes, objects, tmpdir):
+    paths = csv_paths(tmpdir, classes)
+    writer = root.writer(dict([(klass, CsvWriterConfig(path, header=True)) for klass, path in paths.items()]))
+    for obj in objects:
+        writer.write(obj)
+    writer.close()
+    return paths
+
+def sqa_tables(root, classes, tmpdir):
+    engine = create_engine('sqlite:///%s' % os.path.join(tmpdir, 'bench.db'))
+    metadata = MetaData(bind=engine)
+    tables = dict([(klass, klass.to_sqa_table(metadata, klass.__name__.lower())) for klass in classes])
+    metadata.create_all()
+    return engine, tables
+
+def write_sqa(root, classes, objects, tmpdir):
+    engine, tables = sqa_tables(root, classes, tmpdir)
+    writer = root.writer(dict([(klass, SqaWriterConfig(table, batch_size=1000)) for klass, table in tables.items()]))
+    for obj in objects:
+        writer.write(obj)
+    writer.close()
+    return engine, tables
+
+def read(root, config, timer):
+    instrumentation = Instrumentation()
+    count = 0
+    with timer.phase('read'):
+        reader = root.reader(config, instrumentation=instrumentation)
+        for obj in reader:
+            count += count_objects(obj)
+        reader.close()
+    timer.phases.update(reader_phases(instrumentation))
+    return count
+
+def bench_csv_write(root, classes, objects, tmpdir, timer):
+    with timer.phase('write'):
+        write_csv(root, classes, objects, tmpdir)
+    return sum(count_objects(obj) for obj in objects)
+
+def bench_csv_read(root, classes, objects, tmpdir, timer):
+    paths = write_csv(root, classes, objects, tmpdir)
+    return read(root, dict([(klass, CsvReaderConfig(path, header=True)) for klass, path in paths.items()]), timer)
+
+def bench_sqa_write(root, classes, objects, tmpdir, timer):
+    with timer.phase('write'):
+        write_sqa(root, classes, objects, tmpdir)
+    return sum(count_objects(obj) for obj in objects)
+
+def bench_sqa_read(root, classes, objects, tmpdir, timer):
+    engine, tables = write_sqa(root, classes, objects, tmpdir)
+    return read(root, dict([(klass, SqaReaderConfig(table, engine, batch_size=1000))
+                            for klass, table in tables.items()]), timer)
+
+def bench_sortcsv(root, classes, objects, tmpdir, timer):
+    path = write_csv(root, classes, objects, tmpdir)[root]
+    with open(path) as infile:
+        rows = list(csv.reader(infile))
+    random.Random(0).shuffle(rows[1:])
+    shuffled = os.path.join(tmpdir, 'shuffled.csv')
+    with open(shuffled, 'w') as outfile:
+        csv.writer(outfile).writerows(rows)
+    with timer.phase('sort'):
+        sortcsv(shuffled, os.path.join(tmpdir, 'sorted.csv'), [root.sort_key_[0]], conversions=[int],
+                tmpdir=os.path.join(tmpdir, 'sort'), tmp_size=max(1, len(objects) // 8))
+    return len(objects)
+
+def bench_tools(root, classes, objects, tmpdir, timer):
+    from oreader import tools
+    with timer.phase('aggregate'):
+        for member in objects:
+            claims = member.claims
+            tools.total(claims, 'amount', default=0.)
+            tools.mode(claims, 'kind')
+            tools.minimum(claims, 'date')
+            tools.maximum(claims, 'amount')
+            tools.latest(claims, 'amount', 'date')
+            tools.all_or_none(claims, 'kind')
+    return sum(count_objects(obj) for obj in objects)
+
+benchmarks = {'csv_write': (bench_csv_write, ('flat', 'compound', 'polymorphic')),
+              'csv_read': (bench_csv_read, ('flat', 'compound', 'polymorphic')),
+              'sqa_write': (bench_sqa_write, ('flat', 'compound', 'polymorphic')),
+              'sqa_read': (bench_sqa_read, ('flat', 'compound', 'polymorphic')),
+              'sortcsv': (bench_sortcsv, ('flat',)),
+              'tools': (bench_tools, ('compound',))}
+
+def peak_rss():
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return rss if sys.platform == 'darwin' else rss * 1024
+
+def run_case(benchmark, hierarchy, rows, width, seed=0):
+    '''
+    Run one case in this process and return its result.
+    '''
+    function = benchmarks[benchmark][0]
+    root, classes, generate = hierarchies[hierarchy](width)
+    tmpdir = tempfile.mkdtemp()
+    try:
+        timer = Timer()
+        with timer.phase('generate'):
+            objects = generate(random.Random(seed), rows)
+        timed = Timer()
+        start = time.time()
+        count = function(root, classes, objects, tmpdir, timed)
+        seconds = time.time() - start
+    finally:
+        shutil.rmtree(tmpdir)
+    phases = dict(timer.phases, **timed.phases)
+    measured = sum(timed.phases[name] for name in ('read', 'write', 'sort', 'aggregate') if name in timed.phases)
+    return {'benchmark': benchmark, 'hierarchy': hierarchy, 'rows': rows, 'width': width,
+            'seconds': measured, 'setup_seconds': seconds - measured, 'objects': count,
+            'objects_per_second': count / measured if measured else None,
+            'peak_rss_bytes': peak_rss(), 'phases': phases}
+
+def failed_case(args, key, message):
+    return {'benchmark': args[0], 'hierarchy': args[1], 'rows': args[2], 'width': args[3], key: message}
+
+def case_worker(args, output):
+    try:
+        output.put(run_case(*args))
+    except ImportError as e: # Optional dependencies, like the ones oreader.tools needs
+        output.put(failed_case(args, 'skipped', str(e)))
+    except Exception:
+        output.put(failed_case(args, 'error', traceback.format_exc()))
+
+def run_in_process(args):
+    output = multiprocessing.Queue()
+    process = multiprocessing.Process(target=case_worker, args=(args, output))
+    process.start()
+    while True:
+        try:
+            result = output.get(timeout=1)
+            break
+        except queue.Empty:
+            if not process.is_alive():
+                result = failed_case(args, 'error', 'Exited with code %s' % process.exitcode)
+                break
+    process.join()
+    return result
+
+def meta():
+    try:
+        from oreader import __version__ as version
+    except ImportError:
+        version = None
+    return {'time': datetime.datetime.now().isoformat(), 'python': platform.python_version(),
+            'platform': platform.platform(), 'processor': platform.processor(),
+            'cpus': multiprocessing.cpu_count(), 'oreader': version}
+
+def case_key(result):
+    return (result['benchmark'], result['hierarchy'], result['rows'], result['width'])
+
+def compare(before_path, after_path):
+    with open(before_path) as infile:
+        before = dict([(case_key(result), result) for result in json.load(infile)['results']])
+    with open(after_path) as infile:
+        after = dict([(case_key(result), result) for result in json.load(infile)['results']])
+    print('%10s %12s %8s %6s %15s %15s %8s' % ('benchmark', 'hierarchy', 'rows', 'width',
+                                              'before (obj/s)', 'after (obj/s)', 'ratio'))
+    for key in sorted(set(before) & set(after)):
+        old, new = before[key]['objects_per_second'], after[key]['objects_per_second']
+        if old and new:
+            print('%10s %12s %8d %6d %15.0f %15.0f %8.2f' % (key + (old, new, new / old)))
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('--rows', type=int, nargs='+', default=[1000, 10000])
+    parser.add_argument('--widths', type=int, nargs='+', default=[4, 16])
+    parser.add_argument('--benchmarks', nargs='+', choices=sorted(benchmarks.keys()),
+                        default=sorted(benchmarks.keys()))
+    parser.add_argument('--hierarchies', nargs='+', choices=sorted(hierarchies.keys()),
+                        default=sorted(hierarchies.keys()))
+    parser.add_argument('--output', default='benchmark_results.json')
+    parser.add_argument('--inline', action='store_true',
+                        help='Run cases in this process.  Peak RSS is then the peak so far.')
+    parser.add_argument('--compare', nargs=2, metavar=('BEFORE', 'AFTER'))
+    args = parser.parse_args(argv)
+    if args.compare:
+        compare(*args.compare)
+        return
+    results = []
+    for benchmark in args.benchmarks:
+        for hierarchy in benchmarks[benchmark][1]:
+            if hierarchy not in args.hierarchies:
+                continue
+            for rows in args.rows:
+                for width in args.widths:
+                    case = (benchmark, hierarchy, rows, width)
+                    result = run_case(*case) if args.inline else run_in_process(case)
+                    results.append(result)
+                    if 'skipped' in result:
+                        print('%10s %12s %8d %6d skipped: %s' % (case + (result['skipped'],)))
+                    elif 'error' in result:
+                        print('%10s %12s %8d %6d failed:\n%s' % (case + (result['error'],)))
+                    else:
+                        print('%10s %12s %8d %6d %10.3fs %12.0f obj/s %8.1f MB' %
+                              (case + (result['seconds'], result['objects_per_second'],
+                                       result['peak_rss_bytes'] / 1e6)))
+    with open(args.output, 'w') as outfile:
+        json.dump({'meta': meta(), 'results': results}, outfile, indent=2, sort_keys=True)
+    print('Wrote %s' % args.output)
+
+if __name__ == '__main__':
+    main()
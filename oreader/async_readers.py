@@ -0,0 +1,431 @@
+'''
+Readers for use with asyncio.  The async readers mirror SimpleReader, CompoundReader,
+ImplicitReader, PolymorphicReader and ReaderCollection, but are iterated with async for, so
+that many readers can assemble objects concurrently on one event loop.  Use
+DataObject.async_reader to create them.
+
+AsyncSqaReaderConfig reads through an async SQLAlchemy engine (such as one from
+sqlalchemy.ext.asyncio.create_async_engine, which needs SQLAlchemy 1.4 or later and is
+installed with the async extra), fetching rows in batches and waiting between
+retries with asyncio.sleep.  Other simple reader configs can be mixed in.  Their sources are
+read synchronously, which is fine for sources that do not block for long, like csv files.
+'''
+import asyncio
+import heapq
+import traceback
+import warnings
+from collections import OrderedDict
+from .readers import DataSourceError, SimpleReader, CompoundReader, ImplicitReader,\
+    PolymorphicReader, constant
+from .reader_configs import SqaReaderState, TupleSimpleReaderConfig
+
+async def resolve(value):
+    '''
+    Await value if it is awaitable, so that sync and async implementations can be mixed.
+    '''
+    if asyncio.iscoroutine(value) or isinstance(value, asyncio.Future):
+        return await value
+    return value
+
+async def gather_or_close(awaitables, readers):
+    '''
+    Gather awaitables, which start readers.  If any of them fails, every one of readers is 
+    closed, so that no connection is left open, and the first error is raised.
+    '''
+    results = await asyncio.gather(*awaitables, return_exceptions=True)
+    errors = [result for result in results if isinstance(result, BaseException)]
+    if errors:
+        await asyncio.gather(*[reader.close() for reader in readers], return_exceptions=True)
+        raise errors[0]
+    return results
+
+class AsyncSqaReaderState(SqaReaderState):
+    '''
+    The async counterpart of SqaReaderState.  Builds the same queries, and resumes after the
+    last row handed out in the same way when a connection fails.
+    '''
+    def __init__(self, *args, **kwargs):
+        super(AsyncSqaReaderState, self).__init__(*args, **kwargs)
+        self.connection = None
+        if self.batch_size is None:
+            self.batch_size = 1000
+
+    def __aiter__(self):
+        return self
+
+    async def release(self):
+        result_proxy, connection = self.result_proxy, self.connection
+        self.result_proxy = None
+        self.connection = None
+        try:
+            if result_proxy is not None:
+                await resolve(result_proxy.close())
+        finally:
+            if connection is not None:
+                await resolve(connection.close())
+
+    async def fresh_result_proxy(self):
+        try:
+            await self.release()
+        except Exception:
+            pass # The connection is being replaced because it failed
+        self.buffer.clear()
+        expr = self.create_expression()
+        if self.verbose:
+            print(expr)
+        self.connection = await self.engine.connect()
+        self.result_proxy = await self.connection.stream(expr)
+
+    async def fetch(self):
+        if not self.buffer:
+            self.buffer.extend(await self.result_proxy.fetchmany(self.batch_size))
+            if not self.buffer:
+                return None
+        return self.buffer.popleft()
+
+    async def __anext__(self):
+        attempt = 0
+        stop_count = 0
+        while True:
+            try:
+                if self.result_proxy is None:
+                    await self.fresh_result_proxy()
+                result = await self.fetch()
+                if self.limit_per is not None and result is None and stop_count == 0:
+                    stop_count += 1
+                    await self.fresh_result_proxy()
+                else:
+                    self.last_result = result
+                    return result
+            except Exception as e:
+                if (attempt + 1) % self.warn_every == 0:
+                    warnings.warn('Lost connection for %s reader.  Trying to re-establish.' % self.klass.__name__)
+                if attempt > self.n_tries:
+                    raise DataSourceError(e)
+                attempt += 1
+                self.retries += 1
+                await asyncio.sleep(self.wait)
+                self.result_proxy = None
+
+    async def close(self):
+        await self.release()
+
+class AsyncSqaReaderConfig(TupleSimpleReaderConfig):
+    '''
+    Like SqaReaderConfig, but engine is an async engine.  Rows are fetched batch_size at a time.
+    '''
+    def __init__(self, expression, engine, starter=None, filter=None, n_tries=100, wait=0.1,
+                 warn_every=10, limit_per=None, batch_size=1000):
+        self.expression = expression
+        self.engine = engine
+        self.starter = starter
+        self.filter = filter
+        self.n_tries = n_tries
+        self.wait = wait
+        self.warn_every = warn_every
+        self.limit_per = limit_per
+        self.batch_size = batch_size
+
+    def get_sources(self, reader):
+        kwargs = {} if self.filter is None else {'filter': self.filter}
+        return [AsyncSqaReaderState(self.expression, self.engine, reader.klass, self.starter,
+                                    n_tries=self.n_tries, wait=self.wait, warn_every=self.warn_every,
+                                    limit_per=self.limit_per, stream=False, batch_size=self.batch_size,
+                                    **kwargs)]
+
+    async def start_source(self, reader, source):
+        return source
+
+    async def stop_source(self, reader, source):
+        await source.close()
+
+class AsyncReader(object):
+    '''
+    Base of the async readers.  Readers start on the first call to __anext__ (or an explicit
+    await start()), since constructors cannot wait.
+    '''
+    def __init__(self, klass, config):
+        self.klass = klass
+        self.config = config
+        self.count = 0
+        self.started = False
+        self._peek = None
+
+    async def start(self):
+        if not self.started:
+            self.started = True
+            try:
+                await self.initialize()
+            except DataSourceError as e:
+                raise e.error
+
+    async def initialize(self):
+        await self.update()
+
+    def __aiter__(self):
+        return self
+
+    async def __anext__(self):
+        await self.start()
+        result = self.peek()
+        if result is None:
+            raise StopAsyncIteration
+        while True:
+            try:
+                self.count += 1
+                await self.update()
+                break
+            except DataSourceError as e:
+                raise e.error
+            except Exception:
+                warnings.warn('Problem reading %s object at position %d.  Skipping.' % (self.klass.__name__, self.count))
+                traceback.print_exc()
+                result = self.peek()
+                if result is None:
+                    raise StopAsyncIteration
+        return result
+
+    def peek(self):
+        return self._peek
+
+    async def update(self):
+        raise NotImplementedError
+
+    async def close(self):
+        raise NotImplementedError
+
+class AsyncReaderCollection(object):
+    '''
+    The async counterpart of ReaderCollection.  Child readers are started concurrently.
+    '''
+    def __init__(self, klasses, config, order=constant(0)):
+        self.readers = OrderedDict([(name, async_reader_class(klass, config)(klass, config))
+                                    for name, klass in klasses.items()])
+        self.order = order
+        self._peeks = OrderedDict()
+        self._positions = dict([(name, i) for i, name in enumerate(self.readers.keys())])
+        self._heap = []
+
+    async def first(self, name, reader):
+        try:
+            return await reader.__anext__()
+        except StopAsyncIteration:
+            await reader.close()
+            return None
+
+    async def start(self):
+        names = list(self.readers.keys())
+        firsts = await gather_or_close([self.first(name, self.readers[name]) for name in names], 
+                                       list(self.readers.values()))
+        for name, obj in zip(names, firsts):
+            if obj is not None:
+                self._peeks[name] = obj
+        self._heap = [self.heap_entry(name, obj) for name, obj in self._peeks.items()]
+        heapq.heapify(self._heap)
+
+    def heap_entry(self, name, obj):
+        return (obj.container_key(), self.order(obj), self._positions[name], name)
+
+    def peek(self):
+        if not self._heap:
+            return None
+        return self._peeks[self._heap[0][3]]
+
+    def peek_key(self):
+        if not self._heap:
+            return None
+        return self._heap[0][0]
+
+    def __aiter__(self):
+        return self
+
+    async def __anext__(self):
+        if not self._heap:
+            raise StopAsyncIteration
+        name = self._heap[0][3]
+        result = self._peeks[name]
+        try:
+            obj = await self.readers[name].__anext__()
+        except StopAsyncIteration:
+            heapq.heappop(self._heap)
+            del self._peeks[name]
+            await self.readers[name].close()
+        else:
+            self._peeks[name] = obj
+            heapq.heapreplace(self._heap, self.heap_entry(name, obj))
+        return result
+
+    async def close(self):
+        await asyncio.gather(*[reader.close() for reader in self.readers.values()])
+
+class AsyncSimpleReader(AsyncReader):
+    def __init__(self, klass, config):
+        super(AsyncSimpleReader, self).__init__(klass, config)
+        self.config = config[klass]
+        self.sources = self.config.get_sources(self)
+        self.source_index = -1
+        self.current_source = iter([])
+
+    async def next_source(self):
+        if self.source_index >= 0:
+            await resolve(self.config.stop_source(self, self.current_source))
+        self.source_index += 1
+        if self.source_index >= len(self.sources):
+            self.current_source = iter([])
+            return False
+        try:
+            self.current_source = await resolve(self.config.start_source(self, self.sources[self.source_index]))
+        except DataSourceError as e:
+            raise e.error
+        return True
+
+    async def next_raw(self):
+        source = self.current_source
+        if hasattr(source, '__anext__'):
+            try:
+                return await source.__anext__()
+            except StopAsyncIteration:
+                return None
+        try:
+            return next(source)
+        except StopIteration:
+            return None
+
+    async def update(self):
+        raw = await self.next_raw()
+        while raw is None and self.source_index < len(self.sources):
+            if not await self.next_source():
+                break
+            raw = await self.next_raw()
+        if raw is None:
+            self._peek = None
+        else:
+            try:
+                self._peek = self.config.translate(self, raw)
+            except Exception as e:
+                traceback.print_exc()
+                raise ValueError('Failed to translate. ' + '\n' +
+                                 'Class: ' + self.klass.__name__ + '\n' +
+                                 'Exception: ' +  repr(e))
+
+    def report(self):
+        return {self.klass.__name__: self.config}
+
+    async def close(self):
+        if 0 <= self.source_index < len(self.sources):
+            source, self.current_source = self.current_source, iter([])
+            self.source_index = len(self.sources)
+            await resolve(self.config.stop_source(self, source))
+
+class AsyncCompoundReader(AsyncReader):
+    '''Contains an AsyncSimpleReader and an AsyncReaderCollection.'''
+    def __init__(self, klass, config):
+        super(AsyncCompoundReader, self).__init__(klass, config)
+        self.simple_reader = AsyncSimpleReader(klass, config)
+        self.relatives = OrderedDict([(name, group[0]) for name, group in klass.relationships.items()])
+        self.readers = AsyncReaderCollection(self.relatives, config)
+
+    async def initialize(self):
+        await gather_or_close([self.simple_reader.start(), self.readers.start()], 
+                              [self.simple_reader, self.readers])
+        await self.update()
+
+    def report(self):
+        return {'base': self.simple_reader.report(),
+                'relatives': dict([(name, reader.report()) for name, reader in self.readers.readers.items()])}
+
+    async def attach(self, key):
+        '''
+        Attach every object in the collection with container key equal to key to the peeked object.
+        '''
+        while self.readers.peek() is not None and self.readers.peek_key() == key:
+            item = await self.readers.__anext__()
+            for name, group in self.klass.relationships.items():
+                if isinstance(item, group[0]):
+                    if group[1]:
+                        getattr(self._peek, name).append(item)
+                    else:
+                        setattr(self._peek, name, item)
+                    break
+            else:
+                raise ValueError('The ReaderCollection returned a value that doesn\'t seem to fit into any known relationships.')
+
+    async def update(self):
+        if self.simple_reader.peek() is None:
+            self._peek = None
+            return
+        self._peek = await self.simple_reader.__anext__()
+        identity_key = self._peek.identity_key()
+        while self.readers.peek() is not None and self.readers.peek_key() < identity_key:
+            warnings.warn('Orphaned %s with key %s.' % (self.readers.peek().__class__.__name__, str(self.readers.peek().identity_key())))
+            await self.readers.__anext__()
+        await self.attach(identity_key)
+
+    async def close(self):
+        await asyncio.gather(self.simple_reader.close(), self.readers.close())
+
+class AsyncImplicitReader(AsyncCompoundReader):
+    '''Contains an AsyncReaderCollection.'''
+    def __init__(self, klass, config):
+        AsyncReader.__init__(self, klass, config)
+        self.relatives = OrderedDict([(name, group[0]) for name, group in klass.relationships.items()])
+        self.readers = AsyncReaderCollection(self.relatives, config)
+
+    async def initialize(self):
+        await self.readers.start()
+        await self.update()
+
+    def report(self):
+        return {'relatives': dict([(name, reader.report()) for name, reader in self.readers.readers.items()])}
+
+    async def update(self):
+        if self.readers.peek() is None:
+            self._peek = None
+            return
+        current_key = self.readers.peek_key()
+        self._peek = self.klass(**self.klass.translate_identity_key(current_key))
+        await self.attach(current_key)
+
+    async def close(self):
+        await self.readers.close()
+
+class AsyncPolymorphicReader(AsyncReader):
+    '''Contains an AsyncReaderCollection.'''
+    def __init__(self, klass, config):
+        super(AsyncPolymorphicReader, self).__init__(klass, config)
+        klasses = {}
+        stack = [klass]
+        while stack:
+            item = stack.pop()
+            stack.extend(item.direct_subtypes())
+            if item in config:
+                klasses[item] = item
+        klasses = OrderedDict([(k, klasses[k]) for k in sorted(klasses.keys(), key=klass.typerank())])
+        self.readers = AsyncReaderCollection(klasses, config, klass.objrank())
+
+    async def initialize(self):
+        await self.readers.start()
+        await self.update()
+
+    def report(self):
+        return {'subclasses': dict([(name, reader.report()) for name, reader in self.readers.readers.items()])}
+
+    async def update(self):
+        try:
+            self._peek = await self.readers.__anext__()
+        except StopAsyncIteration:
+            self._peek = None
+
+    async def close(self):
+        await self.readers.close()
+
+async_reader_classes = {SimpleReader: AsyncSimpleReader,
+                        CompoundReader: AsyncCompoundReader,
+                        ImplicitReader: AsyncImplicitReader,
+                        PolymorphicReader: AsyncPolymorphicReader}
+
+def async_reader_class(klass, config):
+    '''
+    The async counterpart of klass.reader_class(config).
+    '''
+    return async_reader_classes[klass.reader_class(config)]
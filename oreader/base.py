@@ -1,8 +1,9 @@
 from abc import abstractmethod
 import pandas
+import numpy
 import datetime
 from .readers import PolymorphicReader, CompoundReader, ImplicitReader,\
-    SimpleReader
+    SimpleReader, BatchReader
 import random
 from frozendict import frozendict, FrozenOrderedDict
 from oreader.reader_configs import SimpleReaderConfig
@@ -11,13 +12,17 @@ from oreader.writers import SimpleWriter, PolymorphicWriter, CompoundWriter,\
     ImplicitWriter
 from oreader.writer_configs import SimpleWriterConfig
 import traceback
+import re
 import arrow
 from arrow.parser import ParserError
 from sqlalchemy.sql.sqltypes import Integer, String, Float, Date, DateTime,\
     Boolean
 from sqlalchemy.sql.schema import Column, Table
 from six import text_type
+from functools import lru_cache
 from toolz.dicttoolz import valmap
+from . import codegen
+from .async_readers import async_reader_class
 
 class classproperty(property):
     def __get__(self, cls, owner):
@@ -28,7 +33,8 @@ def _backrelate(cls, relationships):
         d = {k: tuple([cls] + [v[i] for i in range(1,len(v))])}
         d.update(v[0].relationships)
         v[0].relationships = FrozenOrderedDict(d)
-        v[0].init_relationships()
+        _relationships_changed(v[0])
+    cls._backrelated = cls.__dict__.get('_backrelated', ()) + tuple((v[0], k) for k, v in relationships.items())
     return cls
 
 def backrelate(relationships):
@@ -39,13 +45,71 @@ def _relate(cls, relationships):
         d = {k: v}
         d.update(cls.relationships)
         cls.relationships = FrozenOrderedDict(d)
-    cls.init_relationships()
+    _relationships_changed(cls)
     return cls
         
 def relate(relationships):
     return lambda cls: _relate(cls, relationships)
 
+def _relationships_changed(cls):
+    cls.init_relationships()
+    for klass in cls.subtypes():
+        if hasattr(klass, 'columns'):
+            compile_methods(klass)
+
+def masked_array(converted, dtype=object):
+    '''
+    A numpy masked array of dtype holding the sequence of already converted values, masked 
+    where they are None.  Values that do not fit in dtype, like integers that overflow int64, 
+    give an array of object dtype instead.
+    '''
+    converted = list(converted)
+    mask = numpy.fromiter((value is None for value in converted), dtype=bool, count=len(converted))
+    if dtype is not object:
+        if mask.any():
+            fill = numpy.zeros((), dtype=dtype).item()
+            filled = [fill if value is None else value for value in converted]
+        else:
+            filled = converted
+        try:
+            return numpy.ma.masked_array(numpy.array(filled, dtype=dtype), mask=mask)
+        except (TypeError, ValueError, OverflowError):
+            pass
+    data = numpy.empty(len(converted), dtype=object)
+    data[:] = converted
+    return numpy.ma.masked_array(data, mask=mask)
+
+def _numeric_array(column, values):
+    '''
+    Conversion of raw values for a numeric column.  A block in which every value parses with 
+    column.parse goes straight into an array without any per value bookkeeping.  Other blocks, 
+    with blanks or bad values, are converted one value at a time.
+    '''
+    try:
+        return numpy.ma.masked_array(numpy.fromiter(map(column.parse, values), dtype=column.array_dtype, 
+                                                    count=len(values)), mask=False)
+    except (TypeError, ValueError, OverflowError):
+        return masked_array([column.convert(value) for value in values], column.array_dtype)
+
+def _factorized_array(column, values):
+    '''
+    Convert each distinct value of values once and spread the results back out.  Suits columns 
+    with few distinct values, like dates and flags.  Missing values are factorized along with 
+    the rest, so they are converted like any other value.
+    '''
+    data = numpy.empty(len(values), dtype=object)
+    data[:] = values
+    try:
+        codes, uniques = pandas.factorize(data, use_na_sentinel=False)
+    except TypeError: # Before pandas 1.5
+        codes, uniques = pandas.factorize(data, na_sentinel=None)
+    converted = masked_array([column.convert(value) for value in uniques], column.array_dtype)
+    return numpy.ma.masked_array(converted.data[codes], mask=numpy.ma.getmaskarray(converted)[codes])
+
 class OColumn(object):
+    # The dtype of the arrays returned by convert_array
+    array_dtype = object
+    
     def __init__(self, **kwargs):
         self.name = kwargs['name']
         if 'random' in kwargs:
@@ -57,6 +121,20 @@ class OColumn(object):
     def to_sqa(self):
         return Column(self.name, self.sqa_type)
     
+    def convert_array(self, values):
+        '''
+        Convert a sequence of raw values all at once.  Returns a numpy masked array of 
+        array_dtype that is masked where convert would give None, and otherwise holds the 
+        values convert would give.  Raises whatever convert raises for a bad value.
+        '''
+        return masked_array([self.convert(value) for value in values], self.array_dtype)
+    
+    def to_array(self, converted):
+        '''
+        A masked array of array_dtype holding already converted values, masked where they are None.
+        '''
+        return masked_array(converted, self.array_dtype)
+    
 class StringColumn(OColumn):
     sqa_type = String()
     def __init__(self, **kwargs):
@@ -73,6 +151,17 @@ class StringColumn(OColumn):
         else:
             val = str(value)
         return val.strip() if self.strip else val
+    
+    def convert_array(self, values):
+        if None in values:
+            return super(StringColumn, self).convert_array(values)
+        try:
+            converted = list(map(str.strip if self.strip else str, values))
+        except TypeError:
+            return super(StringColumn, self).convert_array(values)
+        data = numpy.empty(len(converted), dtype=object)
+        data[:] = converted
+        return numpy.ma.masked_array(data, mask=False)
 
     def unconvert(self, value):
         if value is None:
@@ -81,6 +170,12 @@ class StringColumn(OColumn):
     
 class RealColumn(OColumn):
     sqa_type = Float()
+    array_dtype = numpy.float64
+    parse = float
+    
+    def convert_array(self, values):
+        return _numeric_array(self, values)
+    
     def convert(self, value):
         if value is None:
             return value
@@ -102,6 +197,12 @@ class RealColumn(OColumn):
     
 class IntegerColumn(OColumn):
     sqa_type = Integer()
+    array_dtype = numpy.int64
+    parse = int
+    
+    def convert_array(self, values):
+        return _numeric_array(self, values)
+    
     def convert(self, value):
         try:
             value = value.strip()
@@ -121,19 +222,71 @@ class IntegerColumn(OColumn):
             return None
         return str(value)
 
-class DateColumn(OColumn):
-    sqa_type = Date
+# Formats that can be parsed and formatted without arrow.  Each maps to a pattern whose groups 
+# are the integer fields of a datetime, and the corresponding % template for formatting.
+fast_formats = {'YYYY-MM-DD': (re.compile(r'([0-9]{4})-([0-9]{2})-([0-9]{2})\Z'), 
+                               '%04d-%02d-%02d'),
+                'YYYYMMDD': (re.compile(r'([0-9]{4})([0-9]{2})([0-9]{2})\Z'), 
+                             '%04d%02d%02d'),
+                'YYYY-MM-DD HH:mm:ss': (re.compile(r'([0-9]{4})-([0-9]{2})-([0-9]{2}) ([0-9]{2}):([0-9]{2}):([0-9]{2})\Z'), 
+                                        '%04d-%02d-%02d %02d:%02d:%02d')}
+
+# The tzinfo arrow gives to values parsed without a time zone
+utc = arrow.Arrow(1970, 1, 1).tzinfo
+
+class TemporalColumn(OColumn):
+    '''
+    Base for columns whose values are parsed from and formatted to strings with an arrow 
+    format.  Parsing and formatting are memoized in bounded LRU caches, since date columns 
+    typically have few distinct values.  The caches' cache_info() methods report hits and misses.
+    Formats in fast_formats are handled without arrow.
+    '''
+    default_format = None
+    default_cache_size = 4096
+    
     def __init__(self, **kwargs):
-        super(DateColumn,self).__init__(**kwargs)
-        self.format = kwargs.get('format', 'YYYY-MM-DD')
-        
+        self.format = kwargs.get('format', self.default_format)
+        self.cache_size = int(kwargs.get('cache_size', None) or self.default_cache_size)
+        self.fast_format = fast_formats.get(self.format)
+        self.parse_cache = lru_cache(maxsize=self.cache_size)(self.parse)
+        self.format_cache = lru_cache(maxsize=self.cache_size)(self.format_value)
+        super(TemporalColumn,self).__init__(**kwargs)
+    
+    def parse_datetime(self, value):
+        '''
+        Parse value with self.format into a datetime, raising ParserError or ValueError on failure.
+        Only strings go through the fast format; anything else is left to arrow.
+        '''
+        if self.fast_format is not None and type(value) is str:
+            match = self.fast_format[0].match(value)
+            if match is not None:
+                try:
+                    return datetime.datetime(*map(int, match.groups()), tzinfo=utc)
+                except ValueError:
+                    pass # arrow has the final word on values like hour 24
+        return arrow.get(value, self.format).datetime
+    
+    def format_value(self, value, tzinfo=None):
+        '''
+        Format value with self.format.  The tzinfo argument is ignored, and only serves to keep 
+        equal datetimes in different time zones apart in format_cache.
+        '''
+        if self.fast_format is not None:
+            if type(value) is datetime.datetime:
+                fields = (value.year, value.month, value.day, value.hour, value.minute, value.second)
+            elif type(value) is datetime.date:
+                fields = (value.year, value.month, value.day, 0, 0, 0)
+            else:
+                fields = None
+            if fields is not None:
+                return self.fast_format[1] % fields[:self.fast_format[0].groups]
+        return arrow.get(value).format(self.format)
+    
     def convert(self, value):
         if value is None:
             return value
-        if type(value) is datetime.date:
-            return arrow.get(value).date()
-        if type(value) is datetime.datetime:
-            return arrow.get(value).date()
+        if type(value) is datetime.date or type(value) is datetime.datetime:
+            return self.convert_temporal(value)
         try:
             value = value.strip()
         except AttributeError:
@@ -141,49 +294,65 @@ class DateColumn(OColumn):
         if not value:
             return None
         try:
-            return arrow.get(value, self.format).date()
-        except (ParserError, ValueError):
-            return None
+            return self.parse_cache(value)
+        except TypeError: # Unhashable
+            return self.parse(value)
+    
+    def convert_array(self, values):
+        return _factorized_array(self, values)
     
     def unconvert(self, value):
         if value is None:
             return None
-        return arrow.get(value).format(self.format)
+        try:
+            return self.format_cache(value, getattr(value, 'tzinfo', None))
+        except TypeError: # Unhashable
+            return self.format_value(value)
 
-class DateTimeColumn(OColumn):
-    sqa_type = DateTime
-    def __init__(self, **kwargs):
-        super(DateTimeColumn,self).__init__(**kwargs)
-        self.format = kwargs.get('format', 'YYYY-MM-DD HH:mm:ss')
-        
-    def convert(self, value):
-        if value is None:
-            return value
-        if type(value) is datetime.date:
-            return datetime.datetime(value.year, value.month, value.day, 0, 0, 0)
+class DateColumn(TemporalColumn):
+    sqa_type = Date
+    default_format = 'YYYY-MM-DD'
+    array_dtype = 'datetime64[D]'
+    
+    def convert_temporal(self, value):
         if type(value) is datetime.datetime:
-            return value
-        try:
-            value = value.strip()
-        except AttributeError:
-            pass
-        if not value:
-            return None
+            return value.date()
+        return value
+    
+    def parse(self, value):
         try:
-            return arrow.get(value,self.format).datetime
+            return self.parse_datetime(value).date()
         except (ParserError, ValueError):
             return None
+
+class DateTimeColumn(TemporalColumn):
+    sqa_type = DateTime
+    default_format = 'YYYY-MM-DD HH:mm:ss'
+    # Parsed datetimes carry a time zone, which datetime64 cannot hold
+    array_dtype = object
     
-    def unconvert(self, value):
-        if value is None:
+    def convert_temporal(self, value):
+        if type(value) is datetime.date:
+            return datetime.datetime(value.year, value.month, value.day, 0, 0, 0)
+        return value
+    
+    def parse(self, value):
+        try:
+            return self.parse_datetime(value)
+        except (ParserError, ValueError):
             return None
-        return arrow.get(value).format(self.format)
 
 class BooleanColumn(OColumn):
     sqa_type = Boolean
     true_flags = {'1', 1, 't', 'T', 'true', 'True', 1.0, '1.0', '1.', 'y', 'Y', 'Yes', 'yes', 'YES'}
     false_flags = {'0', 0, 'f', 'F', 'false', 'False', 0.0, '0.0', '0.', 'n', 'N', 'No', 'no', 'NO'}
     none_flags = {''}
+    array_dtype = numpy.bool_
+    
+    def convert_array(self, values):
+        # The flag sets are small, so each distinct value is looked up once
+        return _factorized_array(self, values)
+    
     def convert(self, value):
         try:
             value = value.strip()
@@ -264,28 +433,177 @@ sqa_args = {str: {'format': None},
             bool: {},
             Decimal: {}}
 
-def _schema(cls,columns):
+def _schema(cls,columns,slots=False):
     cls.columns = tuple(columns)
     cls.columns_by_name = frozendict([(col.name, col) for col in cls.columns])
     cls.init_schema()
+    if slots:
+        return slotted(cls)
+    compile_methods(cls)
     return cls
     
-def schema(columns):
-    return lambda cls: _schema(cls,columns)
+def schema(columns, slots=False):
+    '''
+    Class decorator that sets the columns of a DataObject class.  If slots is True, the 
+    decorator returns a subclass of the decorated class whose columns and relationships are 
+    stored in __slots__ and whose __init__, __getstate__, to_row and key methods are generated 
+    for its columns.  Column and relationship names must then be valid identifiers.  See 
+    slotted.
+    '''
+    return lambda cls: _schema(cls,columns,slots)
 
-def csv_schema(filename):
+def csv_schema(filename, slots=False):
     table = pandas.read_csv(filename,dtype=object)
     table = table.fillna('')
     columns = []
     for _, row in table.iterrows():
         columns.append(types[row['type']](**row))
-    return schema(columns)
+    return schema(columns, slots)
 
-def sqa_schema(table):
+def sqa_schema(table, slots=False):
     columns = []
     for sqa_col in table.columns:
         columns.append(sqa_types[sqa_col.type.python_type](name=sqa_col.name, **sqa_args[sqa_col.type.python_type]))
-    return schema(columns)
+    return schema(columns, slots)
+
+def conversion_error(column, value):
+    traceback.print_exc()
+    try:
+        error_string = 'Unable to convert value %s for field %s' % (value, column.name)
+    except:
+        error_string = 'Unable to convert value for field %s' % (column.name)
+    return ValueError(error_string)
+
+def unexpected_arguments(obj, kwargs):
+    unexpected = dict([(k, v) for k, v in kwargs.items() if k not in obj.__class__.columns_by_name])
+    return TypeError('Unexpected argument(s) initializing %s: %s' % (obj.__class__.__name__, str(unexpected)))
+
+def _inline_conversion(column, i):
+    '''
+    Source lines that convert the variable value in place the same way column.convert would, 
+    for the simple column types.  Other columns call convert_i.
+    '''
+    if type(column) is IntegerColumn or type(column) is RealColumn:
+        target = 'int' if type(column) is IntegerColumn else 'float'
+        return ['if type(value) is not %s:' % target,
+                '    try:',
+                '        value = %s(value)' % target,
+                '    except (TypeError, ValueError):',
+                '        value = convert_%d(value)' % i]
+    elif type(column) is StringColumn:
+        return ['if type(value) is not str:',
+                '    value = convert_%d(value)' % i] + \
+                (['else:',
+                  '    value = value.strip()'] if column.strip else [])
+    elif type(column) is BooleanColumn:
+        return ['if type(value) is str:',
+                '    value = value.strip()',
+                'try:',
+                '    value = flags_%d[value]' % i,
+                'except KeyError:',
+                '    value = convert_%d(value)' % i]
+    return ['value = convert_%d(value)' % i]
+
+def _boolean_flags(column):
+    flags = dict([(flag, None) for flag in column.none_flags])
+    flags.update([(flag, False) for flag in column.false_flags])
+    flags.update([(flag, True) for flag in column.true_flags])
+    return flags
+
+def _replaceable(cls, name):
+    '''
+    Whether the method name of cls is the generic DataObject one or a generated one, rather 
+    than one written by hand.
+    '''
+    method = getattr(cls, name)
+    method = getattr(method, '__func__', method)
+    generic = getattr(DataObject, name)
+    generic = getattr(generic, '__func__', generic)
+    return method is generic or hasattr(method, '__source__')
+
+def compile_methods(cls):
+    '''
+    Generate the methods of cls that are specialized to its columns and relationships.  Every 
+    class with a schema gets a generated from_row, from_values and key methods, and a 
+    generated __eq__ and __hash__ unless its __getstate__ is written by hand.  Slotted classes 
+    also get generated __init__, __getstate__ and to_row methods.  Methods written by hand on 
+    cls or its bases are left alone.  Called again whenever the columns or relationships change.
+    '''
+    filename = '<oreader compiled %s>' % cls.__name__
+    namespace = {'conversion_error': conversion_error, 
+                 'unexpected_arguments': unexpected_arguments,
+                 'new': object.__new__}
+    for i, column in enumerate(cls.columns):
+        if type(column) is BooleanColumn:
+            namespace['flags_%d' % i] = _boolean_flags(column)
+    builders = []
+    if _replaceable(cls, '__init__'):
+        builders.append((codegen.from_row_source(cls, _inline_conversion), DataObject.from_row.__func__, True))
+        builders.append((codegen.from_values_source(cls), None, True))
+    else:
+        for name in ('from_row', 'from_values'):
+            if _replaceable(cls, name):
+                setattr(cls, name, DataObject.__dict__[name])
+    if _replaceable(cls, '__getstate__'):
+        builders.extend([(codegen.eq_source(cls), DataObject.__eq__, False),
+                         (codegen.hash_source(cls), DataObject.__hash__, False)])
+    if cls._compiled:
+        builders.extend([(codegen.init_source(cls), None, False),
+                         (codegen.getstate_source(cls), DataObject.__getstate__, False),
+                         (codegen.to_row_source(cls), DataObject.to_row, False)])
+    for method, key in (('sort_key', 'sort_key_'), ('identity_key', 'identity_key_'), 
+                        ('container_key', 'container_key_')):
+        attributes = getattr(cls, key, None)
+        if attributes is None:
+            continue
+        if key != 'sort_key_':
+            attributes = [v for _, v in attributes]
+        builders.append((codegen.key_source(method, attributes), None, False))
+    for (name, lines, extra), fallback, is_classmethod in builders:
+        if not _replaceable(cls, name):
+            continue
+        extra.update(namespace)
+        extra['fallback'] = fallback
+        function = codegen.make_function(name, lines, extra, filename)
+        setattr(cls, name, classmethod(function) if is_classmethod else function)
+
+def slotted(cls):
+    '''
+    Create a subclass of cls that keeps its columns and relationships in __slots__, with 
+    compiled methods.  The subclass stands in for cls everywhere:  it takes the name of cls, 
+    replaces cls in the relationships of classes that cls was backrelated to, and replaces 
+    cls among the direct_subtypes of its parents.  Instances still have a __dict__, because 
+    DataObject and the classes above cls do not declare __slots__.  It is empty unless other 
+    attributes are set, such as the hash that freeze caches there.
+    '''
+    names = [col.name for col in cls.columns]
+    names.extend([name for name in cls.relationships.keys() if name not in names])
+    bad_names = [name for name in names if not codegen.is_identifier(name)]
+    if bad_names:
+        raise ValueError('Slotted classes require identifier names.  The following names are not compliant: %s' % str(bad_names))
+    namespace = {'__slots__': tuple(names),
+                 '__module__': cls.__module__,
+                 '__doc__': cls.__doc__,
+                 '__setstate__': _slotted_setstate,
+                 '_compiled': True}
+    result = type(cls)(cls.__name__, (cls,), namespace)
+    if hasattr(cls, '__qualname__'):
+        result.__qualname__ = cls.__qualname__
+    cls._slotted_class = result
+    for parent, name in cls.__dict__.get('_backrelated', ()):
+        for klass in parent.subtypes():
+            relationships = klass.__dict__.get('relationships')
+            if relationships is None or relationships.get(name, (None,))[0] is not cls:
+                continue
+            klass.relationships = FrozenOrderedDict([(k, (result,) + tuple(v[1:]) if k == name else v) 
+                                                     for k, v in relationships.items()])
+            _relationships_changed(klass)
+    compile_methods(result)
+    return result
+
+def _slotted_setstate(self, state):
+    for k, v in state.items():
+        setattr(self, k, v)
 
 def freeze(obj):
     if type(obj) is dict:
@@ -321,6 +639,25 @@ class DataObject(object):
             else:
                 setattr(self,k,None)
     
+    @classmethod
+    def from_row(cls, row):
+        '''
+        Create an object from a sequence of raw values in column order.  Classes with a schema 
+        replace this with a generated version that converts the values inline.
+        '''
+        return cls(**dict(zip([col.name for col in cls.columns], row)))
+    
+    @classmethod
+    def from_values(cls, row):
+        '''
+        Create an object from a sequence of already converted values in column order, such as 
+        the rows of a block converted with convert_array.  The values are not converted again.
+        '''
+        self = cls()
+        for column, value in zip(cls.columns, row):
+            setattr(self, column.name, value)
+        return self
+    
     @classmethod
     def to_sqa_table(cls, metadata, name, **kwargs):
         '''
@@ -346,12 +683,32 @@ class DataObject(object):
         self.__dict__.update(state)
         
     def __eq__(self, other):
-        # TODO: This could be made much faster by a custom implementation
+        # Classes with a schema replace this with a generated version that compares tuples
         return self.__class__ is other.__class__ and self.__getstate__() == other.__getstate__()
     
     def __hash__(self):
+        if self._hash is not None:
+            return self._hash
         return hash((self.__class__, frozendict(valmap(freeze, self.__getstate__()).items())))
     
+    _hash = None # Set by freeze
+    
+    def freeze(self):
+        '''
+        Declare that this object and its related objects will not change again, so that their 
+        hashes are computed once and cached.  An object changed after it is frozen keeps its 
+        old hash.  Returns self.
+        '''
+        for name, relationship in self.relationships.items():
+            value = getattr(self, name, None)
+            if value is None:
+                continue
+            for obj in (value if relationship[1] else [value]):
+                obj.freeze()
+        self._hash = None
+        self._hash = hash(self)
+        return self
+    
     def to_row(self):
         return [col.unconvert(getattr(self,col.name,None)) for col in self.columns]
     
@@ -377,13 +734,30 @@ class DataObject(object):
     
     relationships = FrozenOrderedDict()
     
+    _compiled = False
+    
+    def __init_subclass__(cls, **kwargs):
+        super(DataObject, cls).__init_subclass__(**kwargs)
+        # Key methods generated for a base class do not know about keys redefined here
+        if hasattr(cls, 'columns') and any(key in cls.__dict__ for key in 
+                                           ('sort_key_', 'identity_key_', 'container_key_')):
+            compile_methods(cls)
+    
+    @classmethod
+    def direct_subtypes(cls):
+        '''
+        The immediate subclasses of cls, with any class decorated by schema(..., slots=True) 
+        replaced by its slotted subclass.
+        '''
+        return [item.__dict__.get('_slotted_class', item) for item in cls.__subclasses__()]
+    
     @classmethod
     def subtypes(cls):
         stack = [cls]
         result = []
         while stack:
             item = stack.pop()
-            stack.extend(item.__subclasses__())
+            stack.extend(item.direct_subtypes())
             result.append(item)
         return result
     
@@ -511,11 +885,11 @@ class DataObject(object):
     
     @classmethod
     def concrete(cls):
-        return not cls.__subclasses__()
+        return not cls.direct_subtypes()
     
     @classmethod
     def reader_class(cls, config):
-        if cls.__subclasses__():
+        if cls.direct_subtypes():
             assert cls not in config
             return PolymorphicReader
         elif cls.relationships:
@@ -530,7 +904,7 @@ class DataObject(object):
     
     @classmethod
     def writer_class(cls, config):
-        if cls.__subclasses__():
+        if cls.direct_subtypes():
             assert cls not in config
             return PolymorphicWriter
         elif cls.relationships:
@@ -544,8 +918,29 @@ class DataObject(object):
             return SimpleWriter
     
     @classmethod
-    def reader(cls, config):
-        return cls.reader_class(config)(cls,config)
+    def reader(cls, config, batch_size=None, batch_format='dataframe', executor=None, chunk_size=100,
+               instrumentation=None):
+        '''
+        Read objects of cls as configured by config.  If batch_size is given, read columnar 
+        batches instead.  See BatchReader.  If executor is given, the readers of the relatives or 
+        subclasses of cls are run concurrently in it, chunk_size objects at a time.  See 
+        ReaderCollection.  If instrumentation (an oreader.metrics.Instrumentation) is given, 
+        every reader keeps metrics.
+        '''
+        if batch_size is not None:
+            return BatchReader(cls, config, batch_size, batch_format)
+        reader_class = cls.reader_class(config)
+        if executor is not None and reader_class is not SimpleReader:
+            return reader_class(cls, config, executor=executor, chunk_size=chunk_size, 
+                                instrumentation=instrumentation)
+        return reader_class(cls, config, instrumentation=instrumentation)
+    
+    @classmethod
+    def async_reader(cls, config):
+        '''
+        Like reader, but the result is iterated with async for.  See oreader.async_readers.
+        '''
+        return async_reader_class(cls, config)(cls, config)
     
     @classmethod
     def writer(cls, config):
@@ -0,0 +1,190 @@
+'''
+Source generation for the compiled methods of DataObject classes.  Each builder returns
+the source of a single function along with the namespace it should be executed in.  The
+functions are specialized to one class, so per-column dispatch happens once when the
+class is compiled rather than once per object.
+'''
+import keyword
+import re
+
+_identifier = re.compile(r'^[A-Za-z_][A-Za-z0-9_]*$')
+
+def is_identifier(name):
+    return bool(_identifier.match(name)) and not keyword.iskeyword(name)
+
+def attribute(obj, name):
+    '''
+    Source for reading attribute name from obj.
+    '''
+    if is_identifier(name):
+        return '%s.%s' % (obj, name)
+    return 'getattr(%s, %r)' % (obj, name)
+
+def assignment(obj, name, value):
+    '''
+    Source for setting attribute name on obj to value.
+    '''
+    if is_identifier(name):
+        return '%s.%s = %s' % (obj, name, value)
+    return 'setattr(%s, %r, %s)' % (obj, name, value)
+
+def make_function(name, lines, namespace, filename):
+    '''
+    Execute the source given by lines in namespace and return the function it defines.
+    '''
+    source = '\n'.join(lines) + '\n'
+    namespace = dict(namespace)
+    exec(compile(source, filename, 'exec'), namespace)
+    result = namespace[name]
+    result.__source__ = source
+    return result
+
+def init_source(klass):
+    '''
+    An __init__ equivalent to DataObject.__init__ for the current columns and relationships
+    of klass.
+    '''
+    namespace = {}
+    lines = ['def __init__(self, **kwargs):',
+             '    found = 0']
+    for i, column in enumerate(klass.columns):
+        namespace['column_%d' % i] = column
+        namespace['convert_%d' % i] = column.convert
+        lines.extend(['    if %r in kwargs:' % column.name,
+                      '        try:',
+                      '            %s' % assignment('self', column.name, 'convert_%d(kwargs[%r])' % (i, column.name)),
+                      '        except Exception:',
+                      '            raise conversion_error(column_%d, kwargs[%r])' % (i, column.name),
+                      '        found += 1',
+                      '    else:',
+                      '        %s' % assignment('self', column.name, 'None')])
+    lines.extend(['    if found != len(kwargs):',
+                  '        raise unexpected_arguments(self, kwargs)'])
+    for name, relationship in klass.relationships.items():
+        lines.append('    %s' % assignment('self', name, '[]' if relationship[1] else 'None'))
+    return '__init__', lines, namespace
+
+def getstate_source(klass):
+    '''
+    A __getstate__ that builds the state dict in one expression, falling back to fallback
+    if any attribute is missing.
+    '''
+    items = ['%r: %s' % (name, attribute('self', name)) for name in state_names(klass)]
+    lines = ['def __getstate__(self):',
+             '    try:',
+             '        return {%s}' % ', '.join(items),
+             '    except AttributeError:',
+             '        return fallback(self)']
+    return '__getstate__', lines, {}
+
+def state_names(klass):
+    '''
+    The names of the columns and relationships of klass, in the order of its state.
+    '''
+    return [column.name for column in klass.columns] + sorted(klass.relationships.keys())
+
+def eq_source(klass):
+    '''
+    An __eq__ that compares the tuples of the columns and relationships of two objects of the 
+    same class, falling back to fallback if any attribute is missing.  Related objects are 
+    compared by their own __eq__ as the tuples are.
+    '''
+    names = state_names(klass)
+    lines = ['def __eq__(self, other):',
+             '    if self is other:',
+             '        return True',
+             '    if self.__class__ is not other.__class__:',
+             '        return False',
+             '    try:',
+             '        return (%s) == (%s)' % (''.join(attribute('self', name) + ', ' for name in names).rstrip(), 
+                                             ''.join(attribute('other', name) + ', ' for name in names).rstrip()),
+             '    except AttributeError:',
+             '        return fallback(self, other)']
+    return '__eq__', lines, {}
+
+def hash_source(klass):
+    '''
+    A __hash__ of the tuple of the class, columns and relationships of an object, with lists 
+    of related objects as tuples, falling back to fallback if any attribute is missing.  The 
+    hash cached by DataObject.freeze is returned if there is one.
+    '''
+    items = ['self.__class__']
+    for name in state_names(klass):
+        item = attribute('self', name)
+        if name in klass.relationships and klass.relationships[name][1]:
+            item = 'tuple(%s)' % item
+        items.append(item)
+    lines = ['def __hash__(self):',
+             '    result = self._hash',
+             '    if result is not None:',
+             '        return result',
+             '    try:',
+             '        return hash((%s))' % ''.join(item + ', ' for item in items).rstrip(),
+             '    except AttributeError:',
+             '        return fallback(self)']
+    return '__hash__', lines, {}
+
+def to_row_source(klass):
+    '''
+    A to_row that unconverts every column in one list expression, falling back to fallback
+    if any attribute is missing.
+    '''
+    namespace = {}
+    items = []
+    for i, column in enumerate(klass.columns):
+        namespace['unconvert_%d' % i] = column.unconvert
+        items.append('unconvert_%d(%s)' % (i, attribute('self', column.name)))
+    lines = ['def to_row(self):',
+             '    try:',
+             '        return [%s]' % ', '.join(items),
+             '    except AttributeError:',
+             '        return fallback(self)']
+    return 'to_row', lines, namespace
+
+def key_source(name, attributes):
+    '''
+    A method called name returning the tuple of the given attributes.
+    '''
+    items = [attribute('self', attr) for attr in attributes]
+    lines = ['def %s(self):' % name,
+             '    return (%s)' % ''.join(item + ', ' for item in items).rstrip()]
+    return name, lines, {}
+
+def from_row_source(klass, inline):
+    '''
+    A classmethod that creates an instance of klass from a sequence of raw values in column 
+    order without going through keyword arguments.  inline(column, i) gives the source lines 
+    that convert the variable value for column i.  Rows shorter than the columns go to fallback.
+    '''
+    namespace = {}
+    lines = ['def from_row(cls, row):',
+             '    if len(row) < %d:' % len(klass.columns),
+             '        return fallback(cls, row)',
+             '    self = new(cls)']
+    for i, column in enumerate(klass.columns):
+        namespace['column_%d' % i] = column
+        namespace['convert_%d' % i] = column.convert
+        lines.extend(['    value = row[%d]' % i,
+                      '    try:'])
+        lines.extend(['        ' + line for line in inline(column, i)])
+        lines.extend(['    except Exception:',
+                      '        raise conversion_error(column_%d, row[%d])' % (i, i),
+                      '    %s' % assignment('self', column.name, 'value')])
+    for name, relationship in klass.relationships.items():
+        lines.append('    %s' % assignment('self', name, '[]' if relationship[1] else 'None'))
+    lines.append('    return self')
+    return 'from_row', lines, namespace
+
+def from_values_source(klass):
+    '''
+    A classmethod that creates an instance of klass from a sequence of already converted values 
+    in column order.
+    '''
+    lines = ['def from_values(cls, row):',
+             '    self = new(cls)']
+    for i, column in enumerate(klass.columns):
+        lines.append('    %s' % assignment('self', column.name, 'row[%d]' % i))
+    for name, relationship in klass.relationships.items():
+        lines.append('    %s' % assignment('self', name, '[]' if relationship[1] else 'None'))
+    lines.append('    return self')
+    return 'from_values', lines, {}
@@ -0,0 +1,81 @@
+'''
+Instrumentation for readers.  Pass an Instrumentation to DataObject.reader and every reader in
+the resulting tree keeps a ReaderMetrics, which is included in its report() and summarized per
+reader by Instrumentation.summary.  Readers without an Instrumentation keep no metrics and only
+pay for checking that they have none.
+'''
+import time
+
+class ReaderMetrics(object):
+    '''
+    Counters and cumulative times, in seconds, of one reader.
+
+    rows : raw rows read from the sources of a SimpleReader
+    objects : objects the reader gave
+    skipped : objects skipped with a warning after a problem reading them
+    retries : attempts to re-establish a connection, as counted by the sources
+    fetch_time : time a SimpleReader spent getting raw rows from its sources
+    translate_time : time a SimpleReader spent translating raw rows into objects
+    assembly_time : time a compound, implicit or polymorphic reader spent putting objects
+                    together, not counting time in its child readers
+    merge_time : time the ReaderCollection of the reader spent ordering the objects of its
+                 child readers, not counting time in the child readers
+    '''
+    counters = ('rows', 'objects', 'skipped', 'retries')
+    timers = ('fetch_time', 'translate_time', 'assembly_time', 'merge_time')
+
+    def __init__(self):
+        for name in self.counters:
+            setattr(self, name, 0)
+        for name in self.timers:
+            setattr(self, name, 0.)
+        self.child_time = 0. # Time in child readers, subtracted from assembly_time
+
+    def as_dict(self):
+        return dict([(name, getattr(self, name)) for name in self.counters + self.timers])
+
+class Instrumentation(object):
+    '''
+    Collects the metrics of a tree of readers.
+
+    callback : If given, called with summary() at most every interval seconds while objects are
+               being read, and by close().  With an executor, it may be called from the threads
+               of the executor.
+    interval : Seconds between calls to callback.
+    '''
+    def __init__(self, callback=None, interval=10.):
+        self.callback = callback
+        self.interval = interval
+        self.readers = []
+        self.next_call = time.time() + interval
+
+    def register(self, reader):
+        '''
+        Start keeping metrics for reader and return them.
+        '''
+        self.readers.append(reader)
+        return ReaderMetrics()
+
+    def tick(self):
+        if self.callback is not None and time.time() >= self.next_call:
+            self.next_call = time.time() + self.interval
+            self.callback(self.summary())
+
+    def summary(self):
+        '''
+        A dict from '<class name>/<reader type>' to the metrics dict of that reader.  Metrics of
+        readers with the same class and type, as in different branches of a polymorphic tree,
+        are added up.
+        '''
+        result = {}
+        for reader in self.readers:
+            name = '%s/%s' % (reader.klass.__name__, type(reader).__name__)
+            metrics = reader.current_metrics()
+            if name in result:
+                metrics = dict([(key, value + metrics[key]) for key, value in result[name].items()])
+            result[name] = metrics
+        return result
+
+    def close(self):
+        if self.callback is not None:
+            self.callback(self.summary())
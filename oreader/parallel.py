@@ -0,0 +1,232 @@
+'''
+Partition-parallel reading.  The SqaReaderConfigs of a reader config are split into disjoint
+partitions on each class's partition_attribute, and each partition is read by its own worker
+process.  Because every class in a compound hierarchy partitions on the same attribute, each
+worker can assemble complete compound objects for its partition.  CsvReaderConfigs of sorted 
+files can be split into range partitions, which each worker finds by seeking in the files.
+'''
+import copy
+import heapq
+import multiprocessing
+import traceback
+from six import Iterator
+from sqlalchemy.sql.expression import and_, or_
+from .reader_configs import SqaReaderConfig, CsvReaderConfig
+from .util import sorts_nulls_last
+
+def partition_predicate(column, index, n_partitions, boundaries=None, nulls_last=False):
+    '''
+    The condition selecting partition index of n_partitions on column.  Without boundaries,
+    partitions are hash buckets of an integer column.  With boundaries, a sorted sequence of
+    n_partitions - 1 values, partition i holds boundaries[i-1] <= column < boundaries[i].  Nulls
+    belong to partition 0, except that with boundaries and nulls_last they belong to the last 
+    partition, so that range partitions read in order sort nulls where the database does.
+    '''
+    if boundaries is None:
+        condition = ((column % n_partitions) + n_partitions) % n_partitions == index
+    else:
+        if len(boundaries) != n_partitions - 1:
+            raise ValueError('Expected %d boundaries for %d partitions but got %d' %
+                             (n_partitions - 1, n_partitions, len(boundaries)))
+        conditions = []
+        if index > 0:
+            conditions.append(column >= boundaries[index - 1])
+        if index < n_partitions - 1:
+            conditions.append(column < boundaries[index])
+        condition = and_(*conditions)
+    null_index = n_partitions - 1 if boundaries is not None and nulls_last else 0
+    if index == null_index:
+        condition = or_(column == None, condition)
+    return condition
+
+def partition_range(reader_config, index, n_partitions, boundaries):
+    '''
+    Return a copy of a CsvReaderConfig restricted to range partition index of n_partitions, 
+    given as bounds on the first column of the sort key.  Unlike with partition_predicate, 
+    rows with null keys are in no partition.
+    '''
+    if boundaries is None:
+        raise ValueError('Partitioned reading of CsvReaderConfigs requires boundaries')
+    if len(boundaries) != n_partitions - 1:
+        raise ValueError('Expected %d boundaries for %d partitions but got %d' %
+                         (n_partitions - 1, n_partitions, len(boundaries)))
+    reader_config = copy.copy(reader_config)
+    if index > 0:
+        start = (boundaries[index - 1],)
+        if reader_config.start is None or reader_config.start < start:
+            reader_config.start = start
+    if index < n_partitions - 1:
+        stop = (boundaries[index],)
+        if reader_config.stop is None or reader_config.stop > stop:
+            reader_config.stop = stop
+    return reader_config
+
+def partition_config(config, index, n_partitions, boundaries=None):
+    '''
+    Return a copy of config in which every SqaReaderConfig is restricted to partition index of
+    n_partitions on the partition_attribute of its class, and every CsvReaderConfig to range 
+    partition index, which requires that the partition_attribute of its class be the first 
+    column of its sort key.  See partition_range.
+    '''
+    result = {}
+    for klass, reader_config in config.items():
+        if isinstance(reader_config, CsvReaderConfig):
+            if tuple(klass.sort_key_[:1]) != (klass.partition_attribute,):
+                raise ValueError('Partitioned reading of %s requires that its sort key start with %s' %
+                                 (klass.__name__, klass.partition_attribute))
+            result[klass] = partition_range(reader_config, index, n_partitions, boundaries)
+            continue
+        if not isinstance(reader_config, SqaReaderConfig):
+            raise ValueError('Partitioned reading requires SqaReaderConfigs or CsvReaderConfigs, but %s has a %s' %
+                             (klass.__name__, type(reader_config).__name__))
+        column = reader_config.expression.columns[klass.partition_attribute]
+        nulls_last = sorts_nulls_last(getattr(reader_config.engine, 'dialect', None))
+        reader_config = copy.copy(reader_config)
+        reader_config.filter = and_(reader_config.filter,
+                                    partition_predicate(column, index, n_partitions, boundaries, nulls_last))
+        result[klass] = reader_config
+    return result
+
+class PartitionError(Exception):
+    pass
+
+def read_partition(klass, config_factory, index, n_partitions, boundaries, chunk_size, output):
+    '''
+    Worker process body.  Reads one partition and puts lists of up to chunk_size objects on
+    output, followed by None.  Errors are put on output as a PartitionError.
+    '''
+    try:
+        config = partition_config(config_factory(), index, n_partitions, boundaries)
+        reader = klass.reader(config)
+        chunk = []
+        for obj in reader:
+            chunk.append(obj)
+            if len(chunk) >= chunk_size:
+                output.put(chunk)
+                chunk = []
+        reader.close()
+        if chunk:
+            output.put(chunk)
+        output.put(None)
+    except Exception:
+        output.put(PartitionError('Error reading partition %d of %s:\n%s' %
+                                  (index, klass.__name__, traceback.format_exc())))
+
+class ParallelReader(Iterator):
+    '''
+    Reads klass in n_partitions worker processes.
+
+    config_factory : A picklable callable that returns the reader config.  It is called in each
+                     worker, so that engines and connections are created there.
+    boundaries : If given, partitions are key ranges on partition_attribute instead of hash buckets.
+                 See partition_predicate.
+    ordered : If True, objects are yielded in the order of the serial reader of klass.  Range 
+              partitions are read one after another, which requires that the sort key of klass 
+              and each of its subtypes start with its partition_attribute.  Nulls are read in 
+              the first or last range partition, wherever the database sorts them (see 
+              partition_predicate and sorts_nulls_last).  Hash partitions are merged on the 
+              container key and type rank of their objects, as a ReaderCollection does, or on 
+              sort_key() if klass has no container key.  If False, objects are yielded as 
+              workers produce them.
+    chunk_size : Number of objects sent from a worker in each message.
+    buffer_size : Number of chunks each worker may have waiting.
+    '''
+    def __init__(self, klass, config_factory, n_partitions, boundaries=None, ordered=False,
+                 chunk_size=100, buffer_size=10):
+        if ordered and boundaries is not None:
+            for subtype in klass.subtypes():
+                sort_key = tuple(getattr(subtype, 'sort_key_', ())[:1])
+                if sort_key and sort_key != (subtype.partition_attribute,):
+                    raise ValueError('Ordered range partitions of %s require that its sort key start with %s' %
+                                     (subtype.__name__, subtype.partition_attribute))
+        self.klass = klass
+        self.n_partitions = n_partitions
+        self.ordered = ordered
+        if ordered:
+            self.queues = [multiprocessing.Queue(buffer_size) for _ in range(n_partitions)]
+        else:
+            self.queues = [multiprocessing.Queue(buffer_size * n_partitions)] * n_partitions
+        self.processes = [multiprocessing.Process(target=read_partition,
+                                                  args=(klass, config_factory, i, n_partitions,
+                                                        boundaries, chunk_size, self.queues[i]))
+                          for i in range(n_partitions)]
+        for process in self.processes:
+            process.daemon = True
+            process.start()
+        if not ordered:
+            self.objects = self.unordered()
+        elif boundaries is not None:
+            self.objects = (obj for i in range(n_partitions) for obj in self.partition(i))
+        else:
+            self.objects = self.merged()
+
+    def receive(self, output):
+        chunk = output.get()
+        if isinstance(chunk, PartitionError):
+            self.close()
+            raise chunk
+        return chunk
+
+    def partition(self, index):
+        while True:
+            chunk = self.receive(self.queues[index])
+            if chunk is None:
+                break
+            for obj in chunk:
+                yield obj
+
+    def unordered(self):
+        remaining = self.n_partitions
+        while remaining:
+            chunk = self.receive(self.queues[0])
+            if chunk is None:
+                remaining -= 1
+                continue
+            for obj in chunk:
+                yield obj
+
+    def merge_key(self):
+        '''
+        The key hash partitions are merged on, which orders objects like the ReaderCollection of 
+        a PolymorphicReader.  Ties go to the partition that comes first.
+        '''
+        if getattr(self.klass, 'container_key_', None) is None:
+            return lambda obj: obj.sort_key()
+        objrank = self.klass.objrank()
+        return lambda obj: (obj.container_key(), objrank(obj))
+    
+    def merged(self):
+        heap = []
+        key = self.merge_key()
+        partitions = [self.partition(i) for i in range(self.n_partitions)]
+        for i, partition in enumerate(partitions):
+            for obj in partition:
+                heap.append((key(obj), i, obj))
+                break
+        heapq.heapify(heap)
+        while heap:
+            _, i, obj = heap[0]
+            yield obj
+            for successor in partitions[i]:
+                heapq.heapreplace(heap, (key(successor), i, successor))
+                break
+            else:
+                heapq.heappop(heap)
+
+    def __next__(self):
+        try:
+            return next(self.objects)
+        except StopIteration:
+            self.close()
+            raise
+
+    def __iter__(self):
+        return self
+
+    def close(self):
+        for process in self.processes:
+            if process.is_alive():
+                process.terminate()
+            process.join()
+        for output in set(self.queues):
+            output.close()
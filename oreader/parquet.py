@@ -0,0 +1,205 @@
+'''
+Reading and writing Parquet files with pyarrow, which is only required when this module is used.
+Columns map to Arrow types as given by arrow_type.  Values of columns with other types are
+stored as strings, using unconvert on the way out and convert on the way back in.
+'''
+import pyarrow
+import pyarrow.parquet
+from six import Iterator, string_types
+from .base import IntegerColumn, RealColumn, StringColumn, DateColumn, DateTimeColumn,\
+    BooleanColumn, EmptyColumn
+from .reader_configs import TupleSimpleReaderConfig
+from .writer_configs import SimpleWriterConfig
+
+arrow_types = [(BooleanColumn, pyarrow.bool_()),
+               (IntegerColumn, pyarrow.int64()),
+               (RealColumn, pyarrow.float64()),
+               (StringColumn, pyarrow.string()),
+               (DateTimeColumn, pyarrow.timestamp('us', tz='UTC')),
+               (DateColumn, pyarrow.date32()),
+               (EmptyColumn, pyarrow.null())]
+
+def arrow_type(column):
+    '''
+    The Arrow type column is stored as, or None if its values are stored as unconverted strings.
+    '''
+    for column_type, result in arrow_types:
+        if isinstance(column, column_type):
+            return result
+    return None
+
+def arrow_schema(klass):
+    '''
+    The Arrow schema for the columns of klass.
+    '''
+    return pyarrow.schema([(column.name, arrow_type(column) or pyarrow.string()) for column in klass.columns])
+
+def key_columns(klass):
+    '''
+    Names of the columns that the sort, identity and container keys of klass are made of.
+    '''
+    result = list(getattr(klass, 'sort_key_', ()))
+    for key in ('identity_key_', 'container_key_'):
+        result.extend(v for _, v in getattr(klass, key, ()))
+    return result
+
+class ParquetSource(Iterator):
+    '''
+    Reads the row groups of a Parquet file one at a time and gives objects of klass.  Row groups
+    whose statistics put them outside [start, stop) on the first column of the sort key are not
+    read.  Columns not in names or not in the file are None.
+    '''
+    def __init__(self, filename, klass, names, start=None, stop=None):
+        self.file = pyarrow.parquet.ParquetFile(filename)
+        self.klass = klass
+        names = set(names) & set(self.file.schema_arrow.names)
+        self.names = [column.name for column in klass.columns if column.name in names]
+        self.start = start
+        self.stop = stop
+        self.sort_column = klass.sort_key_[0] if (start is not None or stop is not None) else None
+        self.row_groups = iter(range(self.file.num_row_groups))
+        self.objects = iter([])
+
+    def __iter__(self):
+        return self
+
+    def skip(self, index):
+        '''
+        Whether the statistics of row group index show that none of its rows are in range.
+        '''
+        if self.sort_column is None:
+            return False
+        position = self.file.schema_arrow.get_field_index(self.sort_column)
+        statistics = self.file.metadata.row_group(index).column(position).statistics
+        if statistics is None or not statistics.has_min_max:
+            return False
+        try:
+            if self.start is not None and statistics.max < self.start[0]:
+                return True
+            if self.stop is not None and (statistics.min > self.stop[0] or
+                                          (len(self.stop) == 1 and statistics.min >= self.stop[0])):
+                return True
+        except TypeError: # Statistics not comparable with the bounds
+            return False
+        return False
+
+    def in_range(self, obj):
+        key = obj.sort_key()
+        try:
+            return (self.start is None or key[:len(self.start)] >= tuple(self.start)) and \
+                   (self.stop is None or key[:len(self.stop)] < tuple(self.stop))
+        except TypeError: # Null keys are not in any range
+            return False
+
+    def read(self, index):
+        table = self.file.read_row_group(index, columns=self.names)
+        values = []
+        for column in self.klass.columns:
+            if column.name not in self.names:
+                values.append([None] * table.num_rows)
+                continue
+            data = table.column(column.name)
+            if data.type == arrow_type(column):
+                values.append(data.to_pylist())
+            else:
+                values.append(column.convert_array(data.to_pylist()).tolist())
+        objects = map(self.klass.from_values, zip(*values))
+        if self.sort_column is not None:
+            objects = filter(self.in_range, objects)
+        return objects
+
+    def __next__(self):
+        while True:
+            try:
+                return next(self.objects)
+            except StopIteration:
+                index = next(self.row_groups)
+                if not self.skip(index):
+                    self.objects = self.read(index)
+
+    def close(self):
+        self.file.close()
+
+class ParquetReaderConfig(TupleSimpleReaderConfig):
+    def __init__(self, files, columns=None, start=None, stop=None):
+        '''
+        files : A file name or list of file names, read in order.
+        columns : If given, only these columns are read, along with the ones the keys are made
+                  of.  The rest are None.
+        start, stop : If given, only objects with start <= sort_key() < stop are read, where the
+                      bounds may be prefixes of the sort key.  Row groups are skipped using their
+                      statistics on the first column of the sort key.  Objects with null keys
+                      are never in range.
+        '''
+        self.files = [files] if isinstance(files, string_types) else files
+        self.columns = columns
+        self.start = tuple(start) if start is not None else None
+        self.stop = tuple(stop) if stop is not None else None
+
+    def start_source(self, reader, filename):
+        klass = reader.klass
+        names = [column.name for column in klass.columns]
+        if self.columns is not None:
+            names = set(self.columns) | set(key_columns(klass))
+        return ParquetSource(filename, klass, names, self.start, self.stop)
+
+    def stop_source(self, reader, source):
+        source.close()
+
+    def get_sources(self, reader):
+        return [src for src in self.files]
+
+class ParquetDataSink(object):
+    '''
+    Buffers objects and writes them as a row group every batch_size objects, and on close.
+    '''
+    def __init__(self, writer_config, writer):
+        self.writer = writer
+        self.writer_config = writer_config
+        self.schema = arrow_schema(writer.klass)
+        self.file = None
+        self.rows = []
+
+    def open(self):
+        self.file = pyarrow.parquet.ParquetWriter(self.writer_config.filename, self.schema,
+                                                  compression=self.writer_config.compression)
+        return self
+
+    def write(self, obj):
+        self.rows.append(self.writer_config.translate(self.writer, obj))
+        if len(self.rows) >= self.writer_config.batch_size:
+            self.flush()
+
+    def flush(self):
+        if self.rows:
+            arrays = [pyarrow.array(list(values), type=field.type)
+                      for values, field in zip(zip(*self.rows), self.schema)]
+            self.file.write_table(pyarrow.Table.from_arrays(arrays, schema=self.schema),
+                                  row_group_size=len(self.rows))
+        self.rows = []
+
+    def close(self):
+        self.flush()
+        self.file.close()
+
+class ParquetWriterConfig(SimpleWriterConfig):
+    def __init__(self, filename, batch_size=65536, compression='snappy'):
+        '''
+        batch_size : Number of objects in each row group.
+        compression : Any compression pyarrow supports, or None.
+        '''
+        self.filename = filename
+        self.batch_size = batch_size
+        self.compression = compression
+
+    def translate(self, writer, obj):
+        if obj is None:
+            return None
+        return [getattr(obj, col.name, None) if arrow_type(col) is not None else
+                col.unconvert(getattr(obj, col.name, None)) for col in writer.klass.columns]
+
+    def start_sink(self, writer):
+        return ParquetDataSink(self, writer).open()
+
+    def stop_sink(self, sink):
+        sink.close()
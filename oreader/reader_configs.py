@@ -1,13 +1,19 @@
 import csv
+import mmap
+import os
 from sqlalchemy.sql.elements import True_
 from sqlalchemy.sql.expression import select, and_
-from .util import vector_greater_than, uncompressed
+from .util import keyset_greater_than, uncompressed
 import warnings
 import time
 from oreader.readers import DataSourceError
 from sqlalchemy.sql.sqltypes import String, Text
 import traceback
 from six import next, Iterator, string_types
+from collections import deque
+from itertools import islice
+import threading
+from six.moves import queue
 
 class SimpleReaderConfig(object):
     pass
@@ -16,12 +22,24 @@ class TupleSimpleReaderConfig(SimpleReaderConfig):
     def translate(self, reader, raw):
         if raw is None:
             return None
-        return reader.klass(**dict(zip([col.name for col in reader.klass.columns], raw)))
+        if isinstance(raw, reader.klass): # From a source that creates the objects itself
+            return raw
+        return reader.klass.from_row(raw)
+    
+    def start_raw_source(self, reader, source):
+        '''
+        Like start_source, but the source gives untranslated rows in column order, unless it 
+        creates the objects itself.  Used by BatchReader, which converts the rows itself.
+        '''
+        return self.start_source(reader, source)
 
 class CsvSource(Iterator):
     def __init__(self, infile, **config):
         self.reader = csv.reader(infile, **config)
         self.infile = infile
+    
+    def __iter__(self):
+        return self
         
     def __next__(self):
         return next(self.reader)
@@ -29,16 +47,390 @@ class CsvSource(Iterator):
     def close(self):
         return self.infile.close()
 
+class MmapCsvSource(Iterator):
+    '''
+    Reads a delimited file through a memory map.  Lines are decoded and split out of the mapped 
+    file chunk_size bytes at a time, and only the lines read are decoded.  Decoding copies each 
+    chunk into a string, so the map saves reads from the file, not copies.  Unquoted rows are 
+    split directly, and rows with quotechar in them go through csv.reader, so quoted 
+    fields, doubled quotes and quoted line breaks come out as csv.reader gives them for a file 
+    opened in text mode.  Lines end with \n or \r\n.
+    
+    offset is the byte offset of the start of the row last handed out, and tell() is that of 
+    the next one.  seek(offset) continues reading from offset, which must be the start of a row.
+    
+    Rows are split in Python, so reading is slower than csv.reader on narrow files (about twice 
+    as slow at 4 columns) and faster only on wide ones (from about 64 columns).  The byte 
+    offsets are what make it worth using on other files.  See benchmarks/bench_csv_source.py.
+    '''
+    chunk_size = 1 << 20
+    
+    def __init__(self, filename, delimiter=',', quotechar='"', encoding='utf-8'):
+        self.infile = open(filename, 'rb')
+        self.size = os.fstat(self.infile.fileno()).st_size
+        # Empty files cannot be mapped
+        self.buffer = mmap.mmap(self.infile.fileno(), 0, access=mmap.ACCESS_READ) if self.size else b''
+        self.delimiter = delimiter
+        self.quotechar = quotechar
+        self.encoding = encoding
+        self.position = 0
+        self.lines = deque()
+        self.offset = None
+    
+    def __iter__(self):
+        return self
+    
+    def fill(self):
+        '''
+        Split the next chunk of lines out of the buffer.  Returns False at the end of the file.
+        '''
+        if self.position >= self.size:
+            return False
+        end = min(self.position + self.chunk_size, self.size)
+        if end < self.size:
+            newline = self.buffer.rfind(b'\n', self.position, end)
+            if newline < 0:
+                newline = self.buffer.find(b'\n', end)
+            end = self.size if newline < 0 else newline + 1
+        data = self.buffer[self.position:end]
+        text = data.decode(self.encoding)
+        lines = text.split('\n')
+        if text.endswith('\n'):
+            lines.pop()
+        # Without multibyte characters, lengths in characters are lengths in bytes
+        single_byte = len(text) == len(data)
+        offset = self.position
+        for line in lines:
+            self.lines.append((offset, line))
+            offset += (len(line) if single_byte else len(line.encode(self.encoding))) + 1
+        self.position = end
+        return True
+    
+    def __next__(self):
+        if not self.lines and not self.fill():
+            raise StopIteration
+        offset, line = self.lines.popleft()
+        if self.quotechar in line:
+            # A quoted field continues onto the next line while the quotes are unbalanced
+            while line.count(self.quotechar) % 2 and (self.lines or self.fill()):
+                line = line + '\n' + self.lines.popleft()[1]
+            row = next(csv.reader([line.replace('\r\n', '\n')], delimiter=self.delimiter, 
+                                  quotechar=self.quotechar), [])
+        else:
+            if line.endswith('\r'):
+                line = line[:-1]
+            row = line.split(self.delimiter) if line else []
+        self.offset = offset
+        return row
+    
+    def tell(self):
+        return self.lines[0][0] if self.lines else self.position
+    
+    def seek(self, offset):
+        self.lines.clear()
+        self.position = offset
+    
+    def sync(self, offset):
+        '''
+        The offset of the first line starting at or after offset.  That is the start of a row 
+        unless offset is inside a quoted field with line breaks.
+        '''
+        if offset <= 0:
+            return 0
+        if offset >= self.size or self.buffer[offset - 1:offset] == b'\n':
+            return min(offset, self.size)
+        newline = self.buffer.find(b'\n', offset)
+        return self.size if newline < 0 else newline + 1
+    
+    def close(self):
+        if self.size:
+            self.buffer.close()
+        return self.infile.close()
+
+class BlockSource(Iterator):
+    '''
+    Reads raw rows from source block_size at a time and converts each block column-wise with 
+    the convert_array methods of the columns of klass.  Objects are only created at the end, 
+    with klass.from_values.  A block that cannot be converted that way, because of a short row 
+    or a value that fails to convert, is handed on as raw rows so that each of its rows is 
+    translated, and can fail, on its own.
+    '''
+    def __init__(self, source, klass, block_size):
+        self.source = source
+        self.klass = klass
+        self.block_size = block_size
+        self.rows = iter([])
+    
+    def __iter__(self):
+        return self
+    
+    def convert(self, block):
+        n_columns = len(self.klass.columns)
+        if any(len(row) < n_columns for row in block):
+            return block
+        try:
+            arrays = [column.convert_array(values) for column, values 
+                      in zip(self.klass.columns, zip(*block))]
+        except Exception:
+            return block
+        # Objects are created lazily, so that zip can reuse its row tuple
+        return map(self.klass.from_values, zip(*[array.tolist() for array in arrays]))
+    
+    def __next__(self):
+        try:
+            return next(self.rows)
+        except StopIteration:
+            block = list(islice(self.source, self.block_size))
+            if not block:
+                raise
+            self.rows = iter(self.convert(block))
+            return next(self.rows)
+    
+    def close(self):
+        return self.source.close()
+
+def row_key(klass):
+    '''
+    A function from a raw row of klass, in column order, to its sort key.  Only the sort key 
+    columns are converted when the sort key is made of columns.
+    '''
+    positions = dict((column.name, i) for i, column in enumerate(klass.columns))
+    if all(name in positions for name in klass.sort_key_):
+        converters = [(positions[name], klass.columns[positions[name]].convert) 
+                      for name in klass.sort_key_]
+        return lambda row: tuple(convert(row[i]) for i, convert in converters)
+    return lambda row: klass.from_row(row).sort_key()
+
+class KeyRangeSource(Iterator):
+    '''
+    Gives the raw rows of source, which are sorted by the sort key of klass, with 
+    start <= sort_key() < stop, where the bounds may be prefixes of the sort key.  Rows before 
+    start are skipped, and reading stops at the first row at or after stop.  Rows whose keys 
+    cannot be converted or compared, such as short rows and rows with null keys, are never in 
+    range.  They are skipped with a warning, like rows a Reader cannot read, and counted in 
+    skipped.
+    '''
+    def __init__(self, source, klass, start=None, stop=None):
+        self.source = source
+        self.klass = klass
+        self.key = row_key(klass)
+        self.start = start
+        self.stop = stop
+        self.started = start is None
+        self.done = False
+        self.count = 0
+        self.skipped = 0
+    
+    def __iter__(self):
+        return self
+    
+    def __next__(self):
+        while not self.done:
+            row = next(self.source)
+            self.count += 1
+            try:
+                key = self.key(row)
+                if not self.started:
+                    if key[:len(self.start)] < self.start:
+                        continue
+                    self.started = True
+                if self.stop is not None and key[:len(self.stop)] >= self.stop:
+                    self.done = True
+                    break
+            except (IndexError, TypeError, ValueError): # Not in any range
+                warnings.warn('Problem reading the sort key of %s row %d.  Skipping.' % 
+                              (self.klass.__name__, self.count))
+                self.skipped += 1
+                continue
+            return row
+        raise StopIteration
+    
+    def close(self):
+        return self.source.close()
+
+def bisect_csv(source, klass, start, lo, probe_size=1 << 12):
+    '''
+    The offset of a row of source, an MmapCsvSource sorted by the sort key of klass, from which 
+    reading finds every row at or after start.  The bytes from lo, the offset of the first row, 
+    to the end are bisected: the row at the first line after the middle is read and its key 
+    compared with start, until fewer than probe_size bytes are left.  Lines must start rows, 
+    so quoted fields must not contain line breaks.  Bisection ends early at a row whose key 
+    cannot be compared, as reading from lo still finds every row at or after start.
+    '''
+    key = row_key(klass)
+    hi = source.size
+    chunk_size = source.chunk_size
+    # Each probe decodes a chunk, so they are kept small
+    source.chunk_size = probe_size
+    try:
+        # The row at lo is the first row or before start, and rows from hi on are not before start
+        while hi - lo > probe_size:
+            mid = (lo + hi) // 2
+            offset = source.sync(mid)
+            if offset >= hi:
+                hi = mid
+                continue
+            source.seek(offset)
+            try:
+                before = key(next(source))[:len(start)] < start
+            except Exception:
+                break
+            if before:
+                lo = offset
+            else:
+                hi = offset
+    finally:
+        source.chunk_size = chunk_size
+    return lo
+
+class CsvKeyIndex(object):
+    '''
+    A sparse index of a sorted delimited file: the byte offset and raw row of every every-th 
+    row from data_start, the offset of the first row after the header.  It is saved with csv in 
+    a sidecar file, filename + suffix, along with the size and modification time of the file, 
+    and is rebuilt when they change.  Keys are converted from the raw rows for the class being 
+    read, so the same index serves any class.
+    '''
+    suffix = '.index'
+    
+    def __init__(self, entries):
+        self.entries = entries
+        self.keys = {}
+    
+    @staticmethod
+    def stamp(filename, data_start, every):
+        status = os.stat(filename)
+        return [str(status.st_size), str(status.st_mtime_ns), str(data_start), str(every)]
+    
+    @classmethod
+    def build(cls, filename, data_start, every, **csv_config):
+        source = MmapCsvSource(filename, **csv_config)
+        try:
+            source.seek(data_start)
+            entries = [(source.offset, row) for i, row in enumerate(source) if i % every == 0]
+        finally:
+            source.close()
+        return cls(entries)
+    
+    @classmethod
+    def load(cls, filename, stamp):
+        '''
+        The saved index of filename, or None if there is none or it is out of date.
+        '''
+        try:
+            with open(filename + cls.suffix, 'rt', newline='', encoding='utf-8') as infile:
+                rows = csv.reader(infile)
+                if next(rows, None) != stamp:
+                    return None
+                return cls([(int(row[0]), row[1:]) for row in rows])
+        except (IOError, OSError):
+            return None
+    
+    def save(self, filename, stamp):
+        # Written to a temporary file first, so that other processes never load half an index
+        path = filename + self.suffix
+        tmp = '%s.%d.tmp' % (path, os.getpid())
+        with open(tmp, 'wt', newline='', encoding='utf-8') as outfile:
+            writer = csv.writer(outfile)
+            writer.writerow(stamp)
+            writer.writerows([str(offset)] + row for offset, row in self.entries)
+        os.replace(tmp, path)
+    
+    @classmethod
+    def open(cls, filename, data_start, every, **csv_config):
+        '''
+        Load the index of filename, or build it and try to save it if it is missing or out of 
+        date.
+        '''
+        stamp = cls.stamp(filename, data_start, every)
+        result = cls.load(filename, stamp)
+        if result is None:
+            result = cls.build(filename, data_start, every, **csv_config)
+            try:
+                result.save(filename, stamp)
+            except (IOError, OSError) as e:
+                warnings.warn('Could not save the index of %s: %s' % (filename, e))
+        return result
+    
+    def offset(self, klass, start, default):
+        '''
+        The offset of the last sampled row of klass whose key is before start, or default if 
+        there is none.  Reading from there finds every row at or after start.
+        '''
+        if klass not in self.keys:
+            key = row_key(klass)
+            keys = []
+            for offset, row in self.entries:
+                try:
+                    value = key(row)
+                except Exception:
+                    continue
+                # Rows with null keys cannot be compared, and are never in range anyway
+                if None not in value:
+                    keys.append((value, offset))
+            self.keys[klass] = keys
+        keys = self.keys[klass]
+        lo, hi = 0, len(keys)
+        while lo < hi:
+            mid = (lo + hi) // 2
+            if keys[mid][0][:len(start)] < start:
+                lo = mid + 1
+            else:
+                hi = mid
+        return keys[lo - 1][1] if lo else default
+
 class CsvReaderConfig(TupleSimpleReaderConfig):
-    def __init__(self, files, header, csv_config={}, opener=uncompressed, skip=0):
+    def __init__(self, files, header, csv_config={}, opener=uncompressed, skip=0, block_size=None, 
+                 mmap=False, start=None, stop=None, index_every=None, bisect=False):
+        '''
+        If block_size is given, rows are converted block_size at a time.  See BlockSource.
+        If mmap, uncompressed files are read with an MmapCsvSource, which understands the 
+        delimiter and quotechar keys of csv_config as well as encoding.  It is slower than the 
+        default csv reading for files of few columns, so use it for wide files or to seek with 
+        index_every or bisect below.
+        If start or stop is given, the files must be sorted by sort_key_, and only rows with 
+        start <= sort_key() < stop are read, where the bounds may be prefixes of the sort key.  
+        Reading stops at the first row at or after stop.  See KeyRangeSource.
+        If index_every is given, reading seeks to start using a CsvKeyIndex of every 
+        index_every-th row of each file, which is built on first use and saved next to the 
+        file.  This requires mmap.
+        If bisect, reading seeks to start by bisecting each file instead (see bisect_csv), 
+        which needs no index but requires that quoted fields have no line breaks.  This 
+        requires mmap as well.  Either way, several processes can each read their own key range 
+        of the same files, as ParallelReader does with boundaries.
+        '''
+        if mmap and opener is not uncompressed:
+            raise ValueError('Memory mapped reading requires uncompressed files.')
+        if (index_every is not None or bisect) and not mmap:
+            raise ValueError('Seeking requires memory mapped reading.')
         self.files = [files] if isinstance(files, string_types) else files
         self.header = header
         self.csv_config = csv_config
         self.opener = opener
         self.skip = skip
+        self.block_size = block_size
+        self.mmap = mmap
+        self.start = tuple(start) if start is not None else None
+        self.stop = tuple(stop) if stop is not None else None
+        self.index_every = index_every
+        self.bisect = bisect
+        self.indexes = {}
+    
+    def index(self, filename, data_start):
+        stamp = CsvKeyIndex.stamp(filename, data_start, self.index_every)
+        if self.indexes.get(filename, (None,))[0] != stamp:
+            self.indexes[filename] = (stamp, CsvKeyIndex.open(filename, data_start, self.index_every, 
+                                                              **self.csv_config))
+        return self.indexes[filename][1]
         
-    def start_source(self, reader, filename):
-        result = CsvSource(self.opener(filename, 'rt'), **self.csv_config)
+    def open(self, filename):
+        '''
+        A source of the raw rows of filename, after the header and skipped rows.
+        '''
+        if self.mmap:
+            result = MmapCsvSource(filename, **self.csv_config)
+        else:
+            result = CsvSource(self.opener(filename, 'rt'), **self.csv_config)
         if self.header:
             next(result)
         if self.skip:
@@ -46,12 +438,193 @@ class CsvReaderConfig(TupleSimpleReaderConfig):
                 next(result)
         return result
     
+    def boundaries(self, klass, n_partitions):
+        '''
+        Sorted distinct values of the first sort key column of klass in the rows at 
+        n_partitions - 1 evenly spaced byte offsets of the files, for use as the boundaries of 
+        a ParallelReader with one more partition than there are values.  Requires mmap.  Offsets 
+        past the last row, and rows that are too short or whose keys cannot be converted, give 
+        no value.
+        '''
+        if not self.mmap:
+            raise ValueError('Boundaries require memory mapped reading.')
+        key = row_key(klass)
+        sizes = [os.path.getsize(filename) for filename in self.files]
+        values = set()
+        for i in range(1, n_partitions):
+            target = sum(sizes) * i // n_partitions
+            for filename, size in zip(self.files, sizes):
+                if target < size:
+                    break
+                target -= size
+            source = self.open(filename)
+            try:
+                source.seek(max(source.sync(target), source.tell()))
+                value = key(next(source))[0]
+            except (StopIteration, IndexError, TypeError, ValueError):
+                continue
+            finally:
+                source.close()
+            if value is not None:
+                values.add(value)
+        return sorted(values)
+    
+    def start_raw_source(self, reader, filename):
+        result = self.open(filename)
+        if self.start is not None and (self.index_every is not None or self.bisect):
+            data_start = result.tell()
+            if self.index_every is not None:
+                offset = self.index(filename, data_start).offset(reader.klass, self.start, data_start)
+            else:
+                offset = bisect_csv(result, reader.klass, self.start, data_start)
+            result.seek(offset)
+        if self.start is not None or self.stop is not None:
+            result = KeyRangeSource(result, reader.klass, self.start, self.stop)
+        return result
+    
+    def start_source(self, reader, filename):
+        result = self.start_raw_source(reader, filename)
+        if self.block_size is not None:
+            result = BlockSource(result, reader.klass, self.block_size)
+        return result
+    
     def stop_source(self, reader, source):
         source.close()
         
     def get_sources(self, reader):
         return [src for src in self.files]
 
+class TranslationFailure(object):
+    '''
+    Stands in for a row whose translation failed in a PrefetchSource, so that the error is 
+    raised when the row is translated in the reading thread.
+    '''
+    def __init__(self, error):
+        self.error = error
+
+class PrefetchSource(Iterator):
+    '''
+    Reads and translates the rows of a source of config in a background thread, which stays up 
+    to queue_size chunks of chunk_size objects ahead.  Order is preserved.  Errors reading the 
+    source are raised by next in the same position, and translation errors by translate.  The 
+    thread owns the source from the start, and stops it when it is done.
+    '''
+    def __init__(self, config, reader, source, queue_size, chunk_size):
+        self.config = config
+        self.reader = reader
+        self.source = source
+        self.chunk_size = chunk_size
+        self.queue = queue.Queue(queue_size)
+        self.items = deque()
+        self.done = False
+        self.stopped = threading.Event()
+        self.thread = threading.Thread(target=self.produce)
+        self.thread.daemon = True
+        self.thread.start()
+    
+    def put(self, item):
+        while not self.stopped.is_set():
+            try:
+                self.queue.put(item, timeout=0.1)
+                return True
+            except queue.Full:
+                pass
+        return False
+    
+    def produce(self):
+        chunk = None
+        try:
+            chunk = self.read()
+        finally:
+            try:
+                self.config.stop_source(self.reader, self.source)
+            except Exception as e:
+                # Raised by next after the rows read before it, unless the consumer is gone
+                if chunk is not None:
+                    chunk.insert(len(chunk) - 1, e)
+            if chunk is not None:
+                self.put(chunk)
+    
+    def read(self):
+        '''
+        Put chunks of translated rows on the queue until the source ends, and return the last 
+        chunk, which ends with None.  Returns None if stopped first.
+        '''
+        chunk = []
+        while not self.stopped.is_set():
+            try:
+                raw = next(self.source)
+            except StopIteration:
+                break
+            except DataSourceError as e:
+                chunk.append(e)
+                break
+            except Exception as e:
+                chunk.append(e)
+                continue
+            if raw is None:
+                break
+            try:
+                chunk.append(self.config.translate(self.reader, raw))
+            except Exception as e:
+                chunk.append(TranslationFailure(e))
+            if len(chunk) >= self.chunk_size:
+                if not self.put(chunk):
+                    return None
+                chunk = []
+        if self.stopped.is_set():
+            return None
+        chunk.append(None)
+        return chunk
+    
+    def __iter__(self):
+        return self
+    
+    def __next__(self):
+        if not self.items:
+            if self.done:
+                raise StopIteration
+            self.items.extend(self.queue.get())
+        item = self.items.popleft()
+        if item is None:
+            self.done = True
+            raise StopIteration
+        if isinstance(item, Exception):
+            if isinstance(item, DataSourceError):
+                self.done = True
+            raise item
+        return item
+    
+    def close(self):
+        self.stopped.set()
+        self.thread.join()
+
+class PrefetchReaderConfig(SimpleReaderConfig):
+    '''
+    Wraps another simple reader config so that each of its sources is read and translated in a 
+    background thread (see PrefetchSource).  Waiting on files and databases then overlaps with 
+    the work done on the objects already read.  Translation itself still holds the GIL.
+    '''
+    def __init__(self, config, queue_size=10, chunk_size=100):
+        self.config = config
+        self.queue_size = queue_size
+        self.chunk_size = chunk_size
+    
+    def get_sources(self, reader):
+        return self.config.get_sources(reader)
+    
+    def start_source(self, reader, source):
+        return PrefetchSource(self.config, reader, self.config.start_source(reader, source), 
+                              self.queue_size, self.chunk_size)
+    
+    def stop_source(self, reader, source):
+        source.close()
+    
+    def translate(self, reader, raw):
+        if isinstance(raw, TranslationFailure):
+            raise raw.error
+        return raw
+
 def safe_collate(col, collation='"C"'):
     if collation is None:
         return col
@@ -59,7 +632,12 @@ def safe_collate(col, collation='"C"'):
 
 class SqaReaderState(Iterator):
     def __init__(self, table, engine, klass, starter, filter=True_(), n_tries=float('inf'), wait=0.1, warn_every=10,
-                 limit_per=None, stream=True, verbose=False):
+                 limit_per=None, stream=True, verbose=False, batch_size=None):
+        '''
+        If batch_size is given, rows are fetched from the database batch_size at a time and 
+        handed out from a local buffer.  last_result is always the last row handed out, so a 
+        fresh result proxy resumes after it and the unused part of the buffer is discarded.
+        '''
         self.table = table
         self.engine = engine
         self.klass = klass
@@ -75,6 +653,9 @@ class SqaReaderState(Iterator):
         self.stream = stream
         self.result_proxy = None
         self.verbose = verbose
+        self.batch_size = batch_size
+        self.buffer = deque()
+        self.retries = 0 # Attempts to re-establish the connection, for the reader's metrics
         
     def __iter__(self):
         return self
@@ -91,8 +672,9 @@ class SqaReaderState(Iterator):
                 raise
         else:
             try:
-                where_clause = vector_greater_than([self.table.columns[nm] for nm in self.sort_key], \
-                                                  [self.last_result[n] for n in self.sort_index])
+                where_clause = keyset_greater_than([self.table.columns[nm] for nm in self.sort_key], \
+                                                   [self.last_result[n] for n in self.sort_index], 
+                                                   getattr(self.engine, 'dialect', None))
                 expr = (select(self.table.columns).order_by(*[safe_collate(self.table.columns[nm], None) for nm in self.sort_key]) \
                        .where(and_(where_clause, self.filter)))
             except:
@@ -108,6 +690,7 @@ class SqaReaderState(Iterator):
     
     def fresh_result_proxy(self):
         self.result_proxy = None
+        self.buffer.clear()
         expr = self.create_expression()
         if self.verbose:
             print(expr)
@@ -117,13 +700,26 @@ class SqaReaderState(Iterator):
         
 #         if self.stream is not None:
 #             self.result_proxy = self.result_proxy.stream(self.stream)
+    
+    def fetch(self):
+        if self.batch_size is None:
+            return self.result_proxy.fetchone()
+        if not self.buffer:
+            self.buffer.extend(self.result_proxy.fetchmany(self.batch_size))
+            if not self.buffer:
+                return None
+        return self.buffer.popleft()
             
     def __next__(self):
         attempt = 0
         stop_count = 0
         while True:
             try:
-                result = self.result_proxy.fetchone()
+                # The first result proxy is opened here rather than by the retry below, so that 
+                # a clean read neither counts a retry nor waits
+                if self.result_proxy is None:
+                    self.fresh_result_proxy()
+                result = self.fetch()
                 # If using limit_per, the end of a result proxy may not be the end of the relevant
                 # results.  This way is more memory efficient for more different backends and reduces 
                 # initial loading time compared to stream, but may take longer in the end if a lot of 
@@ -132,7 +728,7 @@ class SqaReaderState(Iterator):
                     stop_count += 1
                     self.fresh_result_proxy()
                 else:
-                    if result is not None and len(result._row) == 0:
+                    if result is not None and len(result) == 0:
                         print('EMPTY ROW:', self.klass.__name__, 'after:', self.last_result)
                         raise ValueError()
                     self.last_result = result
@@ -145,6 +741,7 @@ class SqaReaderState(Iterator):
                 if attempt > self.n_tries:
                     raise DataSourceError(e)
                 attempt += 1
+                self.retries += 1
                 time.sleep(self.wait)
                 while True:
                     try:
@@ -155,13 +752,18 @@ class SqaReaderState(Iterator):
                             traceback.print_exc()
                             raise DataSourceError(e)
                         attempt += 1
+                        self.retries += 1
     
     def close(self):
-        self.result_proxy.close()
+        # There is no result proxy before the first row, or after failing to get a fresh one, 
+        # and stand-in proxies may have nothing to close
+        close = getattr(self.result_proxy, 'close', None)
+        if close is not None:
+            close()
         
 class SqaReaderConfig(TupleSimpleReaderConfig):
     def __init__(self, expression, engine, starter=None, filter=True_(), n_tries=100, wait=0.1, warn_every=10,
-                 limit_per=None, stream=False):
+                 limit_per=None, stream=False, batch_size=None):
         self.expression = expression
         self.engine = engine
         self.starter = starter
@@ -171,6 +773,7 @@ class SqaReaderConfig(TupleSimpleReaderConfig):
         self.warn_every = warn_every
         self.limit_per = limit_per
         self.stream = stream
+        self.batch_size = batch_size
         
     def start_source(self, reader, source):
         return source
@@ -181,7 +784,7 @@ class SqaReaderConfig(TupleSimpleReaderConfig):
     def get_sources(self, reader):
         return [SqaReaderState(self.expression, self.engine, reader.klass, self.starter, 
                          self.filter, self.n_tries, self.wait, self.warn_every, 
-                         limit_per=self.limit_per, stream=self.stream)]
+                         limit_per=self.limit_per, stream=self.stream, batch_size=self.batch_size)]
         
     def test_expression(self, klass):
         expr = select(self.expression.columns).order_by(*[safe_collate(self.expression.columns[nm], None) for nm in klass.sort_column_names])
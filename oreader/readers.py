@@ -1,7 +1,13 @@
+import heapq
 import warnings
 import traceback
 from six import Iterator
 from collections import OrderedDict
+from itertools import islice
+from functools import partial
+from concurrent import futures
+from time import perf_counter
+import pandas
 
 class DataSourceError(Exception):
     '''
@@ -13,63 +19,165 @@ class DataSourceError(Exception):
     def __init__(self, error):
         self.error = error
 
+def reader_factory(klass, config, instrumentation=None):
+    return klass.reader_class(config)(klass, config, instrumentation=instrumentation)
+
 def constant(val):
     def _constant(*args, **kwargs):
         return val
     return _constant
 
+class ChunkedReader(Iterator):
+    '''
+    Runs a reader in executor chunk_size objects at a time, keeping one chunk read ahead.  The 
+    reader is created by factory in the executor too, so that the first queries of several 
+    ChunkedReaders run concurrently.  At most one task per ChunkedReader is in flight, so the 
+    reader itself is only ever used by one thread at a time, and at most two chunks are held.
+    '''
+    def __init__(self, factory, executor, chunk_size):
+        self.factory = factory
+        self.executor = executor
+        self.chunk_size = chunk_size
+        self.reader = None
+        self.chunk = iter([])
+        self.error = None
+        self.first = self.future = executor.submit(self.read_chunk)
+    
+    def read_chunk(self):
+        '''
+        Read the next chunk, along with the error that ended it early, if any.  Objects read 
+        before an error are kept, so they come out before the error is raised like they would 
+        without an executor.
+        '''
+        chunk = []
+        try:
+            if self.reader is None:
+                self.reader = self.factory()
+            for obj in self.reader:
+                chunk.append(obj)
+                if len(chunk) >= self.chunk_size:
+                    break
+        except Exception as e:
+            return chunk, e
+        return chunk, None
+    
+    def __iter__(self):
+        return self
+    
+    def __next__(self):
+        while True:
+            try:
+                return next(self.chunk)
+            except StopIteration:
+                if self.error is not None:
+                    error, self.error = self.error, None
+                    raise error
+                if self.future is None:
+                    raise
+                chunk, self.error = self.future.result()
+                if self.reader is None or (self.error is None and len(chunk) < self.chunk_size): # Done
+                    self.future = None
+                else:
+                    self.future = self.executor.submit(self.read_chunk)
+                self.chunk = iter(chunk)
+    
+    def report(self):
+        futures.wait([self.first])
+        return self.reader.report() if self.reader is not None else None
+    
+    def close(self):
+        if self.future is not None:
+            futures.wait([self.future])
+            self.future = None
+        if self.reader is not None:
+            self.reader.close()
+
 class ReaderCollection(Iterator):#Done
-    def __init__(self, klasses, config, order=constant(0)):
+    def __init__(self, klasses, config, order=constant(0), executor=None, chunk_size=100, instrumentation=None,
+                 metrics=None):
         '''
         klasses : (dict) contains name:class pairs
+        order : (callable) tie breaker applied to objects with equal container keys
+        executor : (concurrent.futures.Executor) if given, the child readers are created and read 
+                   in executor, each through a ChunkedReader, so that their queries run 
+                   concurrently.  The child readers themselves read their own relatives serially, 
+                   which keeps tasks in executor from waiting on each other.
+        chunk_size : (int) number of objects read from a child reader in each task
+        instrumentation : (oreader.metrics.Instrumentation) if given, the child readers keep metrics
+        metrics : (oreader.metrics.ReaderMetrics) if given, the time spent in the child readers is 
+                  added to its child_time, and the time spent ordering their objects to its merge_time
+        
+        The peeked object of each reader is kept in a heap keyed on (container_key, order, position), 
+        so each call to next costs one key computation and O(log k) comparisons for k readers.  
+        Position is the reader's index in klasses, so ties on both key and order go to the reader 
+        that comes first.  The order is the same with or without an executor.
         '''
-        self.readers = OrderedDict([(name,klass.reader_class(config)(klass,config)) for name, klass in klasses.items()])
+        if executor is None:
+            self.readers = OrderedDict([(name,reader_factory(klass, config, instrumentation)) for name, klass in klasses.items()])
+        else:
+            self.readers = OrderedDict([(name, ChunkedReader(partial(reader_factory, klass, config, instrumentation), 
+                                                             executor, chunk_size)) 
+                                        for name, klass in klasses.items()])
+        self.metrics = metrics
+        self.order = order
         self._peeks = OrderedDict()
         for name, reader in self.readers.items():
             try:
                 self._peeks[name] = next(reader)
             except StopIteration: # OK
                 self.readers[name].close()
-        self.order = order
-        try:
-            self.update()
-        except:
-            1+1
-            raise
+        self._positions = dict([(name, i) for i, name in enumerate(self.readers.keys())])
+        self.update()
         
     def report(self):
         return dict([(name,reader.report()) for name,reader in self.readers.items()])
-        
-    def update(self):#TODO: This could be made more efficient by maintaining a sort.
-        self._peek = None
-        if self._peeks:
-            for k, v in self._peeks.items():
-                if v is not None:
-                    if self._peek is None:
-                        self._peek = k
-                    elif v.container_key() <= self._peeks[self._peek].container_key():
-                        if self.order(v) < self.order(self._peeks[self._peek]):
-                            self._peek = k
-                        elif v.container_key() < self._peeks[self._peek].container_key():
-                            self._peek = k
+    
+    def heap_entry(self, name, obj):
+        return (obj.container_key(), self.order(obj), self._positions[name], name)
+    
+    def update(self):
+        self._heap = [self.heap_entry(name, obj) for name, obj in self._peeks.items() if obj is not None]
+        heapq.heapify(self._heap)
         
     def peek(self):
-        if self._peek is None:
+        if not self._heap:
             return None
-        return self._peeks[self._peek]
+        return self._peeks[self._heap[0][3]]
+    
+    def peek_key(self):
+        '''
+        The container key of the peeked object, as cached in the heap.
+        '''
+        if not self._heap:
+            return None
+        return self._heap[0][0]
     
     def __next__(self):
-        if self._peek is None:
-            raise StopIteration
-        result = self._peeks[self._peek]
-        if result is None:
+        if not self._heap:
             raise StopIteration
+        name = self._heap[0][3]
+        result = self._peeks[name]
         try:
-            self._peeks[self._peek] = next(self.readers[self._peek])
+            if self.metrics is None:
+                obj = next(self.readers[name])
+            else:
+                start = perf_counter()
+                try:
+                    obj = next(self.readers[name])
+                finally:
+                    self.metrics.child_time += perf_counter() - start
         except StopIteration:
-            del self._peeks[self._peek]
-            self.readers[self._peek].close()
-        self.update()
+            heapq.heappop(self._heap)
+            del self._peeks[name]
+            self.readers[name].close()
+        else:
+            self._peeks[name] = obj
+            if self.metrics is None:
+                heapq.heapreplace(self._heap, self.heap_entry(name, obj))
+            else:
+                start = perf_counter()
+                heapq.heapreplace(self._heap, self.heap_entry(name, obj))
+                self.metrics.merge_time += perf_counter() - start
         return result
     
     def __iter__(self):
@@ -80,9 +188,19 @@ class ReaderCollection(Iterator):#Done
             reader.close()
 
 class Reader(Iterator):
-    def __init__(self, klass, config):
+    def __init__(self, klass, config, instrumentation=None):
+        '''
+        instrumentation : (oreader.metrics.Instrumentation) if given, the reader keeps metrics, 
+                          which are included in its report
+        '''
         self.klass = klass
         self.count = 0
+        self.instrumentation = instrumentation
+        if instrumentation is None:
+            self.metrics = None
+        else:
+            self.metrics = instrumentation.register(self)
+            self.update = self.timed_update
         
     def __next__(self):
         
@@ -100,11 +218,16 @@ class Reader(Iterator):
             except:
                 warnings.warn('Problem reading %s object at position %d.  Skipping.' % (self.klass.__name__, self.count))
                 traceback.print_exc()
+                if self.metrics is not None:
+                    self.metrics.skipped += 1
                 result = self.peek()
                 if result is None:
                     raise StopIteration
 #         print result
 #         print result.__dict__
+        if self.metrics is not None:
+            self.metrics.objects += 1
+            self.instrumentation.tick()
         return result
     
     def peek(self):
@@ -116,15 +239,51 @@ class Reader(Iterator):
     def report(self):
         raise NotImplementedError
     
+    def with_metrics(self, report):
+        '''
+        Add the current metrics to report, if the reader keeps any.
+        '''
+        if self.metrics is not None:
+            report['metrics'] = self.current_metrics()
+        return report
+    
+    def current_metrics(self):
+        return self.metrics.as_dict()
+    
     def update(self):
         raise NotImplementedError
     
+    def timed_update(self):
+        '''
+        Replaces update in readers with metrics, so that readers without them run as if there 
+        were no metrics.  Time spent in child readers and in merging is not assembly time.
+        '''
+        metrics = self.metrics
+        start = perf_counter()
+        excluded = metrics.child_time + metrics.merge_time
+        try:
+            type(self).update(self)
+        finally:
+            metrics.assembly_time += perf_counter() - start - (metrics.child_time + metrics.merge_time - excluded)
+    
+    def next_child(self, child):
+        '''
+        next(child), counting the time against the child rather than this reader.
+        '''
+        if self.metrics is None:
+            return next(child)
+        start = perf_counter()
+        try:
+            return next(child)
+        finally:
+            self.metrics.child_time += perf_counter() - start
+    
     def close(self):
         raise NotImplementedError
 
 class SimpleReader(Reader):
-    def __init__(self, klass, config):
-        super(SimpleReader, self).__init__(klass, config)
+    def __init__(self, klass, config, instrumentation=None):
+        super(SimpleReader, self).__init__(klass, config, instrumentation)
         self.config = config[klass]
         self.sources = self.config.get_sources(self)
         self.source_index = -1
@@ -145,7 +304,18 @@ class SimpleReader(Reader):
     def translate(self, raw):
         return self.config.translate(self, raw)
             
+    def fetch(self):
+        try:
+            return next(self.current_source)
+        except StopIteration: # OK
+            try:
+                self.next_source()
+                return next(self.current_source)
+            except StopIteration: # OK
+                return None
+    
     def update(self):
+        # The same as translate_peek(fetch()), inlined because it runs once per object
         try:
             raw = next(self.current_source)
         except StopIteration: # OK
@@ -164,11 +334,40 @@ class SimpleReader(Reader):
                 raise ValueError('Failed to translate. ' + '\n' + 
                                  'Class: ' + self.klass.__name__ + '\n' + 
                                  'Exception: ' +  repr(e))    
+    
+    def timed_update(self):
+        metrics = self.metrics
+        start = perf_counter()
+        raw = self.fetch()
+        fetched = perf_counter()
+        metrics.fetch_time += fetched - start
+        if raw is not None:
+            metrics.rows += 1
+        try:
+            self.translate_peek(raw)
+        finally:
+            metrics.translate_time += perf_counter() - fetched
+    
+    def translate_peek(self, raw):
+        if raw is None:
+            self._peek = None
+        else:
+            try:
+                self._peek = self.translate(raw)
+            except Exception as e:
+                traceback.print_exc()
+                raise ValueError('Failed to translate. ' + '\n' + 
+                                 'Class: ' + self.klass.__name__ + '\n' + 
+                                 'Exception: ' +  repr(e))    
 #                 print self.klass, None
 #         print self.klass, self.peek(), self.peek().identity_key()
     
     def report(self):
-        return {self.klass.__name__: self.config}
+        return self.with_metrics({self.klass.__name__: self.config})
+    
+    def current_metrics(self):
+        self.metrics.retries = sum(getattr(source, 'retries', 0) for source in self.sources)
+        return self.metrics.as_dict()
     
     def close(self):
         self.config.stop_source(self, self.current_source)
@@ -176,26 +375,31 @@ class SimpleReader(Reader):
 class CompoundReader(Reader):#Done
     '''Contains a SimpleReader and a ReaderCollection.'''
     
-    def __init__(self, klass, config):
-        super(CompoundReader, self).__init__(klass, config)
-        self.simple_reader = SimpleReader(klass, config)
+    def __init__(self, klass, config, executor=None, chunk_size=100, instrumentation=None):
+        '''
+        executor, chunk_size, instrumentation : passed to the ReaderCollection of relatives
+        '''
+        super(CompoundReader, self).__init__(klass, config, instrumentation)
         self.relatives = OrderedDict([(name,group[0]) for name, group in klass.relationships.items()])
-        self.readers = ReaderCollection(self.relatives, config)
+        self.readers = ReaderCollection(self.relatives, config, executor=executor, chunk_size=chunk_size, 
+                                        instrumentation=instrumentation, metrics=self.metrics)
+        self.simple_reader = SimpleReader(klass, config, instrumentation)
         self.update()
     
     def report(self):
-        return {'base':self.simple_reader.report(),
-                'relatives':self.readers.report()}
+        return self.with_metrics({'base':self.simple_reader.report(),
+                                  'relatives':self.readers.report()})
     
     def update(self):
         if self.simple_reader.peek() is None:
             self._peek = None
             return
-        self._peek = next(self.simple_reader)
-        while self.readers.peek() is not None and self.readers.peek().container_key() < self._peek.identity_key():
+        self._peek = self.next_child(self.simple_reader)
+        identity_key = self._peek.identity_key()
+        while self.readers.peek() is not None and self.readers.peek_key() < identity_key:
             warnings.warn('Orphaned %s with key %s.' % (self.readers.peek().__class__.__name__, str(self.readers.peek().identity_key())))
             next(self.readers)
-        while self.readers.peek() is not None and self.readers.peek().container_key() == self._peek.identity_key():
+        while self.readers.peek() is not None and self.readers.peek_key() == identity_key:
             found = False
             item = next(self.readers)
             for name, group in self.klass.relationships.items():
@@ -215,23 +419,24 @@ class CompoundReader(Reader):#Done
         
 class ImplicitReader(Reader):#Done
     '''Contains a ReaderCollection.'''
-    def __init__(self, klass, config):
-        super(ImplicitReader, self).__init__(klass, config)
+    def __init__(self, klass, config, executor=None, chunk_size=100, instrumentation=None):
+        super(ImplicitReader, self).__init__(klass, config, instrumentation)
         self.relatives = OrderedDict([(name,group[0]) for name, group in klass.relationships.items()])
-        self.readers = ReaderCollection(self.relatives, config)
+        self.readers = ReaderCollection(self.relatives, config, executor=executor, chunk_size=chunk_size, 
+                                        instrumentation=instrumentation, metrics=self.metrics)
         self._peek = 1 #An object that is not None
         self.update()
         
     def report(self):
-        return {'relatives': self.readers.report()}
+        return self.with_metrics({'relatives': self.readers.report()})
     
     def update(self):
         if self.readers.peek() is None:
             self._peek = None
             return
-        current_key = self.readers.peek().container_key()
+        current_key = self.readers.peek_key()
         self._peek = self.klass(**self.klass.translate_identity_key(current_key))
-        while self.readers.peek() is not None and self.readers.peek().container_key() == current_key:
+        while self.readers.peek() is not None and self.readers.peek_key() == current_key:
             found = False
             item = next(self.readers)
             for name, group in self.klass.relationships.items():
@@ -251,21 +456,22 @@ class ImplicitReader(Reader):#Done
 
 class PolymorphicReader(Reader):#Done
     '''Contains a ReaderCollection'''
-    def __init__(self, klass, config):
-        super(PolymorphicReader, self).__init__(klass, config)
+    def __init__(self, klass, config, executor=None, chunk_size=100, instrumentation=None):
+        super(PolymorphicReader, self).__init__(klass, config, instrumentation)
         klasses = {}
         stack = [klass]
         while stack:
             item = stack.pop()
-            stack.extend(item.__subclasses__())
+            stack.extend(item.direct_subtypes())
             if item in config:
                 klasses[item] = item
         klasses = OrderedDict([(k,klasses[k]) for k in sorted(klasses.keys(), key=klass.typerank())])
-        self.readers = ReaderCollection(klasses, config, klass.objrank())
+        self.readers = ReaderCollection(klasses, config, klass.objrank(), executor, chunk_size, 
+                                        instrumentation, self.metrics)
         self.update()
     
     def report(self):
-        return {'subclasses':self.readers.report()}
+        return self.with_metrics({'subclasses':self.readers.report()})
     
     def update(self):
         if self.klass.__name__ == 'Employee':
@@ -278,4 +484,100 @@ class PolymorphicReader(Reader):#Done
     def close(self):
         self.readers.close()
         
-   
\ No newline at end of file
+   
+class BatchReader(Iterator):
+    '''
+    Reads klass in columnar batches of up to batch_size rows, in the same order and from the 
+    same sources as klass.reader(config).  Each batch holds the columns of klass, either as a 
+    pandas DataFrame (batch_format='dataframe') or as an OrderedDict mapping column names to 
+    numpy masked arrays (batch_format='arrays').  Masked values are the ones that would be None 
+    on the objects.
+    
+    Classes that would be read by a SimpleReader from a config with start_raw_source never 
+    become objects.  Their raw rows are converted a batch at a time with the convert_array 
+    method of each column.  A batch that fails to convert that way is converted row by row, and 
+    rows that fail are skipped with a warning like Reader does.  Any other class is read with 
+    its usual reader, and the column values of the objects it gives are collected into batches.
+    '''
+    batch_formats = ('dataframe', 'arrays')
+    
+    def __init__(self, klass, config, batch_size, batch_format='dataframe'):
+        if batch_format not in self.batch_formats:
+            raise ValueError('Unknown batch_format %s.  Expected one of %s.' % 
+                             (batch_format, ', '.join(self.batch_formats)))
+        if not hasattr(klass, 'columns'):
+            raise ValueError('Batches of %s have no columns.  Give it a schema.' % klass.__name__)
+        self.klass = klass
+        self.batch_size = batch_size
+        self.batch_format = batch_format
+        self.count = 0
+        reader_class = klass.reader_class(config)
+        if reader_class is SimpleReader and hasattr(config[klass], 'start_raw_source'):
+            self.config = config[klass]
+            self.reader = None
+            self.source = None
+            self.rows = self.raw_rows()
+        else:
+            self.config = None
+            self.reader = reader_class(klass, config)
+            self.rows = self.reader
+    
+    def raw_rows(self):
+        for source in self.config.get_sources(self):
+            self.source = self.config.start_raw_source(self, source)
+            # Sql sources give None at the end instead of raising StopIteration
+            for raw in iter(self.source.__next__, None):
+                yield raw
+            self.config.stop_source(self, self.source)
+            self.source = None
+    
+    def convert(self, rows):
+        columns = self.klass.columns
+        if self.reader is None and not isinstance(rows[0], self.klass) and \
+                all(len(row) >= len(columns) for row in rows):
+            try:
+                return [column.convert_array(values) for column, values in zip(columns, zip(*rows))]
+            except Exception:
+                pass
+        objects = rows if self.reader is not None else self.translate(rows)
+        return [column.to_array([getattr(obj, column.name, None) for obj in objects]) for column in columns]
+    
+    def translate(self, rows):
+        result = []
+        for i, row in enumerate(rows):
+            if isinstance(row, self.klass):
+                result.append(row)
+                continue
+            try:
+                result.append(self.klass.from_row(row))
+            except Exception:
+                warnings.warn('Problem reading %s object at position %d.  Skipping.' % 
+                              (self.klass.__name__, self.count + i))
+                traceback.print_exc()
+        return result
+    
+    def __next__(self):
+        rows = list(islice(self.rows, self.batch_size))
+        if not rows:
+            raise StopIteration
+        arrays = self.convert(rows)
+        self.count += len(rows)
+        columns = OrderedDict(zip([column.name for column in self.klass.columns], arrays))
+        if self.batch_format == 'arrays':
+            return columns
+        return pandas.DataFrame(columns, columns=list(columns.keys()))
+    
+    def __iter__(self):
+        return self
+    
+    def report(self):
+        if self.reader is not None:
+            return self.reader.report()
+        return {self.klass.__name__: self.config}
+    
+    def close(self):
+        if self.reader is not None:
+            self.reader.close()
+        elif self.source is not None:
+            self.config.stop_source(self, self.source)
+            self.source = None
@@ -1,14 +1,53 @@
 import csv
 import os
+import heapq
+import multiprocessing
+import gzip
+import pickle
+from operator import itemgetter
 from six import string_types, Iterator
 from toolz.functoolz import curry, identity
 from functools import partial
+from .util import parallel_gzipped
 
-def sortcsv(input_filename, output_filename, on_cols, input_file_callable=lambda x: open(x, 'r'), 
-                output_file_callable=lambda x: open(x, 'w'), input_csv_config={}, 
+def read_file(path):
+    return open(path, 'r')
+
+def write_file(path):
+    return open(path, 'w')
+
+def read_gzipped_file(path):
+    return parallel_gzipped(path, 'rt')
+
+def write_gzipped_file(path):
+    return parallel_gzipped(path, 'wt')
+
+def no_conversion(index):
+    return identity
+
+def sortcsv(input_filename, output_filename, on_cols, input_file_callable=read_file, 
+                output_file_callable=write_file, input_csv_config={}, 
                 output_csv_config={}, conversions=None, 
-                input_header=True, output_header=True, tmp_reader_callable=lambda x: open(x, 'r'), 
-                tmp_writer_callable=lambda x: open(x, 'w'), tmpdir=None, tmp_size=100000, tmp_csv_config={}):
+                input_header=True, output_header=True, tmp_reader_callable=read_file, 
+                tmp_writer_callable=write_file, tmpdir=None, tmp_size=100000, tmp_csv_config={}, 
+                workers=None, max_fan_in=512, tmp_format='csv', tmp_compression=None):
+    '''
+    External merge sort of a csv file.  The input is split into runs of tmp_size rows, each run 
+    is sorted, and the sorted runs are merged into the output.  
+    
+    If workers is given, runs are sorted in a pool of that many processes while the input is 
+    still being split.  The output is identical to the sequential sort.  The tmp file callables 
+    and conversions are then sent to the worker processes, so they must be picklable (module 
+    level functions rather than lambdas).
+    
+    At most max_fan_in runs are merged at once; more runs are merged in several passes (see 
+    mergeparts), which keeps the number of open files bounded.
+    
+    If tmp_format is 'binary', runs are stored as pickled (key, row) records instead of csv (see 
+    splitruns), so each row is parsed once and its key computed once.  tmp_compression may then 
+    be 'gzip' or 'lz4' to compress the runs.  The tmp file callables and tmp_csv_config are not 
+    used for binary runs.
+    '''
     input_file = input_file_callable(input_filename)
     reader = csv.reader(input_file, **input_csv_config)
     if input_header:
@@ -24,10 +63,29 @@ def sortcsv(input_filename, output_filename, on_cols, input_file_callable=lambda
         else:
             sort_key_idx.append(col)
     if conversions is None:
-        conversions = lambda x: identity
+        conversions = no_conversion
     else:
         conversions = dict(zip(sort_key_idx, conversions)).__getitem__
     key = rowkey(conversions, sort_key_idx)
+    output_header = header if output_header else None
+    
+    if tmp_format == 'csv':
+        split = partial(splitcsv, reader, tmp_size=tmp_size, file_callable=tmp_writer_callable, 
+                        csv_config=tmp_csv_config)
+        sort = partial(sortpart, read_callable=tmp_reader_callable, write_callable=tmp_writer_callable, 
+                       csv_config=tmp_csv_config, key=key)
+        merge = partial(mergeparts, input_callable=tmp_reader_callable, input_csv_config=tmp_csv_config, 
+                        output_callable=output_file_callable, output_csv_config=output_csv_config, key=key, 
+                        header=output_header, max_fan_in=max_fan_in, tmp_output_callable=tmp_writer_callable)
+    elif tmp_format == 'binary':
+        # Without workers, each run is sorted before it is written, so it is written only once
+        split = partial(splitruns, reader, key=key, tmp_size=tmp_size, compression=tmp_compression, 
+                        sort=not workers)
+        sort = partial(sortrun, compression=tmp_compression) if workers else None
+        merge = partial(mergeruns, compression=tmp_compression, output_callable=output_file_callable, 
+                        output_csv_config=output_csv_config, header=output_header, max_fan_in=max_fan_in)
+    else:
+        raise ValueError('Unknown tmp_format %s' % tmp_format)
     
     if tmpdir is None:
         tmpdir = os.path.dirname(os.path.abspath(output_filename))
@@ -36,13 +94,27 @@ def sortcsv(input_filename, output_filename, on_cols, input_file_callable=lambda
         tmpdir_is_tmp = True
     else:
         tmpdir_is_tmp = False
-    tmppaths = splitcsv(reader, tmpdir, tmp_size, tmp_writer_callable, tmp_csv_config)
     
-    for tmppath in tmppaths:
-        sortpart(tmppath, tmp_reader_callable, tmp_writer_callable, tmp_csv_config, key)
+    if workers:
+        pool = multiprocessing.Pool(workers)
+        try:
+            sorts = []
+            def sort_async(tmppath):
+                sorts.append(pool.apply_async(sort, (tmppath,)))
+            tmppaths = split(tmpdir=tmpdir, callback=sort_async)
+            for result in sorts:
+                result.get()
+        finally:
+            pool.close()
+            pool.join()
+    else:
+        tmppaths = split(tmpdir=tmpdir)
+        
+        if sort is not None:
+            for tmppath in tmppaths:
+                sort(tmppath)
     
-    mergeparts(tmppaths, tmp_reader_callable, tmp_csv_config, output_filename, output_file_callable, 
-               output_csv_config, key, header if output_header else None)
+    merge(tmppaths, output_path=output_filename)
     
     for tmppath in tmppaths:
         os.remove(tmppath)
@@ -70,7 +142,11 @@ def sortpart(path, read_callable, write_callable, csv_config, key):
     writer.writerows(data)
     outfile.close()
 
-def splitcsv(reader, tmpdir, tmp_size, file_callable, csv_config):
+def splitcsv(reader, tmpdir, tmp_size, file_callable, csv_config, callback=None):
+    '''
+    Write the rows of reader to tmp files of tmp_size rows each and return their paths.  If 
+    given, callback is called with each path as soon as its file is complete.
+    '''
     outrownum = tmp_size
     outfilenum = 0
     outfile = None
@@ -79,6 +155,8 @@ def splitcsv(reader, tmpdir, tmp_size, file_callable, csv_config):
         if outrownum >= tmp_size:
             if outfile is not None:
                 outfile.close()
+                if callback is not None:
+                    callback(result[-1])
                 
             outpath = os.path.join(tmpdir, 'tmp_%d.csv'%outfilenum)
             if os.path.exists(outpath):
@@ -94,6 +172,9 @@ def splitcsv(reader, tmpdir, tmp_size, file_callable, csv_config):
         outfile.close()
     except:
         pass
+    else:
+        if callback is not None:
+            callback(result[-1])
     return result
 
 def next_or_none(it):
@@ -103,43 +184,242 @@ def next_or_none(it):
         return None
     
 class MergeIterator(Iterator):
+    '''
+    Merges sorted readers, keeping a heap of (key, reader index, row) so each row costs one key 
+    computation and O(log k) comparisons.  Rows with equal keys come out in reader order, so the 
+    merge is stable when the readers are consecutive runs of the input.
+    '''
     def __init__(self, readers, key):
         self.readers = readers
         self.key = key
-        self.current_rows = list(map(next_or_none, readers))
-        self.current_keys = list(map(key, self.current_rows))
+        self.heap = []
+        for i, reader in enumerate(readers):
+            row = next_or_none(reader)
+            if row is not None:
+                self.heap.append((key(row), i, row))
+        heapq.heapify(self.heap)
         
     def __iter__(self):
         return self
     
     def __next__(self):
-        lowest_key = None
-        lowest_key_idx = None
-        for i in range(len(self.current_keys)):
-            current_key = self.current_keys[i]
-            if current_key is None:
-                continue
-            if lowest_key is None or current_key < lowest_key:
-                lowest_key = self.current_keys[i]
-                lowest_key_idx = i
-        if lowest_key_idx is None:
+        if not self.heap:
             raise StopIteration()
-        result = self.current_rows[lowest_key_idx]
-        self.current_rows[lowest_key_idx] = next_or_none(self.readers[lowest_key_idx])
-        self.current_keys[lowest_key_idx] = self.key(self.current_rows[lowest_key_idx]) if self.current_rows[lowest_key_idx] is not None else None
+        _, i, result = self.heap[0]
+        row = next_or_none(self.readers[i])
+        if row is None:
+            heapq.heappop(self.heap)
+        else:
+            heapq.heapreplace(self.heap, (self.key(row), i, row))
         return result
 
-def mergeparts(input_paths, input_callable, input_csv_config, output_path, output_callable, output_csv_config, key, header):
+def mergefiles(input_paths, input_callable, input_csv_config, output_path, output_callable, output_csv_config, key, header):
+    if os.path.exists(output_path):
+        raise ValueError('Path %s already exists!' % output_path)
     infiles = list(map(input_callable, input_paths))
-    readers = list(map(partial(csv.reader, **input_csv_config), infiles))
-    merger = MergeIterator(readers, key)
+    try:
+        readers = list(map(partial(csv.reader, **input_csv_config), infiles))
+        merger = MergeIterator(readers, key)
+        outfile = output_callable(output_path)
+        try:
+            writer = csv.writer(outfile, **output_csv_config)
+            if header is not None:
+                writer.writerow(header)
+            writer.writerows(merger)
+        finally:
+            outfile.close()
+    finally:
+        for infile in infiles:
+            infile.close()
+
+def cascade(input_paths, max_fan_in, merge, intermediates):
+    '''
+    Merge consecutive groups of max_fan_in paths with merge(group, output_path=path) into intermediate 
+    files next to the inputs, in as many passes as needed to leave at most max_fan_in paths, and 
+    return the remaining paths.  Intermediate files are added to intermediates, and removed from 
+    it and from disk once merged again.  Inputs are never removed.
+    '''
+    if max_fan_in is not None and max_fan_in < 2:
+        raise ValueError('max_fan_in must be at least 2')
+    paths = list(input_paths)
+    level = 0
+    while max_fan_in is not None and len(paths) > max_fan_in:
+        next_paths = []
+        for i in range(0, len(paths), max_fan_in):
+            group = paths[i:i+max_fan_in]
+            if len(group) == 1:
+                next_paths.append(group[0])
+                continue
+            merged_path = os.path.join(os.path.dirname(os.path.abspath(group[0])), 
+                                       'tmp_merge_%d_%d%s' % (level, len(next_paths), os.path.splitext(group[0])[1]))
+            merge(group, output_path=merged_path)
+            intermediates.add(merged_path)
+            for path in group:
+                if path in intermediates:
+                    os.remove(path)
+                    intermediates.remove(path)
+            next_paths.append(merged_path)
+        paths = next_paths
+        level += 1
+    return paths
+
+def remove_all(paths):
+    for path in paths:
+        if os.path.exists(path):
+            os.remove(path)
+
+def mergeparts(input_paths, input_callable, input_csv_config, output_path, output_callable, output_csv_config, key, header, 
+               max_fan_in=None, tmp_output_callable=write_file):
+    '''
+    Merge the sorted files at input_paths into output_path.  If there are more than max_fan_in 
+    inputs they are merged in several passes (see cascade), so that no more than max_fan_in + 1 
+    files are ever open at once.  Intermediate files are written with tmp_output_callable and 
+    input_csv_config.
+    '''
     if os.path.exists(output_path):
         raise ValueError('Path %s already exists!' % output_path)
-    outfile = output_callable(output_path)
-    writer = csv.writer(outfile, **output_csv_config)
-    if header is not None:
-        writer.writerow(header)
-    writer.writerows(merger)
-        
+    intermediates = set()
+    try:
+        paths = cascade(input_paths, max_fan_in, 
+                        partial(mergefiles, input_callable=input_callable, input_csv_config=input_csv_config, 
+                                output_callable=tmp_output_callable, output_csv_config=input_csv_config, 
+                                key=key, header=None), 
+                        intermediates)
+        mergefiles(paths, input_callable, input_csv_config, output_path, output_callable, 
+                   output_csv_config, key, header)
+    finally:
+        remove_all(intermediates)
+
+def open_run(path, mode, compression=None):
+    '''
+    Open a binary run file, compressed with compression (None, 'gzip' or 'lz4').
+    '''
+    if compression is None:
+        return open(path, mode)
+    elif compression == 'gzip':
+        return gzip.open(path, mode, compresslevel=1)
+    elif compression == 'lz4':
+        try:
+            import lz4.frame
+        except ImportError:
+            raise ValueError('The lz4 package is required for lz4 compression.')
+        return lz4.frame.open(path, mode)
+    raise ValueError('Unknown compression %s' % compression)
+
+record_batch_size = 4096
+
+def write_records(path, records, compression=None):
+    '''
+    Write (key, row) records to a binary run as a sequence of pickled lists of up to 
+    record_batch_size records.
+    '''
+    outfile = open_run(path, 'wb', compression)
+    try:
+        batch = []
+        for record in records:
+            batch.append(record)
+            if len(batch) >= record_batch_size:
+                pickle.dump(batch, outfile, pickle.HIGHEST_PROTOCOL)
+                batch = []
+        if batch:
+            pickle.dump(batch, outfile, pickle.HIGHEST_PROTOCOL)
+    finally:
+        outfile.close()
+
+class RecordReader(Iterator):
+    '''
+    Iterates over the (key, row) records of a binary run written by write_records.
+    '''
+    def __init__(self, path, compression=None):
+        self.infile = open_run(path, 'rb', compression)
+        self.batch = iter([])
+    
+    def __iter__(self):
+        return self
+    
+    def __next__(self):
+        while True:
+            try:
+                return next(self.batch)
+            except StopIteration:
+                try:
+                    self.batch = iter(pickle.load(self.infile))
+                except EOFError:
+                    raise StopIteration()
     
-    
\ No newline at end of file
+    def close(self):
+        self.infile.close()
+
+def splitruns(reader, key, tmpdir, tmp_size, compression=None, callback=None, sort=False):
+    '''
+    Like splitcsv, but writes binary runs of (key(row), row) records so that later stages 
+    neither parse rows nor compute keys again.  If sort, each run is sorted before it is 
+    written, and needs no sortrun.
+    '''
+    result = []
+    records = []
+    def flush():
+        outpath = os.path.join(tmpdir, 'tmp_%d.run' % len(result))
+        if os.path.exists(outpath):
+            raise ValueError('Path %s already exists!' % outpath)
+        if sort:
+            records.sort(key=itemgetter(0))
+        write_records(outpath, records, compression)
+        result.append(outpath)
+        if callback is not None:
+            callback(outpath)
+    for row in reader:
+        records.append((key(row), row))
+        if len(records) >= tmp_size:
+            flush()
+            records = []
+    if records:
+        flush()
+    return result
+
+def sortrun(path, compression=None):
+    reader = RecordReader(path, compression)
+    try:
+        records = list(reader)
+    finally:
+        reader.close()
+    records.sort(key=itemgetter(0))
+    write_records(path, records, compression)
+
+def mergerecords(input_paths, compression, output_path, output_callable=None, output_csv_config={}, header=None):
+    '''
+    Merge sorted binary runs.  If output_callable is None the output is another binary run, and 
+    otherwise it is a csv file of the rows opened with output_callable.
+    '''
+    if os.path.exists(output_path):
+        raise ValueError('Path %s already exists!' % output_path)
+    readers = [RecordReader(path, compression) for path in input_paths]
+    try:
+        merger = MergeIterator(readers, itemgetter(0))
+        if output_callable is None:
+            write_records(output_path, merger, compression)
+        else:
+            outfile = output_callable(output_path)
+            try:
+                writer = csv.writer(outfile, **output_csv_config)
+                if header is not None:
+                    writer.writerow(header)
+                writer.writerows(map(itemgetter(1), merger))
+            finally:
+                outfile.close()
+    finally:
+        for reader in readers:
+            reader.close()
+
+def mergeruns(input_paths, compression, output_path, output_callable, output_csv_config, header, max_fan_in=None):
+    '''
+    Like mergeparts, for binary runs.  Intermediate passes write binary runs.
+    '''
+    if os.path.exists(output_path):
+        raise ValueError('Path %s already exists!' % output_path)
+    intermediates = set()
+    try:
+        paths = cascade(input_paths, max_fan_in, partial(mergerecords, compression=compression), intermediates)
+        mergerecords(paths, compression, output_path, output_callable, output_csv_config, header)
+    finally:
+        remove_all(intermediates)
@@ -0,0 +1,231 @@
+from oreader.base import DataObject, schema, IntegerColumn, StringColumn,\
+    RealColumn, backrelate
+from oreader.async_readers import AsyncSqaReaderConfig, AsyncReaderCollection
+from oreader.reader_configs import SqaReaderConfig
+from oreader.writer_configs import SqaWriterConfig
+from oreader.test.test_readers_and_writers import ListReaderConfig
+from sqlalchemy.engine import create_engine
+from sqlalchemy.sql.schema import MetaData
+from collections import OrderedDict
+from nose.tools import assert_list_equal, assert_raises, eq_
+from nose.plugins.skip import SkipTest
+import asyncio
+import os
+import shutil
+import tempfile
+try:
+    from sqlalchemy.ext.asyncio import create_async_engine
+    import aiosqlite
+except ImportError:
+    create_async_engine = None
+
+class AsyncResult(object):
+    '''
+    The part of the interface of sqlalchemy.ext.asyncio's AsyncResult used by the reader, over
+    a synchronous result proxy.  Every fetch yields to the event loop.  Fetches fail as given by
+    failures.
+    '''
+    def __init__(self, result_proxy, failures):
+        self.result_proxy = result_proxy
+        self.failures = failures
+
+    async def fetchmany(self, size):
+        await asyncio.sleep(0)
+        if next(self.failures):
+            raise ValueError()
+        return self.result_proxy.fetchmany(size)
+
+    async def close(self):
+        self.result_proxy.close()
+
+class AsyncConnection(object):
+    def __init__(self, engine, failures):
+        self.engine = engine
+        self.failures = failures
+        self.closed = False
+
+    async def stream(self, expr):
+        return AsyncResult(self.engine.execute(expr), self.failures)
+
+    async def close(self):
+        self.closed = True
+
+class AsyncEngine(object):
+    '''
+    The part of the interface of sqlalchemy.ext.asyncio's AsyncEngine used by the reader.
+    '''
+    def __init__(self, engine, fail_every=None):
+        self.engine = engine
+        self.fail_every = fail_every
+        self.connections = []
+
+    def failures(self):
+        i = 0
+        while True:
+            i += 1
+            yield self.fail_every is not None and i % self.fail_every == 0
+
+    async def connect(self):
+        self.connections.append(AsyncConnection(self.engine, self.failures()))
+        return self.connections[-1]
+
+class AsyncObj(DataObject):
+    partition_attribute = 'member_id'
+
+@schema([IntegerColumn(name='member_id'), StringColumn(name='name')])
+class AsyncMember(AsyncObj):
+    identity_key_ = (('member_id', 'member_id'),)
+    sort_key_ = ('member_id',)
+    container_key_ = (('member_id', 'member_id'),)
+
+class AsyncEvent(AsyncObj):
+    pass
+
+@schema([IntegerColumn(name='member_id'), IntegerColumn(name='claim_id'), RealColumn(name='amount')])
+@backrelate({'claims': (AsyncMember, True)})
+class AsyncClaim(AsyncEvent):
+    identity_key_ = (('member_id', 'member_id'), ('claim_id', 'claim_id'))
+    sort_key_ = ('member_id', 'claim_id')
+    container_key_ = (('member_id', 'member_id'),)
+
+@schema([IntegerColumn(name='member_id'), IntegerColumn(name='visit_id')])
+@backrelate({'visits': (AsyncMember, True)})
+class AsyncVisit(AsyncEvent):
+    identity_key_ = (('member_id', 'member_id'), ('visit_id', 'visit_id'))
+    sort_key_ = ('member_id', 'visit_id')
+    container_key_ = (('member_id', 'member_id'),)
+
+def async_test_data():
+    members = []
+    for i in range(200):
+        member = AsyncMember(member_id=i, name='member %d' % i)
+        for j in range(i % 4):
+            member.claims.append(AsyncClaim(member_id=i, claim_id=j, amount=float(i + j)))
+        for j in range(i % 3):
+            member.visits.append(AsyncVisit(member_id=i, visit_id=j))
+        members.append(member)
+    engine = create_engine('sqlite://')
+    metadata = MetaData(bind=engine)
+    tables = dict([(klass, klass.to_sqa_table(metadata, klass.__name__.lower()))
+                   for klass in (AsyncMember, AsyncClaim, AsyncVisit)])
+    metadata.create_all()
+    writer = AsyncMember.writer(dict([(klass, SqaWriterConfig(table)) for klass, table in tables.items()]))
+    for member in members:
+        writer.write(member)
+    writer.close()
+    return members, engine, tables
+
+def test_async_reader():
+    members, engine, tables = async_test_data()
+    async_engine = AsyncEngine(engine)
+    config = dict([(klass, AsyncSqaReaderConfig(table, async_engine, batch_size=16))
+                   for klass, table in tables.items()])
+
+    async def read(klass, config):
+        reader = klass.async_reader(config)
+        result = [obj async for obj in reader]
+        await reader.close()
+        return result
+
+    # Compound
+    actual = asyncio.run(read(AsyncMember, config))
+    assert_list_equal(actual, members)
+    eq_([member.__getstate__() for member in actual], [member.__getstate__() for member in members])
+    assert all(connection.closed for connection in async_engine.connections)
+
+    # Polymorphic, with a synchronous config mixed in, is in the same order as the synchronous reader
+    events = dict(config)
+    del events[AsyncMember]
+    events[AsyncVisit] = ListReaderConfig([(str(visit.member_id), str(visit.visit_id))
+                                           for member in members for visit in member.visits])
+    expected = list(AsyncEvent.reader(dict([(AsyncClaim, SqaReaderConfig(tables[AsyncClaim], engine)),
+                                            (AsyncVisit, events[AsyncVisit])])))
+    eq_(len(expected), sum(len(member.claims) + len(member.visits) for member in members))
+    assert_list_equal(asyncio.run(read(AsyncEvent, events)), expected)
+
+    # Many readers on one event loop
+    async def read_many():
+        return await asyncio.gather(*[read(AsyncMember, config) for _ in range(5)])
+    for actual in asyncio.run(read_many()):
+        assert_list_equal(actual, members)
+
+    # Collections
+    async def read_collection():
+        collection = AsyncReaderCollection(OrderedDict([('claims', AsyncClaim), ('visits', AsyncVisit)]), config)
+        await collection.start()
+        result = [obj async for obj in collection]
+        await collection.close()
+        return result
+    eq_([obj.container_key() for obj in asyncio.run(read_collection())],
+        [obj.container_key() for obj in expected])
+
+def test_async_reader_failures():
+    members, engine, tables = async_test_data()
+
+    # Fetches fail every few batches, and the reader resumes after the last row handed out
+    async_engine = AsyncEngine(engine, fail_every=3)
+    config = dict([(klass, AsyncSqaReaderConfig(table, async_engine, batch_size=7, n_tries=5, wait=0))
+                   for klass, table in tables.items()])
+    async def read():
+        return [member async for member in AsyncMember.async_reader(config)]
+    assert_list_equal(asyncio.run(read()), members)
+    assert len(async_engine.connections) > 3
+
+    # Every fetch fails
+    async_engine = AsyncEngine(engine, fail_every=1)
+    config = {AsyncClaim: AsyncSqaReaderConfig(tables[AsyncClaim], async_engine, n_tries=3, wait=0)}
+    async def read_claims():
+        return [claim async for claim in AsyncClaim.async_reader(config)]
+    assert_raises(ValueError, asyncio.run, read_claims())
+
+    # When the first fetch of one relative fails, the connections of the others are closed too
+    good_engine = AsyncEngine(engine)
+    bad_engine = AsyncEngine(engine, fail_every=1)
+    config = dict([(klass, AsyncSqaReaderConfig(table, bad_engine if klass is AsyncClaim else good_engine, 
+                                                n_tries=0, wait=0))
+                   for klass, table in tables.items()])
+    assert_raises(ValueError, asyncio.run, read())
+    assert good_engine.connections and bad_engine.connections
+    assert all(connection.closed for connection in good_engine.connections + bad_engine.connections)
+
+def test_sqlalchemy_async_engine():
+    if create_async_engine is None:
+        raise SkipTest('sqlalchemy.ext.asyncio (SQLAlchemy 1.4 or later) and aiosqlite are not installed')
+    members, engine, tables = async_test_data()
+    tmpdir = tempfile.mkdtemp()
+    try:
+        # The async engine reads a copy of the in-memory database from a file
+        path = os.path.join(tmpdir, 'members.db')
+        file_engine = create_engine('sqlite:///' + path)
+        metadata = MetaData()
+        file_tables = dict([(klass, klass.to_sqa_table(metadata, klass.__name__.lower())) for klass in tables])
+        metadata.create_all(file_engine)
+        for klass, table in tables.items():
+            file_engine.execute(file_tables[klass].insert(), [dict(row) for row in engine.execute(table.select())])
+        
+        async def read():
+            async_engine = create_async_engine('sqlite+aiosqlite:///' + path)
+            try:
+                config = dict([(klass, AsyncSqaReaderConfig(table, async_engine, batch_size=16))
+                               for klass, table in file_tables.items()])
+                reader = AsyncMember.async_reader(config)
+                result = [member async for member in reader]
+                await reader.close()
+                return result
+            finally:
+                await async_engine.dispose()
+        actual = asyncio.run(read())
+        assert_list_equal(actual, members)
+        eq_([member.__getstate__() for member in actual], [member.__getstate__() for member in members])
+    finally:
+        shutil.rmtree(tmpdir)
+
+if __name__ == '__main__':
+    # This code will run the test in this file.'
+    import sys
+    import nose
+    module_name = sys.modules[__name__].__file__
+
+    result = nose.run(argv=[sys.argv[0],
+                            module_name,
+                            '-s','-v'])
@@ -1,7 +1,10 @@
-from oreader.base import DateTimeColumn
-from datetime import datetime
-from nose.tools import assert_equal
-from dateutil.tz.tz import tzutc
+from oreader.base import DateTimeColumn, DataObject, schema, IntegerColumn,\
+    RealColumn, StringColumn, BooleanColumn, DateColumn, relate
+from datetime import datetime, date, timedelta
+import arrow
+from nose.tools import assert_equal, assert_raises
+from dateutil.tz.tz import tzutc, tzoffset
+import numpy as np
 
 def test_datetime_conversion_distant_past():
     # Can any AD date, but not the year 0, which I guess is BC
@@ -15,6 +18,104 @@ def test_datetime_conversion_distant_past():
     assert_equal(col.convert(d3), datetime(1, 6, 11, 10, 2, 10, tzinfo=tzutc()))
     assert_equal(col.convert(d4), None)
 
+def test_date_conversion_cache():
+    values = ['2018-01-02', '20180102', '2018-02-30', '2018-01-02 10:11:12', '2018-01-02 24:00:00', 
+              '01/02/2018', ' 2018-01-02 ', '0000-01-01', '1018-06-11 10:02:10']
+    for fmt in ['YYYY-MM-DD', 'YYYYMMDD', 'YYYY-MM-DD HH:mm:ss', 'MM/DD/YYYY']:
+        date_col = DateColumn(name='date', format=fmt)
+        datetime_col = DateTimeColumn(name='datetime', format=fmt)
+        for value in values * 2:
+            try:
+                expected = arrow.get(value.strip(), fmt)
+            except (arrow.parser.ParserError, ValueError):
+                expected = None
+            assert_equal(date_col.convert(value), expected.date() if expected is not None else None)
+            assert_equal(datetime_col.convert(value), expected.datetime if expected is not None else None)
+        distinct = len(set(value.strip() for value in values))
+        assert_equal(date_col.parse_cache.cache_info().misses, distinct)
+        assert_equal(date_col.parse_cache.cache_info().hits, 2 * len(values) - distinct)
+        for value in [date(5, 1, 2), datetime(2018, 1, 2, 3, 4, 5), datetime(2018, 1, 2, 3, 4, 5, tzinfo=tzutc()), 
+                      datetime(2018, 1, 2, 3, 4, 5, tzinfo=tzoffset(None, -18000))]:
+            assert_equal(date_col.unconvert(value), arrow.get(value).format(fmt))
+            assert_equal(datetime_col.unconvert(value), arrow.get(value).format(fmt))
+    
+    col = DateColumn(name='date', cache_size=2)
+    for day in range(10):
+        col.convert((date(2018, 1, 1) + timedelta(days=day)).isoformat())
+    assert_equal(col.parse_cache.cache_info().currsize, 2)
+
+def test_non_string_temporal_conversion():
+    import pandas
+    for fmt in ['YYYY-MM-DD', 'YYYYMMDD', 'YYYY-MM-DD HH:mm:ss', 'MM/DD/YYYY']:
+        date_col = DateColumn(name='date', format=fmt)
+        datetime_col = DateTimeColumn(name='datetime', format=fmt)
+        assert_equal(date_col.convert(date(2018, 1, 2)), date(2018, 1, 2))
+        assert_equal(date_col.convert(datetime(2018, 1, 2, 3, 4, 5)), date(2018, 1, 2))
+        assert_equal(datetime_col.convert(date(2018, 1, 2)), datetime(2018, 1, 2))
+        assert_equal(datetime_col.convert(datetime(2018, 1, 2, 3, 4, 5)), datetime(2018, 1, 2, 3, 4, 5))
+        # Other values go to arrow with the format, which does not parse them
+        for value in [pandas.Timestamp('2018-01-02'), pandas.Timestamp('2018-01-02 03:04:05')]:
+            assert_equal(date_col.convert(value), None)
+            assert_equal(datetime_col.convert(value), None)
+
+def test_convert_array():
+    cases = [(IntegerColumn(name='integer'), np.int64, 
+              [['1', ' 2 ', '', '-3', '+4', '1_000'], ['1', '4.0', 'x', '', None], 
+               ['1', '99999999999999999999']]),
+             (RealColumn(name='real'), np.float64, 
+              [['1.5', ' 2 ', '', '1e3', 'inf'], ['1.5', 'x', '', None]]),
+             (StringColumn(name='string'), object, [['a', ' b ', '']]),
+             (StringColumn(name='stripped', format='strip'), object, [['a', ' b ', '']]),
+             (DateColumn(name='date'), np.dtype('datetime64[D]'), 
+              [['2018-01-02', ' 2018-01-02 ', '', '2018-02-30', '2018-01-03', '2018-01-02']]),
+             (DateTimeColumn(name='datetime'), object, 
+              [['2018-01-02 10:11:12', '', '2018-01-02 10:11:12', 'x']]),
+             (BooleanColumn(name='boolean'), np.bool_, [['T', ' no ', '', '1', 'T', 'YES']])]
+    for column, dtype, blocks in cases:
+        for values in blocks + [[]]:
+            result = column.convert_array(values)
+            assert_equal(result.tolist(), [column.convert(value) for value in values])
+            assert_equal(list(np.ma.getmaskarray(result)), 
+                         [column.convert(value) is None for value in values])
+            if values is blocks[0]:
+                assert_equal(result.dtype, dtype)
+    assert_raises(ValueError, lambda: BooleanColumn(name='boolean').convert_array(['T', 'maybe']))
+
+def test_from_row():
+    class Child(DataObject):
+        pass
+    
+    @schema([IntegerColumn(name='integer'), RealColumn(name='real'), StringColumn(name='string'), 
+             StringColumn(name='stripped', format='strip'), BooleanColumn(name='boolean'), 
+             DateColumn(name='date')])
+    @relate({'children': (Child, True), 'child': (Child, False)})
+    class Thing(DataObject):
+        pass
+    
+    def generic(row):
+        return Thing(**dict(zip(Thing.header(), row)))
+    
+    rows = [('1', '1.5', 'a', ' b ', 'T', '2018-01-01'),
+            (' 2 ', ' 2.5 ', ' a ', 'b', ' no ', ' 2018-01-01 '),
+            ('', '', '', '', '', ''),
+            (None, None, None, None, 1, None),
+            (3, 3, 3, 3, 0.0, datetime(2018, 1, 1)),
+            ('4.0', 'x', u'\u00e9', 4.5, True, 'bad'),
+            ('5', '5')]
+    for row in rows:
+        expected = generic(row)
+        actual = Thing.from_row(row)
+        assert_equal(actual.__getstate__(), expected.__getstate__())
+        assert_equal(actual.children, [])
+        assert_equal(actual.child, None)
+    assert_raises(ValueError, lambda: Thing.from_row(('1', '1.5', 'a', 'b', 'maybe', '')))
+    assert Thing.from_row.__func__ is not DataObject.from_row.__func__
+    
+    values = Thing.from_row(rows[0]).__getstate__()
+    thing = Thing.from_values([values[column.name] for column in Thing.columns])
+    assert_equal(thing.__getstate__(), values)
+    assert_equal(Thing.from_values([None] * len(Thing.columns)).boolean, None)
+
 if __name__ == '__main__':
     # This code will run the test in this file.'
     import sys
@@ -0,0 +1,86 @@
+from oreader.base import DataObject, schema, IntegerColumn, StringColumn,\
+    RealColumn, DateColumn, DateTimeColumn, BooleanColumn, backrelate
+from nose.tools import assert_list_equal, eq_
+from nose.plugins.skip import SkipTest
+import datetime
+import os
+import shutil
+import tempfile
+try:
+    import pyarrow.parquet
+    from oreader.parquet import ParquetReaderConfig, ParquetWriterConfig, ParquetSource
+except ImportError:
+    pyarrow = None
+
+class PqObj(DataObject):
+    partition_attribute = 'member_id'
+
+@schema([IntegerColumn(name='member_id'), StringColumn(name='name'), BooleanColumn(name='active'),
+         DateTimeColumn(name='joined')])
+class PqMember(PqObj):
+    identity_key_ = (('member_id', 'member_id'),)
+    sort_key_ = ('member_id',)
+    container_key_ = (('member_id', 'member_id'),)
+
+@schema([IntegerColumn(name='member_id'), IntegerColumn(name='claim_id'), DateColumn(name='date'),
+         RealColumn(name='amount')])
+@backrelate({'claims': (PqMember, True)})
+class PqClaim(PqObj):
+    identity_key_ = (('member_id', 'member_id'), ('claim_id', 'claim_id'))
+    sort_key_ = ('member_id', 'claim_id')
+    container_key_ = (('member_id', 'member_id'),)
+
+def test_parquet():
+    if pyarrow is None:
+        raise SkipTest('pyarrow is not installed')
+    tmpdir = tempfile.mkdtemp()
+    try:
+        members_path = os.path.join(tmpdir, 'members.parquet')
+        claims_path = os.path.join(tmpdir, 'claims.parquet')
+        members = []
+        for i in range(50):
+            member = PqMember(member_id=i, name='member %d' % i, active=['T', 'F', ''][i % 3],
+                              joined='2017-01-01 00:00:%02d' % i if i % 5 else '')
+            for j in range(i % 4):
+                member.claims.append(PqClaim(member_id=i, claim_id=j, date=datetime.date(2017, 1, j + 1),
+                                             amount=float(j) if j else None))
+            members.append(member)
+        writer = PqMember.writer({PqMember: ParquetWriterConfig(members_path, batch_size=16),
+                                  PqClaim: ParquetWriterConfig(claims_path, batch_size=16)})
+        for member in members:
+            writer.write(member)
+        writer.close()
+        eq_(pyarrow.parquet.ParquetFile(members_path).num_row_groups, 4)
+
+        config = {PqMember: ParquetReaderConfig(members_path), PqClaim: ParquetReaderConfig(claims_path)}
+        actual = list(PqMember.reader(config))
+        assert_list_equal(actual, members)
+        eq_([member.__getstate__() for member in actual], [member.__getstate__() for member in members])
+
+        # Projection keeps the key columns
+        projected = list(PqClaim.reader({PqClaim: ParquetReaderConfig(claims_path, columns=['date'])}))
+        eq_([(claim.member_id, claim.claim_id, claim.date, claim.amount) for claim in projected],
+            [(claim.member_id, claim.claim_id, claim.date, None) for member in members for claim in member.claims])
+
+        # Range reads skip row groups by their statistics
+        config = {PqMember: ParquetReaderConfig(members_path, start=(20,), stop=(30,)),
+                  PqClaim: ParquetReaderConfig(claims_path, start=(20,), stop=(30,))}
+        assert_list_equal(list(PqMember.reader(config)), members[20:30])
+        batches = list(PqClaim.reader(config, batch_size=4, batch_format='arrays'))
+        eq_(sum(len(batch['claim_id']) for batch in batches), sum(len(member.claims) for member in members[20:30]))
+        source = ParquetSource(members_path, PqMember, ['member_id'], start=(20,), stop=(30,))
+        eq_([source.skip(i) for i in range(4)], [True, False, True, True])
+        eq_([claim.identity_key() for claim in PqClaim.reader({PqClaim: ParquetReaderConfig(claims_path, start=(5, 0), stop=(6, 1))})],
+            [(5, 0), (6, 0)])
+    finally:
+        shutil.rmtree(tmpdir)
+
+if __name__ == '__main__':
+    # This code will run the test in this file.'
+    import sys
+    import nose
+    module_name = sys.modules[__name__].__file__
+
+    result = nose.run(argv=[sys.argv[0],
+                            module_name,
+                            '-s','-v'])
@@ -3,12 +3,19 @@ from oreader.base import DataObject, schema, IntegerColumn, StringColumn,\
 from sqlalchemy.engine import create_engine
 from sqlalchemy.sql.schema import MetaData, Table, Column
 from sqlalchemy.sql.sqltypes import Integer, String, Float, Date
+from sqlalchemy.sql.expression import select, func, and_
 from oreader.writer_configs import SqaWriterConfig
 import names
 import random
 import numpy as np
+import pandas as pd
 import datetime
-from oreader.reader_configs import SqaReaderConfig
+from oreader.reader_configs import SqaReaderConfig, TupleSimpleReaderConfig,\
+    CsvReaderConfig, MmapCsvSource, PrefetchReaderConfig, PrefetchSource, CsvKeyIndex, bisect_csv,\
+    KeyRangeSource
+from sqlalchemy.pool import StaticPool
+from oreader.readers import ReaderCollection
+from collections import OrderedDict
 from itertools import islice, chain, cycle
 import unittest
 from frozendict import frozendict
@@ -16,17 +23,29 @@ from nose.tools import assert_list_equal, assert_raises, assert_equal, eq_
 from oreader.groups import create_attribute_group_mixin,\
     AttributeGroup, AttributeGroupList
 from builtins import object
+import pickle
+import os
+import shutil
+import tempfile
+import csv
+import warnings
+from functools import partial
+from concurrent.futures import ThreadPoolExecutor
+from oreader.parallel import ParallelReader, partition_config, partition_predicate
+from oreader.util import gzipped
+from oreader.metrics import Instrumentation, ReaderMetrics
 
 def take(n, iterable):
     "Return first n items of the iterable as a list"
     return list(islice(iterable, n))
 
-def create_sqa_connection_handling_case(engine_wrapper, assertion, reader_args={}):
+def create_sqa_connection_handling_case(engine_wrapper, assertion, reader_args={}, prefetch=False):
     '''
     Generates a test function for testing an assertion about the behavior of 
     the reader after the engine has been modified by engine_wrapper.  The intentions is that 
     the engine_wrapper does something to make the data source unreliable and the
-    assertion ensures that the reader handles the situation correctly.
+    assertion ensures that the reader handles the situation correctly.  If prefetch, the 
+    reader config is wrapped in a PrefetchReaderConfig.
     '''
     
     def tester():
@@ -38,8 +57,11 @@ def create_sqa_connection_handling_case(engine_wrapper, assertion, reader_args={
             identity_key_ = (('id', 'id'),)
             sort_key_ = ('id',)
         
-        # Create a test database and table
-        engine = create_engine('sqlite://')
+        # Create a test database and table, shared with the prefetching thread
+        if prefetch:
+            engine = create_engine('sqlite://', poolclass=StaticPool, connect_args={'check_same_thread': False})
+        else:
+            engine = create_engine('sqlite://')
         metadata = MetaData(bind=engine)
         foos_table = Foo.to_sqa_table(metadata, 'foos')
         metadata.create_all()
@@ -50,6 +72,8 @@ def create_sqa_connection_handling_case(engine_wrapper, assertion, reader_args={
         
         # Define the mapping between tables and objects for reading
         reader_config = {Foo: SqaReaderConfig(foos_table, engine_wrapper(engine), **reader_args)}
+        if prefetch:
+            reader_config = {Foo: PrefetchReaderConfig(reader_config[Foo], queue_size=2, chunk_size=16)}
         
         # Create some objects
         foos = [Foo(id=i) for i in range(1000)]
@@ -150,6 +174,67 @@ test_sqa_proxy_fail = create_sqa_connection_handling_case(lambda eng: FaultyEngi
                                                            {'n_tries': 5})
 
 
+# The same failure patterns as above, but with rows fetched in batches.  Batches span the failures, so 
+# the reader must resume after the last row it handed out rather than the last row it fetched.
+test_unreliable_sqa_connection_batched = create_sqa_connection_handling_case(lambda eng: FaultyEngine(eng, never_fail(), 
+                                                                                    cycle([fail_every_n_after_m(0, 10, ValueError)])),
+                                                           lambda read: eq_([foo.id for foo in read()], list(range(1000))),
+                                                           {'n_tries': 5, 'batch_size': 7})
+
+test_unreliable_sqa_engine_batched = create_sqa_connection_handling_case(lambda eng: FaultyEngine(eng, fail_every_n_after_m(0, 5, ValueError), 
+                                                                                    cycle([fail_every_n_after_m(0, 3, ValueError)])),
+                                                           lambda read: eq_([foo.id for foo in read()], list(range(1000))),
+                                                           {'n_tries': 5, 'batch_size': 64})
+
+test_sqa_proxy_fail_batched = create_sqa_connection_handling_case(lambda eng: FaultyEngine(eng, never_fail(), 
+                                                                                    chain([fail_every_n_after_m(0, 10, ValueError)],
+                                                                                          cycle([fail_every_n_after_m(0, 1, TypeError)]))),
+                                                           lambda read: assert_raises(TypeError, read),
+                                                           {'n_tries': 5, 'batch_size': 7})
+
+# The same failure patterns again, read in a background thread
+test_failed_sqa_connection_prefetched = create_sqa_connection_handling_case(lambda eng: FaultyEngine(eng, fail_every_n_after_m(1, 1, ValueError), 
+                                                                                    chain([fail_every_n_after_m(10, 1, ValueError)], 
+                                                                                          cycle([never_fail()]))),
+                                                           lambda read: assert_raises(ValueError, read),
+                                                           {'n_tries': 5}, prefetch=True)
+
+test_unreliable_sqa_engine_prefetched = create_sqa_connection_handling_case(lambda eng: FaultyEngine(eng, fail_every_n_after_m(0, 5, ValueError), 
+                                                                                    cycle([fail_every_n_after_m(0, 3, ValueError)])),
+                                                           lambda read: eq_([foo.id for foo in read()], list(range(1000))),
+                                                           {'n_tries': 5, 'batch_size': 64}, prefetch=True)
+
+test_sqa_proxy_fail_prefetched = create_sqa_connection_handling_case(lambda eng: FaultyEngine(eng, never_fail(), 
+                                                                                    chain([fail_every_n_after_m(0, 10, ValueError)],
+                                                                                          cycle([fail_every_n_after_m(0, 1, TypeError)]))),
+                                                           lambda read: assert_raises(TypeError, read),
+                                                           {'n_tries': 5}, prefetch=True)
+
+def test_batched_sqa_writer():
+    class FooObj(DataObject):
+        partition_attribute = 'id'
+    
+    @schema([IntegerColumn(name='id'), StringColumn(name='name'), DateColumn(name='date')])
+    class Foo(FooObj):
+        identity_key_ = (('id', 'id'),)
+        sort_key_ = ('id',)
+    
+    foos = [Foo(id=i, name=names.get_full_name(), date=datetime.date(2000, 1, 1) + datetime.timedelta(days=i)) 
+            for i in range(1000)]
+    for method in ['executemany', 'values', 'auto']:
+        engine = create_engine('sqlite://')
+        metadata = MetaData()
+        foos_table = Foo.to_sqa_table(metadata, 'foos')
+        writer = Foo.writer({Foo: SqaWriterConfig(foos_table, create_table_if_not_exist=True, engine=engine,
+                                                  batch_size=300, method=method)})
+        for foo in foos:
+            writer.write(foo)
+        
+        # Only full batches have been inserted until the writer is closed
+        eq_(engine.execute(select([func.count()]).select_from(foos_table)).scalar(), 900)
+        writer.close()
+        assert_list_equal(list(Foo.reader({Foo: SqaReaderConfig(foos_table, engine)})), foos)
+
 def test_attribute_groups():
     class HCObj(DataObject):
         partition_attribute = 'member_id'
@@ -412,6 +497,597 @@ def test_read_write():
     assert_list_equal(schools, read_schools)
 
 
+class ListReaderConfig(TupleSimpleReaderConfig):
+    def __init__(self, rows):
+        self.rows = rows
+    
+    def start_source(self, reader, source):
+        return iter(source)
+    
+    def stop_source(self, reader, source):
+        pass
+    
+    def get_sources(self, reader):
+        return [self.rows]
+
+class GroupObj(DataObject):
+    partition_attribute = 'group_id'
+
+@schema([IntegerColumn(name='group_id'), IntegerColumn(name='id')])
+class Left(GroupObj):
+    identity_key_ = (('group_id', 'group_id'), ('id', 'id'))
+    sort_key_ = ('group_id', 'id')
+    container_key_ = (('group_id', 'group_id'),)
+
+@schema([IntegerColumn(name='group_id'), IntegerColumn(name='id')])
+class Right(GroupObj):
+    identity_key_ = (('group_id', 'group_id'), ('id', 'id'))
+    sort_key_ = ('group_id', 'id')
+    container_key_ = (('group_id', 'group_id'),)
+
+def test_reader_collection_order():
+    config = {Left: ListReaderConfig([('0', '0'), ('0', '1'), ('2', '0')]),
+              Right: ListReaderConfig([('0', '0'), ('1', '0'), ('2', '0'), ('3', '0')])}
+    
+    # Equal container keys are broken by order, then by position in klasses
+    rank = {Left: 1, Right: 0}
+    collection = ReaderCollection(OrderedDict([('left', Left), ('right', Right)]), config, lambda obj: rank[type(obj)])
+    eq_([(type(obj).__name__, obj.group_id, obj.id) for obj in collection],
+        [('Right', 0, 0), ('Left', 0, 0), ('Left', 0, 1), ('Right', 1, 0), ('Right', 2, 0), ('Left', 2, 0), ('Right', 3, 0)])
+    
+    collection = ReaderCollection(OrderedDict([('left', Left), ('right', Right)]), config)
+    eq_(collection.peek_key(), (0,))
+    eq_([(type(obj).__name__, obj.group_id, obj.id) for obj in collection],
+        [('Left', 0, 0), ('Left', 0, 1), ('Right', 0, 0), ('Right', 1, 0), ('Left', 2, 0), ('Right', 2, 0), ('Right', 3, 0)])
+    eq_(collection.peek(), None)
+    eq_(collection.peek_key(), None)
+
+class SlotObj(DataObject):
+    partition_attribute = 'member_id'
+
+@schema([IntegerColumn(name='member_id'), StringColumn(name='name')], slots=True)
+class SlotMember(SlotObj):
+    identity_key_ = (('member_id', 'member_id'),)
+    sort_key_ = ('member_id',)
+    container_key_ = (('member_id', 'member_id'),)
+
+@schema([IntegerColumn(name='member_id'), IntegerColumn(name='claim_id'), DateColumn(name='date'), 
+         RealColumn(name='amount')], slots=True)
+@backrelate({'claims': (SlotMember, True)})
+class SlotClaim(SlotObj):
+    identity_key_ = (('member_id', 'member_id'), ('claim_id', 'claim_id'))
+    sort_key_ = ('member_id', 'claim_id')
+    container_key_ = (('member_id', 'member_id'),)
+
+class Bad(object):
+    def strip(self):
+        raise ValueError('Cannot strip')
+
+def member_claim_config():
+    '''
+    ListReaderConfigs of 40 SlotMembers and their 38 good SlotClaims, plus one whose amount 
+    cannot be converted, which is skipped with a warning.
+    '''
+    claims = [(i, j, '2017-01-%02d' % (j + 1), Bad() if (i, j) == (8, 1) else '%d.5' % j) 
+              for i in range(40) for j in range(i % 3)]
+    return {SlotMember: ListReaderConfig([(i, 'member %d' % i) for i in range(40)]), 
+            SlotClaim: ListReaderConfig(claims)}
+
+def test_prefetch_reader_config():
+    def config(prefetch):
+        result = member_claim_config()
+        if prefetch:
+            result = dict((klass, PrefetchReaderConfig(value, queue_size=2, chunk_size=3)) 
+                          for klass, value in result.items())
+        return result
+    expected = list(SlotMember.reader(config(False)))
+    eq_(sum(len(member.claims) for member in expected), 38)
+    assert_list_equal(list(SlotMember.reader(config(True))), expected)
+    
+    # Closing early stops the background threads
+    reader = SlotMember.reader(config(True))
+    eq_(next(reader), expected[0])
+    reader.close()
+    for source in [reader.simple_reader.current_source] + \
+                  [collection_reader.current_source for collection_reader in reader.readers.readers.values()]:
+        assert not source.thread.is_alive()
+    
+    # Errors stopping the source are raised after the rows read before them
+    class FailingStopConfig(ListReaderConfig):
+        def stop_source(self, reader, source):
+            raise RuntimeError('Cannot stop')
+    
+    source = PrefetchSource(FailingStopConfig([]), SlotMember.reader(config(False)).simple_reader, 
+                            iter([(i, 'member %d' % i) for i in range(5)]), 2, 3)
+    eq_([next(source).member_id for _ in range(5)], list(range(5)))
+    assert_raises(RuntimeError, lambda: next(source))
+    assert_raises(StopIteration, lambda: next(source))
+    source.close()
+    assert not source.thread.is_alive()
+
+def test_concurrent_reader_collection():
+    config = member_claim_config()
+    expected = list(SlotMember.reader(config))
+    eq_(sum(len(member.claims) for member in expected), 38)
+    
+    # Fewer workers than readers, and chunks that end on and around the bad row
+    for workers, chunk_size in [(1, 1), (2, 3), (4, 100)]:
+        with ThreadPoolExecutor(workers) as executor:
+            reader = SlotMember.reader(config, executor=executor, chunk_size=chunk_size)
+            assert_list_equal(list(reader), expected)
+            eq_(reader.report()['relatives'], {'claims': {'SlotClaim': config[SlotClaim]}})
+            reader.close()
+    
+    # Merge order matches the serial collection
+    config = {Left: ListReaderConfig([(str(i // 3), str(i)) for i in range(30)]),
+              Right: ListReaderConfig([(str(i // 2), str(i)) for i in range(30)])}
+    expected = [(type(obj).__name__, obj.identity_key()) for obj in GroupObj.reader(config)]
+    with ThreadPoolExecutor(2) as executor:
+        eq_([(type(obj).__name__, obj.identity_key()) for obj in GroupObj.reader(config, executor=executor, chunk_size=4)],
+            expected)
+
+def test_reader_metrics():
+    config = member_claim_config()
+    summaries = []
+    instrumentation = Instrumentation(summaries.append, interval=0)
+    reader = SlotMember.reader(config, instrumentation=instrumentation)
+    members = list(reader)
+    reader.close()
+    instrumentation.close()
+    eq_(len(members), 40)
+    assert len(summaries) > 40 # Every object of every reader, and close
+    summary = instrumentation.summary()
+    eq_(summaries[-1], summary)
+    eq_(sorted(summary.keys()), ['SlotClaim/SimpleReader', 'SlotMember/CompoundReader', 'SlotMember/SimpleReader'])
+    claims_metrics = summary['SlotClaim/SimpleReader']
+    eq_((claims_metrics['rows'], claims_metrics['objects'], claims_metrics['skipped'], claims_metrics['retries']), 
+        (len(config[SlotClaim].rows), len(config[SlotClaim].rows) - 1, 1, 0))
+    eq_(summary['SlotMember/SimpleReader']['objects'], 40)
+    eq_(summary['SlotMember/CompoundReader']['objects'], 40)
+    assert summary['SlotMember/CompoundReader']['merge_time'] > 0
+    assert all(summary[name][timer] >= 0 for name in summary for timer in ReaderMetrics.timers)
+    report = reader.report()
+    eq_(report['metrics'], summary['SlotMember/CompoundReader'])
+    eq_(report['relatives']['claims']['metrics'], claims_metrics)
+    eq_(report['relatives']['claims']['SlotClaim'], config[SlotClaim])
+    
+    # Without instrumentation, reports only hold configs
+    eq_(SlotMember.reader(config).report()['relatives'], {'claims': {'SlotClaim': config[SlotClaim]}})
+    
+    # Retries are counted by the sources
+    class FooObj(DataObject):
+        partition_attribute = 'id'
+    
+    @schema([IntegerColumn(name='id')])
+    class Foo(FooObj):
+        identity_key_ = (('id', 'id'),)
+        sort_key_ = ('id',)
+    
+    engine = create_engine('sqlite://')
+    metadata = MetaData(bind=engine)
+    foos_table = Foo.to_sqa_table(metadata, 'foos')
+    metadata.create_all()
+    writer = Foo.writer({Foo: SqaWriterConfig(foos_table)})
+    for i in range(100):
+        writer.write(Foo(id=i))
+    writer.close()
+    faulty = FaultyEngine(engine, never_fail(), cycle([fail_every_n_after_m(0, 10, ValueError)]))
+    instrumentation = Instrumentation()
+    reader = Foo.reader({Foo: SqaReaderConfig(foos_table, faulty, n_tries=5, wait=0)}, instrumentation=instrumentation)
+    eq_([foo.id for foo in reader], list(range(100)))
+    metrics = reader.report()['metrics']
+    eq_((metrics['rows'], metrics['objects']), (100, 100))
+    assert metrics['retries'] >= 10
+    
+    # A clean read opens its first result proxy without a retry, fetching rows one at a time or in batches
+    for batch_size in [None, 7]:
+        reader = Foo.reader({Foo: SqaReaderConfig(foos_table, engine, wait=10, batch_size=batch_size)}, 
+                            instrumentation=Instrumentation())
+        eq_([foo.id for foo in reader], list(range(100)))
+        eq_(reader.report()['metrics']['retries'], 0)
+
+def test_slotted_classes():
+    eq_(SlotClaim.__slots__, ('member_id', 'claim_id', 'date', 'amount'))
+    assert SlotMember.relationships['claims'][0] is SlotClaim
+    assert SlotMember.concrete()
+    eq_(set(SlotObj.subtypes()), {SlotObj, SlotMember, SlotClaim})
+    
+    members = []
+    for i in range(5):
+        member = SlotMember(member_id=str(i), name=names.get_full_name())
+        for j in range(i):
+            member.claims.append(SlotClaim(member_id=i, claim_id=j, date='2017-01-%02d' % (j + 1), amount='%d.5' % j))
+        members.append(member)
+    claim = members[1].claims[0]
+    eq_(claim.sort_key(), (1, 0))
+    eq_(claim.identity_key(), (1, 0))
+    eq_(claim.container_key(), (1,))
+    eq_(claim.to_row(), ['1', '0', '2017-01-01', '0.5'])
+    eq_(claim, SlotClaim(member_id=1, claim_id=0, date=datetime.date(2017, 1, 1), amount=0.5))
+    eq_(len({claim, SlotClaim(member_id=1, claim_id=0, date=datetime.date(2017, 1, 1), amount=0.5)}), 1)
+    assert_raises(TypeError, lambda: SlotClaim(member_id=1, bad=2))
+    eq_(pickle.loads(pickle.dumps(members)), members)
+    
+    # The columns are slots, but the bases without __slots__ still give instances a __dict__, 
+    # which only holds what is set outside the columns and relationships
+    eq_(claim.__dict__, {})
+    claim.freeze()
+    eq_(list(claim.__dict__), ['_hash'])
+    
+    engine = create_engine('sqlite://')
+    metadata = MetaData(bind=engine)
+    members_table = SlotMember.to_sqa_table(metadata, 'members')
+    claims_table = SlotClaim.to_sqa_table(metadata, 'claims')
+    writer = SlotMember.writer({SlotMember: SqaWriterConfig(members_table, create_table_if_not_exist=True),
+                                SlotClaim: SqaWriterConfig(claims_table, create_table_if_not_exist=True)})
+    for member in members:
+        writer.write(member)
+    reader = SlotMember.reader({SlotMember: SqaReaderConfig(members_table, engine),
+                                SlotClaim: SqaReaderConfig(claims_table, engine)})
+    assert_list_equal(list(reader), members)
+
+def test_eq_and_hash():
+    
+    class EqObj(DataObject):
+        partition_attribute = 'member_id'
+    
+    @schema([IntegerColumn(name='member_id'), StringColumn(name='name')])
+    class Member(EqObj):
+        identity_key_ = (('member_id', 'member_id'),)
+        sort_key_ = ('member_id',)
+        container_key_ = (('member_id', 'member_id'),)
+    
+    @schema([IntegerColumn(name='member_id'), IntegerColumn(name='claim_id')])
+    @backrelate({'claims': (Member, True)})
+    class Claim(EqObj):
+        identity_key_ = (('member_id', 'member_id'), ('claim_id', 'claim_id'))
+        sort_key_ = ('member_id', 'claim_id')
+        container_key_ = (('member_id', 'member_id'),)
+    
+    def member(member_id, claims, cls=Member):
+        result = cls(member_id=member_id, name='member %d' % member_id)
+        result.claims.extend(Claim(member_id=member_id, claim_id=j) for j in claims)
+        return result
+    
+    for cls in (Member, SlotMember):
+        assert hasattr(cls.__eq__, '__source__') and hasattr(cls.__hash__, '__source__')
+        objects = [member(i, claims, cls) for i in range(3) for claims in [[], [0], [0, 1], [1]]]
+        for a in objects:
+            for b in objects + [member(a.member_id, [c.claim_id for c in a.claims], cls)]:
+                eq_(a == b, DataObject.__eq__(a, b))
+                eq_(a != b, not DataObject.__eq__(a, b))
+                if a == b:
+                    eq_(hash(a), hash(b))
+        eq_(len(set(objects + [member(i, claims, cls) for i in range(3) for claims in [[0], [1]]])), len(objects))
+        assert objects[0] != Claim(member_id=0, claim_id=0)
+    
+    # Key methods are generated for classes with a schema, and again for subclasses that change keys
+    assert hasattr(Member.sort_key, '__source__') and hasattr(Claim.container_key, '__source__')
+    eq_(member(3, [1]).claims[0].sort_key(), (3, 1))
+    eq_(member(3, [1]).claims[0].container_key(), (3,))
+    
+    class ReversedClaim(Claim):
+        sort_key_ = ('claim_id', 'member_id')
+    
+    eq_(ReversedClaim(member_id=3, claim_id=1).sort_key(), (1, 3))
+    eq_(ReversedClaim(member_id=3, claim_id=1).identity_key(), (3, 1))
+    
+    # Missing attributes fall back to the generic methods
+    a, b = member(1, [0]), member(1, [0])
+    del a.name
+    assert a != b
+    del b.name
+    assert a == b
+    eq_(hash(a), hash(b))
+    
+    # Frozen objects cache their hashes, as do their related objects
+    a = member(1, [0, 1])
+    assert a.freeze() is a
+    assert a._hash is not None and a.claims[0]._hash is not None
+    eq_(hash(a), hash(member(1, [0, 1])))
+    a.name = 'changed'
+    eq_(hash(a), hash(member(1, [0, 1])))
+
+def slot_tables(metadata):
+    return SlotMember.to_sqa_table(metadata, 'members'), SlotClaim.to_sqa_table(metadata, 'claims')
+
+def slot_reader_config(path):
+    engine = create_engine('sqlite:///' + path)
+    members_table, claims_table = slot_tables(MetaData())
+    return {SlotMember: SqaReaderConfig(members_table, engine),
+            SlotClaim: SqaReaderConfig(claims_table, engine)}
+
+def test_parallel_reader():
+    tmpdir = tempfile.mkdtemp()
+    try:
+        path = os.path.join(tmpdir, 'members.db')
+        engine = create_engine('sqlite:///' + path)
+        members_table, claims_table = slot_tables(MetaData())
+        writer = SlotMember.writer({SlotMember: SqaWriterConfig(members_table, create_table_if_not_exist=True, engine=engine, batch_size=100),
+                                    SlotClaim: SqaWriterConfig(claims_table, create_table_if_not_exist=True, engine=engine, batch_size=100)})
+        members = []
+        for i in range(200):
+            member = SlotMember(member_id=i, name=names.get_full_name())
+            for j in range(i % 4):
+                member.claims.append(SlotClaim(member_id=i, claim_id=j, date=datetime.date(2017, 1, j + 1), amount=float(j)))
+            writer.write(member)
+            members.append(member)
+        writer.close()
+        
+        config_factory = partial(slot_reader_config, path)
+        assert_list_equal(list(ParallelReader(SlotMember, config_factory, 3, ordered=True, chunk_size=7)), members)
+        assert_list_equal(list(ParallelReader(SlotMember, config_factory, 3, boundaries=[50, 120], ordered=True)), members)
+        assert_list_equal(sorted(ParallelReader(SlotMember, config_factory, 4)), members)
+    finally:
+        shutil.rmtree(tmpdir)
+
+def group_tables(metadata):
+    return Left.to_sqa_table(metadata, 'left'), Right.to_sqa_table(metadata, 'right')
+
+def group_reader_config(path):
+    engine = create_engine('sqlite:///' + path)
+    left_table, right_table = group_tables(MetaData())
+    return {Left: SqaReaderConfig(left_table, engine),
+            Right: SqaReaderConfig(right_table, engine)}
+
+def test_parallel_reader_order():
+    tmpdir = tempfile.mkdtemp()
+    try:
+        path = os.path.join(tmpdir, 'groups.db')
+        engine = create_engine('sqlite:///' + path)
+        metadata = MetaData()
+        left_table, right_table = group_tables(metadata)
+        metadata.create_all(engine)
+        engine.execute(left_table.insert(), [{'group_id': i // 3, 'id': i} for i in range(60)])
+        engine.execute(right_table.insert(), [{'group_id': i // 2, 'id': i} for i in range(60)])
+        
+        # Hash partitions merge like the serial ReaderCollection
+        config_factory = partial(group_reader_config, path)
+        expected = [(type(obj).__name__, obj.identity_key()) for obj in GroupObj.reader(config_factory())]
+        eq_([(type(obj).__name__, obj.identity_key()) 
+             for obj in ParallelReader(GroupObj, config_factory, 3, ordered=True, chunk_size=4)], 
+            expected)
+        eq_([(type(obj).__name__, obj.identity_key()) 
+             for obj in ParallelReader(GroupObj, config_factory, 3, boundaries=[5, 12], ordered=True)], 
+            expected)
+        
+        # Range partitions cannot be ordered unless the sort key starts with the partition attribute
+        @schema([IntegerColumn(name='group_id'), IntegerColumn(name='id')])
+        class Unordered(DataObject):
+            partition_attribute = 'group_id'
+            identity_key_ = (('group_id', 'group_id'), ('id', 'id'))
+            sort_key_ = ('id', 'group_id')
+        assert_raises(ValueError, ParallelReader, Unordered, config_factory, 3, boundaries=[5, 12], ordered=True)
+        
+        # Nulls go to the range partition the database sorts them into, and to partition 0 of hash partitions
+        engine.execute(left_table.insert(), [{'group_id': None, 'id': 1000}])
+        column = left_table.columns['group_id']
+        def null_partitions(boundaries, nulls_last):
+            return [engine.execute(select([func.count()]).where(and_(column == None, 
+                        partition_predicate(column, i, 3, boundaries, nulls_last)))).scalar() for i in range(3)]
+        eq_(null_partitions([5, 12], False), [1, 0, 0])
+        eq_(null_partitions([5, 12], True), [0, 0, 1])
+        eq_(null_partitions(None, True), [1, 0, 0])
+    finally:
+        shutil.rmtree(tmpdir)
+
+def test_block_csv_reader():
+    tmpdir = tempfile.mkdtemp()
+    try:
+        members_path = os.path.join(tmpdir, 'members.csv')
+        claims_path = os.path.join(tmpdir, 'claims.csv')
+        with open(members_path, 'w') as outfile:
+            rows = [[str(i), names.get_full_name()] for i in range(20)]
+            csv.writer(outfile).writerows([['member_id', 'name']] + rows)
+        with open(claims_path, 'w') as outfile:
+            rows = [[str(i), str(j), '2017-01-%02d' % (j + 1), '%d.5' % j] for i in range(20) for j in range(i % 3)]
+            rows[3][3] = 'x'
+            rows[4][2] = ''
+            rows[9] = rows[9][:3]
+            csv.writer(outfile).writerows([['member_id', 'claim_id', 'date', 'amount']] + rows)
+        
+        def read(block_size):
+            return list(SlotMember.reader({SlotMember: CsvReaderConfig(members_path, header=True, block_size=block_size),
+                                           SlotClaim: CsvReaderConfig(claims_path, header=True, block_size=block_size)}))
+        expected = read(None)
+        eq_(len(expected), 20)
+        eq_(sum(len(member.claims) for member in expected), 19)
+        for block_size in [1, 4, 1000]:
+            actual = read(block_size)
+            assert_list_equal(actual, expected)
+            eq_([[claim.__getstate__() for claim in member.claims] for member in actual], 
+                [[claim.__getstate__() for claim in member.claims] for member in expected])
+    finally:
+        shutil.rmtree(tmpdir)
+
+def test_batch_reader():
+    tmpdir = tempfile.mkdtemp()
+    try:
+        members_path = os.path.join(tmpdir, 'members.csv')
+        claims_path = os.path.join(tmpdir, 'claims.csv')
+        with open(members_path, 'w') as outfile:
+            csv.writer(outfile).writerows([[str(i), names.get_full_name()] for i in range(30)])
+        with open(claims_path, 'w') as outfile:
+            rows = [[str(i), str(j), '2017-01-%02d' % (j + 1), '%d.5' % j] for i in range(30) for j in range(i % 3)]
+            rows[3][3] = ''
+            rows[7] = rows[7][:2]
+            csv.writer(outfile).writerows(rows)
+        engine = create_engine('sqlite://')
+        metadata = MetaData(bind=engine)
+        members_table, claims_table = slot_tables(metadata)
+        csv_config = {SlotMember: CsvReaderConfig(members_path, header=False),
+                      SlotClaim: CsvReaderConfig(claims_path, header=False)}
+        writer = SlotMember.writer({SlotMember: SqaWriterConfig(members_table, create_table_if_not_exist=True),
+                                    SlotClaim: SqaWriterConfig(claims_table, create_table_if_not_exist=True)})
+        for member in SlotMember.reader(csv_config):
+            writer.write(member)
+        writer.close()
+        sqa_config = {SlotMember: SqaReaderConfig(members_table, engine),
+                      SlotClaim: SqaReaderConfig(claims_table, engine, batch_size=4)}
+        
+        for config in [csv_config, sqa_config]:
+            for klass in [SlotClaim, SlotMember]:
+                expected = [obj.__getstate__() for obj in klass.reader(config)]
+                names_ = [column.name for column in klass.columns]
+                for batch_size in [1, 7, 1000]:
+                    batches = list(klass.reader(config, batch_size=batch_size))
+                    assert all(len(batch) <= batch_size for batch in batches)
+                    frame = pd.concat(batches, ignore_index=True)
+                    eq_(list(frame.columns), names_)
+                    eq_(len(frame), len(expected))
+                    arrays = list(klass.reader(config, batch_size=batch_size, batch_format='arrays'))
+                    actual = [dict(zip(names_, row)) for batch in arrays 
+                              for row in zip(*[batch[name].tolist() for name in names_])]
+                    eq_(actual, [dict((name, state[name]) for name in names_) for state in expected])
+        eq_(pd.concat(SlotClaim.reader(csv_config, batch_size=5))['amount'].isnull().sum(), 2)
+        assert_raises(ValueError, lambda: SlotClaim.reader(csv_config, batch_size=5, batch_format='rows'))
+    finally:
+        shutil.rmtree(tmpdir)
+
+def test_mmap_csv_source():
+    tmpdir = tempfile.mkdtemp()
+    try:
+        path = os.path.join(tmpdir, 'rows.csv')
+        lines = ['a,b,c\n', '\n', '"x\ny",z,\n', '"q""",1,"2"\r\n', '1,\u00e9,3\r\n', 
+                 '"multi\r\nline\n\nfield",,\n', '"unbalanced,"x\n', 'last,row']
+        with open(path, 'wb') as outfile:
+            outfile.write(''.join(lines).encode('utf8'))
+        with open(path, 'rt', encoding='utf8') as infile:
+            expected = list(csv.reader(infile))
+        offsets = [0]
+        for line in lines[:-1]:
+            offsets.append(offsets[-1] + len(line.encode('utf8')))
+        for chunk_size in [3, 20, 1 << 20]:
+            source = MmapCsvSource(path)
+            source.chunk_size = chunk_size
+            actual = []
+            actual_offsets = []
+            for row in source:
+                actual.append(row)
+                actual_offsets.append(source.offset)
+            eq_(actual, expected)
+            eq_(actual_offsets, offsets)
+            source.seek(offsets[3])
+            eq_(source.tell(), offsets[3])
+            eq_(list(source), expected[3:])
+            source.close()
+        
+        path = os.path.join(tmpdir, 'claims.csv')
+        with open(path, 'w') as outfile:
+            csv.writer(outfile).writerows([[str(i), str(j), '2017-01-%02d' % (j + 1), '%d.5' % j] 
+                                           for i in range(20) for j in range(i % 3)])
+        config = lambda mmap: {SlotClaim: CsvReaderConfig(path, header=False, mmap=mmap)}
+        assert_list_equal(list(SlotClaim.reader(config(True))), list(SlotClaim.reader(config(False))))
+        assert_raises(ValueError, lambda: CsvReaderConfig(path, header=False, opener=gzipped, mmap=True))
+    finally:
+        shutil.rmtree(tmpdir)
+
+def csv_reader_config(members_path, claims_path):
+    return {SlotMember: CsvReaderConfig(members_path, header=True, mmap=True, bisect=True),
+            SlotClaim: CsvReaderConfig(claims_path, header=True, mmap=True, bisect=True)}
+
+def test_csv_key_range():
+    tmpdir = tempfile.mkdtemp()
+    try:
+        members_path = os.path.join(tmpdir, 'members.csv')
+        claims_path = os.path.join(tmpdir, 'claims.csv')
+        with open(members_path, 'w') as outfile:
+            rows = [[str(i), 'member %d' % i] for i in range(100)]
+            csv.writer(outfile).writerows([['member_id', 'name']] + rows)
+        with open(claims_path, 'w') as outfile:
+            rows = [[str(i), str(j), '2017-01-%02d' % (j + 1), '%d.5' % j] for i in range(100) for j in range(i % 4)]
+            csv.writer(outfile).writerows([['member_id', 'claim_id', 'date', 'amount']] + rows)
+        
+        def read(**kwargs):
+            return list(SlotMember.reader({SlotMember: CsvReaderConfig(members_path, header=True, **kwargs),
+                                           SlotClaim: CsvReaderConfig(claims_path, header=True, **kwargs)}))
+        def claims(members):
+            return [[claim.__getstate__() for claim in member.claims] for member in members]
+        everything = read()
+        for start, stop in [(None, None), ((10,), (20,)), ((37,), (38,)), ((0,), None), (None, (5,)), 
+                            ((99,), (1000,)), ((200,), None), ((50, 2), None)]:
+            expected = [member for member in everything 
+                        if (start is None or member.sort_key()[:len(start)] >= start) and 
+                        (stop is None or member.sort_key() < stop)]
+            for kwargs in [{}, {'mmap': True}, {'mmap': True, 'index_every': 1}, {'mmap': True, 'index_every': 7}, 
+                           {'mmap': True, 'bisect': True}]:
+                actual = read(start=start, stop=stop, **kwargs)
+                assert_list_equal(actual, expected)
+                eq_(claims(actual), claims(expected))
+        assert os.path.exists(claims_path + CsvKeyIndex.suffix)
+        
+        # Bisection with probes of a few rows
+        source = MmapCsvSource(claims_path)
+        next(source)
+        data_start = source.tell()
+        eq_(data_start, len('member_id,claim_id,date,amount\r\n'))
+        for start in [(0,), (1,), (37,), (37, 2), (99,), (1000,)]:
+            offset = bisect_csv(source, SlotClaim, start, data_start, probe_size=32)
+            source.seek(offset)
+            keys = [SlotClaim.from_row(row).sort_key() for row in source]
+            assert keys[0] < start or offset == data_start
+            assert len([key for key in keys if key[:len(start)] < start]) < 5
+        eq_(source.sync(0), 0)
+        eq_(source.sync(1), data_start)
+        eq_(source.sync(data_start), data_start)
+        eq_(source.sync(source.size - 1), source.size)
+        source.close()
+        
+        # Range partitions read in parallel from the same files
+        config_factory = partial(csv_reader_config, members_path, claims_path)
+        boundaries = config_factory()[SlotMember].boundaries(SlotMember, 4)
+        eq_(len(boundaries), 3)
+        assert_list_equal(list(ParallelReader(SlotMember, config_factory, 4, boundaries=boundaries, ordered=True)), 
+                          everything)
+        assert_raises(ValueError, lambda: partition_config(config_factory(), 0, 2))
+        eq_(config_factory()[SlotMember].boundaries(SlotMember, 1000), [member.member_id for member in everything])
+        assert_raises(ValueError, lambda: CsvReaderConfig(members_path, header=True).boundaries(SlotMember, 4))
+        
+        # The index is rebuilt when the file changes
+        with open(members_path, 'a') as outfile:
+            csv.writer(outfile).writerows([[str(i), 'member %d' % i] for i in range(100, 120)])
+        actual = read(start=(110,), mmap=True, index_every=7)
+        eq_([member.member_id for member in actual], list(range(110, 120)))
+        assert_raises(ValueError, lambda: CsvReaderConfig(members_path, header=True, index_every=7))
+        assert_raises(ValueError, lambda: CsvReaderConfig(members_path, header=True, bisect=True))
+    finally:
+        shutil.rmtree(tmpdir)
+
+def test_key_range_bad_keys():
+    # Short rows and rows with null keys inside a range are skipped with a warning
+    rows = [['1', 'a'], ['2', 'b'], [], ['', 'c'], ['3', 'd'], ['4', 'e']]
+    for start, stop, expected in [((2,), (4,), [['2', 'b'], ['3', 'd']]), 
+                                  (None, (4,), [['1', 'a'], ['2', 'b'], ['3', 'd']])]:
+        source = KeyRangeSource(iter(rows), SlotMember, start, stop)
+        with warnings.catch_warnings(record=True) as caught:
+            warnings.simplefilter('always')
+            eq_(list(source), expected)
+        eq_(source.skipped, 2)
+        eq_([str(warning.message) for warning in caught], 
+            ['Problem reading the sort key of SlotMember row 3.  Skipping.', 
+             'Problem reading the sort key of SlotMember row 4.  Skipping.'])
+    
+    # Other errors are not taken for rows out of range
+    class Broken(object):
+        def strip(self):
+            raise KeyError('broken')
+    assert_raises(KeyError, lambda: list(KeyRangeSource(iter([[Broken(), 'a']]), SlotMember, None, (4,))))
+    
+    # Through a CsvReaderConfig
+    tmpdir = tempfile.mkdtemp()
+    try:
+        members_path = os.path.join(tmpdir, 'members.csv')
+        with open(members_path, 'w') as outfile:
+            csv.writer(outfile).writerows([['member_id', 'name']] + [row for row in rows if row])
+        with warnings.catch_warnings(record=True) as caught:
+            warnings.simplefilter('always')
+            actual = list(SlotMember.reader({SlotMember: CsvReaderConfig(members_path, header=True, mmap=True, stop=(4,)),
+                                             SlotClaim: ListReaderConfig([])}))
+        eq_([member.member_id for member in actual], [1, 2, 3])
+        eq_(len(caught), 1)
+    finally:
+        shutil.rmtree(tmpdir)
+
 class TestRelationships(unittest.TestCase):
 
     def test_relate(self):
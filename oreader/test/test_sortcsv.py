@@ -0,0 +1,101 @@
+from oreader.sortcsv import sortcsv, read_gzipped_file, write_gzipped_file, splitruns,\
+    RecordReader
+from nose.tools import assert_equal
+import csv
+import os
+import random
+import shutil
+import tempfile
+
+def write_random_csv(path, n_rows):
+    with open(path, 'w') as outfile:
+        writer = csv.writer(outfile)
+        writer.writerow(['id', 'group', 'name'])
+        for i in range(n_rows):
+            writer.writerow([i, random.randint(0, 50), random.choice(['alpha', 'beta', 'gamma, delta', 'epsilon "e"'])])
+
+def read_csv(path):
+    with open(path, 'r') as infile:
+        return list(csv.reader(infile))
+
+def read_bytes(path):
+    with open(path, 'rb') as infile:
+        return infile.read()
+
+def test_sortcsv():
+    tmpdir = tempfile.mkdtemp()
+    try:
+        input_path = os.path.join(tmpdir, 'input.csv')
+        write_random_csv(input_path, 1000)
+        rows = read_csv(input_path)
+        expected = [rows[0]] + sorted(rows[1:], key=lambda row: (int(row[1]), row[2]))
+        
+        sequential_path = os.path.join(tmpdir, 'sequential.csv')
+        sortcsv(input_path, sequential_path, ['group', 'name'], conversions=[int, str], 
+                tmpdir=os.path.join(tmpdir, 'sequential'), tmp_size=77)
+        assert_equal(read_csv(sequential_path), expected)
+        
+        parallel_path = os.path.join(tmpdir, 'parallel.csv')
+        sortcsv(input_path, parallel_path, ['group', 'name'], conversions=[int, str], 
+                tmpdir=os.path.join(tmpdir, 'parallel'), tmp_size=77, workers=3)
+        assert_equal(read_bytes(parallel_path), read_bytes(sequential_path))
+        
+        # Many runs merged three at a time over several passes
+        cascade_path = os.path.join(tmpdir, 'cascade.csv')
+        os.mkdir(os.path.join(tmpdir, 'cascade'))
+        sortcsv(input_path, cascade_path, ['group', 'name'], conversions=[int, str], 
+                tmpdir=os.path.join(tmpdir, 'cascade'), tmp_size=20, max_fan_in=3)
+        assert_equal(read_bytes(cascade_path), read_bytes(sequential_path))
+        assert_equal(os.listdir(os.path.join(tmpdir, 'cascade')), [])
+        
+        # Binary runs, with and without compression, sequential and parallel, with a cascade
+        for compression, workers in [(None, None), ('gzip', None), (None, 2), ('gzip', 2)]:
+            binary_path = os.path.join(tmpdir, 'binary_%s_%s.csv' % (compression, workers))
+            sortcsv(input_path, binary_path, ['group', 'name'], conversions=[int, str], 
+                    tmpdir=os.path.join(tmpdir, 'binary'), tmp_size=20, max_fan_in=3, 
+                    tmp_format='binary', tmp_compression=compression, workers=workers)
+            assert_equal(read_bytes(binary_path), read_bytes(sequential_path))
+        
+        # Sequential binary runs are sorted as they are split
+        os.mkdir(os.path.join(tmpdir, 'runs'))
+        with open(input_path) as infile:
+            reader = csv.reader(infile)
+            next(reader)
+            paths = splitruns(reader, lambda row: (int(row[1]), row[2]), os.path.join(tmpdir, 'runs'), 20, sort=True)
+        for path in paths:
+            reader = RecordReader(path)
+            keys = [record[0] for record in reader]
+            reader.close()
+            assert_equal(keys, sorted(keys))
+        
+        # Gzipped runs and output, compressed and decompressed in threads
+        gzipped_path = os.path.join(tmpdir, 'gzipped.csv.gz')
+        sortcsv(input_path, gzipped_path, ['group', 'name'], conversions=[int, str], 
+                tmpdir=os.path.join(tmpdir, 'gzipped'), tmp_size=77, output_file_callable=write_gzipped_file, 
+                tmp_reader_callable=read_gzipped_file, tmp_writer_callable=write_gzipped_file)
+        with read_gzipped_file(gzipped_path) as infile:
+            assert_equal(list(csv.reader(infile)), expected)
+    finally:
+        shutil.rmtree(tmpdir)
+
+def test_sortcsv_stable():
+    tmpdir = tempfile.mkdtemp()
+    try:
+        input_path = os.path.join(tmpdir, 'input.csv')
+        write_random_csv(input_path, 500)
+        rows = read_csv(input_path)
+        output_path = os.path.join(tmpdir, 'output.csv')
+        sortcsv(input_path, output_path, ['group'], conversions=[int], tmp_size=30, max_fan_in=4)
+        assert_equal(read_csv(output_path), [rows[0]] + sorted(rows[1:], key=lambda row: int(row[1])))
+    finally:
+        shutil.rmtree(tmpdir)
+
+if __name__ == '__main__':
+    # This code will run the test in this file.'
+    import sys
+    import nose
+    module_name = sys.modules[__name__].__file__
+
+    result = nose.run(argv=[sys.argv[0],
+                            module_name,
+                            '-s','-v'])
@@ -5,7 +5,14 @@ from sqlalchemy.engine import create_engine
 import names
 import random
 from sqlalchemy.sql.expression import select
-from oreader.util import vector_greater_than
+from oreader.util import vector_greater_than, keyset_greater_than, supports_row_values,\
+    parallel_gzipped, bgzf_block_size, sorts_nulls_last
+from sqlalchemy.dialects import postgresql
+from nose.tools import assert_raises
+import gzip
+import os
+import shutil
+import tempfile
 from infinity import inf
 from toolz.dicttoolz import valmap
 
@@ -63,6 +70,61 @@ def test_vector_greater_than():
                   (None, 'B', 500)]
     for cols, vals in zip(col_tuples, val_tuples):
         compare_results(vector_greater_than(cols, vals), cols, vals)
+        compare_results(keyset_greater_than(cols, vals, engine.dialect), cols, vals)
+    
+    # Nulls in the data are ordered first, as they are by vector_greater_than
+    person = select([table.columns['middle_name']]).where(table.columns['middle_name'] != None).limit(1)
+    middle_name = engine.execute(person).scalar()
+    cols = (table.columns['blood_type'], table.columns['middle_name'], table.columns['id'])
+    for vals in [('B', middle_name, 500), ('A', middle_name, 0), ('O', None, None)]:
+        compare_results(keyset_greater_than(cols, vals, engine.dialect), cols, vals)
+    
+    # Row values are only used where the dialect supports them
+    assert supports_row_values(engine.dialect)
+    condition = keyset_greater_than(cols, ('B', 'Bob', 500), engine.dialect)
+    assert_equal(str(condition), '(people.blood_type, people.middle_name, people.id) > (:param_1, :param_2, :param_3)')
+    assert_equal(str(keyset_greater_than(cols, ('B', 'Bob', 500))), str(vector_greater_than(cols, ('B', 'Bob', 500))))
+    
+    # Null ordering by dialect
+    assert not sorts_nulls_last(engine.dialect)
+    assert sorts_nulls_last(postgresql.dialect())
+    assert not sorts_nulls_last(None)
+
+def test_parallel_gzipped():
+    tmpdir = tempfile.mkdtemp()
+    try:
+        data = ''.join('%d,name %d\n' % (i, random.randint(0, 1000)) for i in range(40000)).encode('utf8')
+        assert len(data) > 3 * bgzf_block_size
+        bgzf_path = os.path.join(tmpdir, 'bgzf.gz')
+        for workers in [1, 3]:
+            with parallel_gzipped(bgzf_path, 'wb', workers=workers) as outfile:
+                outfile.write(data[:100])
+                outfile.write(data[100:])
+            with gzip.open(bgzf_path, 'rb') as infile:
+                assert_equal(infile.read(), data)
+            for read_workers in [1, 3]:
+                with parallel_gzipped(bgzf_path, 'rb', workers=read_workers) as infile:
+                    assert_equal(infile.read(), data)
+        with parallel_gzipped(bgzf_path, 'rt') as infile:
+            assert_equal(infile.readline(), data.decode('utf8').split('\n')[0] + '\n')
+        
+        # Ordinary gzip files, including ones with several members, read ahead in one thread
+        plain_path = os.path.join(tmpdir, 'plain.gz')
+        with open(plain_path, 'wb') as outfile:
+            outfile.write(gzip.compress(data[:1000]) + gzip.compress(data[1000:]))
+        for workers in [1, 3]:
+            with parallel_gzipped(plain_path, 'rb', workers=workers) as infile:
+                assert_equal(infile.read(), data)
+        
+        # Errors in the background thread reach the reader
+        with open(plain_path, 'wb') as outfile:
+            outfile.write(gzip.compress(data)[:-100])
+        def read_truncated():
+            with parallel_gzipped(plain_path, 'rb') as infile:
+                infile.read()
+        assert_raises(EOFError, read_truncated)
+    finally:
+        shutil.rmtree(tmpdir)
 
 if __name__ == '__main__':
     # This code will run the test in this file.'
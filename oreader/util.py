@@ -1,6 +1,14 @@
 from sqlalchemy.sql.elements import Null
-from sqlalchemy.sql.expression import or_, and_
+from sqlalchemy.sql.expression import or_, and_, tuple_
 from gzip import GzipFile
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+import io
+import os
+import struct
+import threading
+import zlib
+from six.moves import queue
 
 def vector_greater_than(columns, values):
     '''
@@ -23,8 +31,275 @@ def vector_greater_than(columns, values):
         else:
             return columns[0] > values[0]
 
+def supports_row_values(dialect):
+    '''
+    Whether dialect compares row values, as in (a, b) > (1, 2), in a way its planner can 
+    answer from a composite index.  SQLite has row values from 3.15.
+    '''
+    if dialect is None:
+        return False
+    if dialect.name == 'sqlite':
+        version = getattr(dialect.dbapi, 'sqlite_version_info', None)
+        return version is not None and tuple(version) >= (3, 15)
+    return dialect.name in ('postgresql', 'mysql', 'mariadb')
+
+def sorts_nulls_last(dialect):
+    '''
+    Whether dialect puts nulls after every other value when sorting in ascending order, as 
+    PostgreSQL and Oracle do.  SQLite, MySQL and SQL Server put them first.
+    '''
+    return dialect is not None and dialect.name in ('postgresql', 'oracle')
+
+def is_null(value):
+    return value is None or value is Null or isinstance(value, Null)
+
+def keyset_greater_than(columns, values, dialect=None):
+    '''
+    The same condition as vector_greater_than, written as a row value comparison where dialect 
+    supports it.  A row value comparison is unknown as soon as it reaches a null, which matches 
+    vector_greater_than's nulls-first order as long as no value is null.  So runs of non-null 
+    values become row values, and null values are expanded as in vector_greater_than.
+    '''
+    assert len(columns) == len(values)
+    if not supports_row_values(dialect):
+        return vector_greater_than(columns, values)
+    n = 0
+    while n < len(values) and not is_null(values[n]):
+        n += 1
+    if n == 0:
+        if len(columns) > 1:
+            return or_(columns[0] != None, 
+                       and_(columns[0] == None, 
+                            keyset_greater_than(columns[1:], values[1:], dialect)))
+        else:
+            return columns[0] != None
+    if n == 1:
+        prefix = columns[0] > values[0]
+    else:
+        prefix = tuple_(*columns[:n]) > tuple_(*values[:n])
+    if n == len(columns):
+        return prefix
+    return or_(prefix, and_(*([column == value for column, value in zip(columns[:n], values[:n])] + 
+                              [keyset_greater_than(columns[n:], values[n:], dialect)])))
+
 def uncompressed(filename, flag):
     return open(filename, flag)
 
 def gzipped(filename, flag):
-    return GzipFile(filename, flag)
\ No newline at end of file
+    return GzipFile(filename, flag)
+
+# BGZF (as written by bgzip) stores a gzip file as independent members of at most 64KB, each 
+# recording its own size in a 'BC' extra subfield, so the members can be found without 
+# decompressing and inflated in parallel.  bgzf_block_size is the most data bgzip puts in one.
+bgzf_block_size = 65280
+bgzf_eof = b'\x1f\x8b\x08\x04\x00\x00\x00\x00\x00\xff\x06\x00BC\x02\x00\x1b\x00\x03\x00\x00\x00\x00\x00\x00\x00\x00\x00'
+
+def bgzf_block(data, level=6):
+    '''
+    Compress data into a single BGZF member.
+    '''
+    compressor = zlib.compressobj(level, zlib.DEFLATED, -zlib.MAX_WBITS)
+    compressed = compressor.compress(data) + compressor.flush()
+    header = struct.pack('<4BI2BH2BHH', 0x1f, 0x8b, 8, 4, 0, 0, 0xff, 6, 66, 67, 2, len(compressed) + 25)
+    return header + compressed + struct.pack('<II', zlib.crc32(data) & 0xffffffff, len(data) & 0xffffffff)
+
+def bgzf_size(header, extra):
+    '''
+    The total size of the member starting with the 12 byte gzip header and its extra field, or 
+    None if it is not a BGZF member.
+    '''
+    if header[:4] != b'\x1f\x8b\x08\x04':
+        return None
+    position = 0
+    while position + 4 <= len(extra):
+        length = struct.unpack('<H', extra[position+2:position+4])[0]
+        if extra[position:position+2] == b'BC' and length == 2:
+            return struct.unpack('<H', extra[position+4:position+6])[0] + 1
+        position += 4 + length
+    return None
+
+def inflate_bgzf_block(block):
+    _, _, _, _, _, _, _, extra_length = struct.unpack('<4BI2BH', block[:12])
+    data = zlib.decompress(block[12 + extra_length:-8], -zlib.MAX_WBITS)
+    crc, size = struct.unpack('<II', block[-8:])
+    if crc != zlib.crc32(data) & 0xffffffff or size != len(data) & 0xffffffff:
+        raise IOError('CRC check failed in BGZF block')
+    return data
+
+def inflate_stream(infile, buffer_size):
+    '''
+    Decompress a gzip file of one or more members, yielding chunks of data.
+    '''
+    decompressor = zlib.decompressobj(16 + zlib.MAX_WBITS)
+    started = False
+    while True:
+        data = infile.read(buffer_size)
+        if not data:
+            break
+        while data:
+            started = True
+            chunk = decompressor.decompress(data)
+            if chunk:
+                yield chunk
+            if decompressor.eof:
+                data = decompressor.unused_data.lstrip(b'\x00')
+                decompressor = zlib.decompressobj(16 + zlib.MAX_WBITS)
+                started = False
+            else:
+                data = b''
+    if started:
+        raise EOFError('Compressed file ended before the end-of-stream marker was reached')
+
+def inflate_bgzf(infile, executor, in_flight, buffer_size):
+    '''
+    Decompress a BGZF file, inflating up to in_flight members at once in executor.  Falls back 
+    to inflate_stream from the first member that is not a BGZF member.
+    '''
+    pending = deque()
+    while True:
+        start = infile.tell()
+        header = infile.read(12)
+        size = None
+        if len(header) == 12:
+            extra = infile.read(struct.unpack('<H', header[10:12])[0])
+            size = bgzf_size(header, extra)
+        if size is None:
+            break
+        block = header + extra + infile.read(size - 12 - len(extra))
+        pending.append(executor.submit(inflate_bgzf_block, block))
+        if len(pending) >= in_flight:
+            chunk = pending.popleft().result()
+            if chunk:
+                yield chunk
+    while pending:
+        chunk = pending.popleft().result()
+        if chunk:
+            yield chunk
+    infile.seek(start)
+    for chunk in inflate_stream(infile, buffer_size):
+        yield chunk
+
+class GzipReadAhead(io.RawIOBase):
+    '''
+    Reads a gzip file that is decompressed in a background thread into a queue of at most 
+    queue_size chunks.  BGZF files are inflated by workers threads in parallel.  zlib releases 
+    the GIL, so decompression overlaps with whatever the reading thread does.
+    '''
+    def __init__(self, filename, workers=None, queue_size=16, buffer_size=1 << 20):
+        self.infile = open(filename, 'rb')
+        self.workers = workers or os.cpu_count() or 1
+        self.executor = ThreadPoolExecutor(self.workers) if self.workers > 1 else None
+        self.queue = queue.Queue(queue_size)
+        self.chunk = memoryview(b'')
+        self.done = False
+        self.stopped = threading.Event()
+        if self.executor is not None:
+            chunks = inflate_bgzf(self.infile, self.executor, 2 * self.workers, buffer_size)
+        else:
+            chunks = inflate_stream(self.infile, buffer_size)
+        self.thread = threading.Thread(target=self.produce, args=(chunks,))
+        self.thread.daemon = True
+        self.thread.start()
+    
+    def put(self, item):
+        while not self.stopped.is_set():
+            try:
+                self.queue.put(item, timeout=0.1)
+                return True
+            except queue.Full:
+                pass
+        return False
+    
+    def produce(self, chunks):
+        try:
+            for chunk in chunks:
+                if not self.put(chunk):
+                    return
+            self.put(None)
+        except Exception as e:
+            self.put(e)
+    
+    def readable(self):
+        return True
+    
+    def readinto(self, b):
+        while not self.chunk:
+            if self.done:
+                return 0
+            item = self.queue.get()
+            if item is None:
+                self.done = True
+                return 0
+            if isinstance(item, Exception):
+                self.done = True
+                raise item
+            self.chunk = memoryview(item)
+        n = min(len(b), len(self.chunk))
+        b[:n] = self.chunk[:n]
+        self.chunk = self.chunk[n:]
+        return n
+    
+    def close(self):
+        if not self.closed:
+            self.stopped.set()
+            self.thread.join()
+            if self.executor is not None:
+                self.executor.shutdown()
+            self.infile.close()
+        super(GzipReadAhead, self).close()
+
+class BgzfWriter(io.RawIOBase):
+    '''
+    Writes a BGZF file, compressing its members in workers threads.  The result is a valid 
+    multi-member gzip file, readable by any gzip reader and in parallel by GzipReadAhead.
+    '''
+    def __init__(self, filename, workers=None, level=6, append=False):
+        self.outfile = open(filename, 'ab' if append else 'wb')
+        self.workers = workers or os.cpu_count() or 1
+        self.level = level
+        self.executor = ThreadPoolExecutor(self.workers)
+        self.pending = deque()
+        self.buffer = bytearray()
+    
+    def writable(self):
+        return True
+    
+    def write(self, b):
+        self.buffer.extend(b)
+        while len(self.buffer) >= bgzf_block_size:
+            self.submit(bytes(self.buffer[:bgzf_block_size]))
+            del self.buffer[:bgzf_block_size]
+        return len(b)
+    
+    def submit(self, data):
+        self.pending.append(self.executor.submit(bgzf_block, data, self.level))
+        while len(self.pending) > 2 * self.workers:
+            self.outfile.write(self.pending.popleft().result())
+    
+    def close(self):
+        if not self.closed:
+            try:
+                if self.buffer:
+                    self.submit(bytes(self.buffer))
+                    self.buffer = bytearray()
+                while self.pending:
+                    self.outfile.write(self.pending.popleft().result())
+                self.outfile.write(bgzf_eof)
+            finally:
+                self.executor.shutdown()
+                self.outfile.close()
+        super(BgzfWriter, self).close()
+
+def parallel_gzipped(filename, flag, workers=None, level=6, queue_size=16):
+    '''
+    An opener like gzipped that decompresses ahead of the reader in background threads, and 
+    writes BGZF files compressed by workers threads.  Text modes are supported as well as binary 
+    ones.
+    '''
+    if 'r' in flag:
+        result = io.BufferedReader(GzipReadAhead(filename, workers, queue_size))
+    else:
+        result = io.BufferedWriter(BgzfWriter(filename, workers, level, append='a' in flag))
+    if 'b' in flag:
+        return result
+    return io.TextIOWrapper(result)
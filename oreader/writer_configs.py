@@ -1,4 +1,7 @@
 import csv
+import time
+import datetime
+from six import text_type, StringIO
 from .util import uncompressed
 
 class SimpleWriterConfig(object):
@@ -37,22 +40,99 @@ class CsvDataSink(object):
     def close(self):
         self.file.close()
 
+def copy_value(value):
+    '''
+    Render value as a field in PostgreSQL's COPY text format.
+    '''
+    if value is None:
+        return '\\N'
+    if value is True:
+        return 't'
+    if value is False:
+        return 'f'
+    if isinstance(value, (datetime.date, datetime.time)):
+        value = value.isoformat()
+    return text_type(value).replace('\\', '\\\\').replace('\t', '\\t').replace('\n', '\\n').replace('\r', '\\r')
+
 class SqaDataSink(object):
+    '''
+    Buffers translated rows and inserts them batch_size at a time, each batch in its own 
+    transaction.  The buffer is also flushed when flush_interval seconds have passed since the 
+    last flush, and on close.
+    '''
+    # Upper bound on bound parameters per statement for the values method.  SQLite before 3.32 
+    # allows at most 999.
+    max_parameters = 999
+    
     def __init__(self, writer_config, writer):
         self.writer = writer
         self.writer_config = writer_config
+        self.engine = writer_config.engine if writer_config.engine is not None else writer_config.table.bind
         if self.writer_config.create_table_if_not_exist:
-            self.writer_config.table.metadata.create_all(tables=[self.writer_config.table], checkfirst=True)
+            self.writer_config.table.metadata.create_all(bind=self.engine, tables=[self.writer_config.table], checkfirst=True)
+        self.method = self.writer_config.method
+        if self.method == 'auto':
+            self.method = {'postgresql': 'copy', 'sqlite': 'values'}.get(self.engine.dialect.name, 'executemany')
+        if self.method not in ('executemany', 'values', 'copy'):
+            raise ValueError('Unknown insert method %s' % self.method)
+        self.rows = []
+        self.last_flush = time.time()
         
     def open(self):
         return self
             
     def write(self, obj):
-        row = self.writer_config.translate(self.writer, obj)
-        self.writer_config.table.insert().execute(row)
+        self.rows.append(self.writer_config.translate(self.writer, obj))
+        if len(self.rows) >= self.writer_config.batch_size:
+            self.flush()
+        elif self.writer_config.flush_interval is not None and \
+                time.time() - self.last_flush >= self.writer_config.flush_interval:
+            self.flush()
+    
+    def flush(self):
+        if self.rows:
+            getattr(self, 'insert_' + self.method)(self.rows)
+        self.rows = []
+        self.last_flush = time.time()
+    
+    def insert_executemany(self, rows):
+        with self.engine.begin() as connection:
+            connection.execute(self.writer_config.table.insert(), rows)
+    
+    def insert_values(self, rows):
+        chunk_size = max(1, self.max_parameters // max(1, len(self.writer.klass.columns)))
+        with self.engine.begin() as connection:
+            for i in range(0, len(rows), chunk_size):
+                chunk = rows[i:i+chunk_size]
+                if len(chunk) == 1:
+                    connection.execute(self.writer_config.table.insert(), chunk)
+                else:
+                    connection.execute(self.writer_config.table.insert().values(chunk))
+    
+    def insert_copy(self, rows):
+        names = [col.name for col in self.writer.klass.columns]
+        preparer = self.engine.dialect.identifier_preparer
+        statement = 'COPY %s (%s) FROM STDIN' % (preparer.format_table(self.writer_config.table),
+                                                 ', '.join(map(preparer.quote, names)))
+        data = StringIO(''.join('\t'.join([copy_value(row[name]) for name in names]) + '\n' for row in rows))
+        connection = self.engine.raw_connection()
+        try:
+            cursor = connection.cursor()
+            try:
+                if not hasattr(cursor, 'copy_expert'):
+                    raise ValueError('The copy insert method requires a DBAPI cursor with copy_expert, such as psycopg2\'s.')
+                cursor.copy_expert(statement, data)
+            finally:
+                cursor.close()
+            connection.commit()
+        except:
+            connection.rollback()
+            raise
+        finally:
+            connection.close()
         
     def close(self):
-        pass
+        self.flush()
 
 class CsvWriterConfig(SimpleWriterConfig):
     def __init__(self, filename, header, csv_config={}, opener=uncompressed):
@@ -73,9 +153,23 @@ class CsvWriterConfig(SimpleWriterConfig):
         sink.close()
 
 class SqaWriterConfig(SimpleWriterConfig):
-    def __init__(self, table, create_table_if_not_exist=False):
+    def __init__(self, table, create_table_if_not_exist=False, engine=None, batch_size=1, flush_interval=None, 
+                 method='executemany'):
+        '''
+        engine : The engine to write with.  Defaults to the engine bound to table's metadata.
+        batch_size : Number of rows to buffer before inserting them with a single statement.
+        flush_interval : If not None, the maximum number of seconds rows sit in the buffer before 
+                         the next write flushes them.
+        method : How batches are inserted.  One of 'executemany', 'values' (a single multi-row 
+                 VALUES statement, as supported by SQLite, PostgreSQL and MySQL), 'copy' 
+                 (PostgreSQL COPY through psycopg2), or 'auto' to choose by dialect.
+        '''
         self.table = table
         self.create_table_if_not_exist = create_table_if_not_exist
+        self.engine = engine
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.method = method
     
     def translate(self, writer, obj):
         if obj is None:
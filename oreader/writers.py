@@ -34,7 +34,7 @@ class PolymorphicWriter(Writer):
         super(PolymorphicWriter, self).__init__(klass, config)
         self.writers = {}
 #         stack = [klass]
-        for subclass in klass.__subclasses__():
+        for subclass in klass.direct_subtypes():
             self.writers[subclass] = subclass.writer_class(config)(subclass, config)
 #         while stack:
 #             item = stack.pop()
@@ -10,6 +10,8 @@ setup(name='oreader',
       author_email='jcrudy@gmail.com',
       url='https://github.com/jcrudy/oreader',
       packages=find_packages(),
-      install_requires=['sqlalchemy', 'pandas', 'interval', 'frozendict', 'arrow', 'cyinterval'],
-      tests_require=['names', 'nose', 'infinity', 'toolz']
+      install_requires=['sqlalchemy', 'pandas>=1.1.2', 'interval', 'frozendict', 'arrow', 'cyinterval'],
+      extras_require={'parquet': ['pyarrow'],
+                      'async': ['sqlalchemy>=1.4,<2.0']},
+      tests_require=['names', 'nose', 'infinity', 'toolz', 'aiosqlite']
      )
\ No newline at end of file